@@ -0,0 +1,247 @@
+"""Plain HTTP API for scripts and document-management systems.
+
+Mounted under ``/api/v1`` on the Gradio server, next to the UI. Requests
+go straight to the same backends as the UI handlers, without Gradio's
+queue, websocket or base64 previews. When ``server.auth_enabled`` is set,
+the UI credentials are required as HTTP Basic auth.
+
+  POST /api/v1/print          multipart "files" (one or more), optional "printer"
+  POST /api/v1/scan           JSON {"mode": "color"|"gray"|"lineart", "feeder": false, "device": null}
+                              optional "region": [left, top, width, height] in mm
+  GET  /api/v1/scans          newest first; ?limit=20&before=<created>
+  GET  /api/v1/scans/{id}     one scan's metadata
+  GET  /api/v1/scans/{id}/pdf the scanned document, streamed
+  GET  /api/v1/scans/export   ZIP of PDFs, streamed; ?ids=1,2,3 or ?since=<created>
+
+With OCR enabled, a scan's "searchable" flag turns true once its text
+layer is ready; from then on /pdf serves the searchable version.
+"""
+
+import asyncio
+import os
+import secrets
+import shutil
+import time
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Request, UploadFile
+from fastapi.responses import FileResponse, StreamingResponse
+from fastapi.security import HTTPBasic, HTTPBasicCredentials
+from pydantic import BaseModel
+
+from .encoding import MODE_NAMES
+from .export import check_token, zip_stream
+from .utils import check_auth
+
+MODES = {name.lower(): number for number, name in MODE_NAMES.items()}
+MODES.update({"grayscale": 2, "bw": 4, "black_and_white": 4})
+
+_basic = HTTPBasic(auto_error=False)
+
+# Seconds between checks whether the client of a running request is still there
+DISCONNECT_POLL = 1.0
+
+# Seconds uploads are kept for backends that read them after returning
+UPLOAD_KEEP = 600
+
+# Most scans one ?since= export may contain
+EXPORT_LIMIT = 5000
+
+
+class ScanRequest(BaseModel):
+    mode: str = "color"
+    feeder: bool = False
+    device: Optional[str] = None
+    # [left, top, width, height] in mm from the top-left corner of the glass
+    region: Optional[List[float]] = None
+
+
+def include_first(server_app, router):
+    """Add ``router``'s routes ahead of Gradio's own (including its catch-alls)."""
+    routes = server_app.router.routes
+    count = len(routes)
+    server_app.include_router(router)
+    added = routes[count:]
+    del routes[count:]
+    routes[0:0] = added
+
+
+async def _while_connected(request, coro):
+    """Await ``coro``, cancelling it (and the lp or scanimage behind it) if the client leaves."""
+    task = asyncio.ensure_future(coro)
+    while not task.done():
+        await asyncio.wait([task], timeout=DISCONNECT_POLL)
+        if not task.done() and await request.is_disconnected():
+            task.cancel()
+    return await task
+
+
+def _pdf(scan):
+    """The scan's PDF, preferring the searchable version; None if it is gone."""
+    pdfs = [f for f in scan['files'] if f.endswith(".pdf") and os.path.exists(f)]
+    searchable = [f for f in pdfs if f.endswith("_searchable.pdf")]
+    return (searchable or pdfs or [None])[0]
+
+
+def _public(scan):
+    return {
+        "id": scan['id'],
+        "created": scan['created'],
+        "owner": scan['owner'],
+        "mode": scan['mode'],
+        "pages": scan['pages'],
+        "bytes": scan['bytes'],
+        "searchable": any(f.endswith("_searchable.pdf") for f in scan['files']),
+        "pdf": f"/api/v1/scans/{scan['id']}/pdf",
+    }
+
+
+def authenticate(config, credentials):
+    """The Basic auth user (None with auth off); answers 401 for missing or wrong credentials."""
+    if not config['server']['auth_enabled']:
+        return None
+    if credentials is None or not check_auth(credentials.username, credentials.password, config):
+        raise HTTPException(401, "Authentication required", {"WWW-Authenticate": "Basic"})
+    return credentials.username
+
+
+def user_dependency(config):
+    """FastAPI dependency applying :func:`authenticate` to a request."""
+    def user(credentials: Optional[HTTPBasicCredentials] = Depends(_basic)):
+        return authenticate(config, credentials)
+    return user
+
+
+def create_router(app):
+    """Routes serving ``app`` (a PrinterScannerApp)."""
+    config = app.config
+    router = APIRouter(prefix="/api/v1")
+    user = user_dependency(config)
+
+    def owned_scan(scan_id, username):
+        scan = app.storage.get(scan_id)
+        if scan is None or (username is not None and scan['owner'] != username):
+            raise HTTPException(404, "No such scan")
+        return scan
+
+    @router.post("/print")
+    async def print_files(request: Request, files: List[UploadFile] = File(...),
+                          printer: Optional[str] = Form(None),
+                          username: Optional[str] = Depends(user)):
+        # Each request gets its own directory so uploads keep their names
+        upload_dir = os.path.join(config['storage']['upload_dir'], f"api_{secrets.token_hex(8)}")
+        os.makedirs(upload_dir)
+
+        def save_uploads():
+            paths = []
+            for upload in files:
+                path = os.path.join(upload_dir, os.path.basename(upload.filename or "upload"))
+                with open(path, "wb") as f:
+                    shutil.copyfileobj(upload.file, f, 1024 * 1024)
+                paths.append(path)
+            return paths
+
+        try:
+            paths = await asyncio.to_thread(save_uploads)
+            message, results = await _while_connected(
+                request, app.submit_print(username, paths, printer or None)
+            )
+        finally:
+            if getattr(app.print_backend, 'spools', False):
+                shutil.rmtree(upload_dir, ignore_errors=True)
+            else:
+                # ShellExecute("print") opens the file after it has returned
+                loop = asyncio.get_running_loop()
+                loop.call_later(UPLOAD_KEEP, lambda: loop.run_in_executor(
+                    None, shutil.rmtree, upload_dir, True))
+
+        jobs = [
+            {"file": os.path.basename(r['path']), "ok": r['ok'], "job_id": r['job_id'],
+             "printer": r['printer'], "message": r['message']}
+            for r in results or []
+        ]
+        ok = message.startswith("Files sent")
+        if not ok and not jobs:
+            raise HTTPException(400, message)
+        return {"ok": ok, "message": message, "jobs": jobs}
+
+    @router.post("/scan")
+    async def scan(http_request: Request, request: ScanRequest,
+                   username: Optional[str] = Depends(user)):
+        colormode = MODES.get(request.mode.lower())
+        if colormode is None:
+            raise HTTPException(400, f"Unknown mode: {request.mode}")
+        region = request.region
+        if region is not None and (len(region) != 4 or min(region) < 0 or 0 in region[2:]):
+            raise HTTPException(400, "region must be [left, top, width, height] in mm")
+
+        async def run_scan():
+            last = None
+            async for last in app.scan_document(username, colormode, request.feeder, request.device,
+                                                {"region": region} if region else None):
+                pass
+            return last
+
+        files, _, message = await _while_connected(http_request, run_scan())
+        if isinstance(message, list):
+            message = message[0]
+        if not isinstance(message, str) or not message.startswith("Scan completed"):
+            raise HTTPException(502, message)
+
+        pdf = next(f for f in files if f.endswith(".pdf"))
+        scan = app.storage.find_by_stem(os.path.splitext(pdf)[0])
+        return {"message": message, **_public(scan)}
+
+    @router.get("/scans")
+    def list_scans(limit: int = 20, before: Optional[float] = None,
+                   username: Optional[str] = Depends(user)):
+        scans = app.storage.list(owner=username, limit=max(1, min(limit, 200)), before=before)
+        return {"scans": [_public(s) for s in scans]}
+
+    @router.get("/scans/export")
+    def export_scans(ids: Optional[str] = None, since: Optional[float] = None,
+                     user: Optional[str] = None, expires: Optional[float] = None,
+                     token: Optional[str] = None,
+                     credentials: Optional[HTTPBasicCredentials] = Depends(_basic)):
+        # Links made by the History tab carry a signed token instead of credentials
+        if token:
+            if not check_token(token, user, ids, since, expires):
+                raise HTTPException(403, "This download link is invalid or has expired")
+            username = user
+        else:
+            username = authenticate(config, credentials)
+
+        if ids:
+            try:
+                wanted = [int(i) for i in ids.split(",")]
+            except ValueError:
+                raise HTTPException(400, "ids must be comma-separated scan ids")
+            scans = [s for s in map(app.storage.get, wanted)
+                     if s is not None and (username is None or s['owner'] == username)]
+        elif since is not None:
+            scans = app.storage.list(owner=username, limit=EXPORT_LIMIT, since=since)
+        else:
+            raise HTTPException(400, "Pass ids or since")
+
+        pdfs = [pdf for pdf in map(_pdf, scans) if pdf]
+        if not pdfs:
+            raise HTTPException(404, "No stored scans match")
+        name = time.strftime("scans_%Y%m%d_%H%M%S.zip")
+        return StreamingResponse(
+            zip_stream(pdfs), media_type="application/zip",
+            headers={"Content-Disposition": f'attachment; filename="{name}"'},
+        )
+
+    @router.get("/scans/{scan_id}")
+    def get_scan(scan_id: int, username: Optional[str] = Depends(user)):
+        return _public(owned_scan(scan_id, username))
+
+    @router.get("/scans/{scan_id}/pdf")
+    def get_pdf(scan_id: int, username: Optional[str] = Depends(user)):
+        scan = owned_scan(scan_id, username)
+        pdf = _pdf(scan)
+        if pdf is None:
+            raise HTTPException(404, "The scan's PDF is no longer stored")
+        return FileResponse(pdf, media_type="application/pdf", filename=os.path.basename(pdf))
+
+    return router
@@ -0,0 +1,7 @@
+class BackendError(Exception):
+    """The printing or scanning system failed, rather than one job.
+
+    Only this makes the app replace the backend (see
+    ``PrinterScannerApp.restart_backend``); any other error is reported to
+    the user as a failed job.
+    """
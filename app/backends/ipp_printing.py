@@ -0,0 +1,100 @@
+import asyncio
+import os
+
+from app import ipp
+from app.backends.unix_printing import UnixPrintingBackend, summarize_results
+from app.pools import with_failover
+
+
+def _printer_fault(result):
+    # client-error-not-found and server errors such as not-accepting-jobs or
+    # printer-is-deactivated; other client errors are about the document
+    status = result.get('ipp_status', 0)
+    return status == 0x0406 or status >= 0x0500
+
+
+class IppPrintingBackend:
+    """Submit print jobs straight to the CUPS scheduler over IPP.
+
+    All files of a batch go through one persistent HTTP connection instead of
+    one ``lp`` process per file. If the scheduler cannot be reached the batch
+    falls back to ``lp``.
+    """
+
+    # The scheduler has its own copy of every file once submission returns
+    spools = True
+
+    def __init__(self, config, pool=None):
+        self.config = config
+        self.client = ipp.IppClient(
+            config['printing'].get('cups_uri') or "ipp://localhost:631",
+            timeout=config['printing'].get('ipp_timeout', 30),
+        )
+        self.pool = pool
+        self.fallback = UnixPrintingBackend(config, pool)
+
+    def _resolve_printer(self, printer):
+        if printer is None and self.pool is not None:
+            return self.pool.choose()
+        printer = printer or self.config['printing'].get('default_printer') or None
+        if printer:
+            return printer
+        return self.client.default_printer()
+
+    def _print_job(self, path, printer):
+        response = self.client.print_job(printer, path, os.path.basename(path))
+        if response.ok:
+            return {
+                'path': path,
+                'ok': True,
+                'job_id': response.first(ipp.JOB_ATTRIBUTES, "job-id"),
+                'printer': printer,
+                'message': response.message(),
+            }
+        return {'path': path, 'ok': False, 'job_id': None, 'printer': printer,
+                'message': response.message(), 'ipp_status': response.status}
+
+    def submit_files(self, file_paths, printer=None):
+        pooled = printer is None and self.pool is not None
+        try:
+            printer = self._resolve_printer(printer)
+        except (OSError, ipp.IppError):
+            return self.fallback.submit_files(file_paths, printer)
+
+        if not printer:
+            return [
+                {'path': p, 'ok': False, 'job_id': None, 'printer': None,
+                 'message': "No printer in the pool is available" if pooled
+                 else "No printer configured and CUPS has no default printer"}
+                for p in file_paths
+            ]
+
+        results = []
+        for path in file_paths:
+            try:
+                if pooled:
+                    result, printer = with_failover(
+                        self.pool, printer, lambda p: self._print_job(path, p), _printer_fault,
+                    )
+                else:
+                    result = self._print_job(path, printer)
+            except (OSError, ipp.IppError) as e:
+                if not results:
+                    # The scheduler is unreachable; let lp handle the batch
+                    return self.fallback.submit_files(file_paths, None if pooled else printer)
+                results.append({'path': path, 'ok': False, 'job_id': None,
+                                'printer': printer, 'message': str(e)})
+                continue
+            results.append(result)
+
+        return results
+
+    async def submit_files_async(self, file_paths, printer=None):
+        # IPP requests are short calls on a kept-alive connection; a thread
+        # is only held for as long as CUPS takes to accept the files
+        return await asyncio.to_thread(self.submit_files, file_paths, printer)
+
+    def print_files(self, file_paths, printer=None):
+        results = self.submit_files(file_paths, printer)
+        printer = next((r['printer'] for r in results if r['printer']), None)
+        return summarize_results(results, printer)
@@ -0,0 +1,141 @@
+import threading
+import time
+
+from app import metrics
+from app.encoding import save_image
+from app.backends.errors import BackendError
+from app.backends.unix_scanning import UnixScanningBackend
+
+try:
+    import sane
+except ImportError:  # python-sane is optional
+    sane = None
+
+
+class _Session:
+    """An open SANE handle plus the options last applied to it."""
+
+    def __init__(self, device_name):
+        self.device_name = device_name
+        self.handle = sane.open(device_name)
+        self.options = {}
+        self.last_used = time.monotonic()
+        self.lock = threading.Lock()
+
+    def apply(self, **options):
+        # Setting an option can make the backend reload its parameters or
+        # even recalibrate, so only touch options that actually changed.
+        for name, value in options.items():
+            if self.options.get(name) != value:
+                setattr(self.handle, name, value)
+                self.options[name] = value
+
+    def geometry(self, region):
+        """Scan-area options for ``region`` (mm), or for the whole glass if None."""
+        if region is None:
+            # The largest bottom-right corner the device allows
+            return {"tl_x": 0, "tl_y": 0,
+                    "br_x": self.handle.opt['br_x'].constraint[1],
+                    "br_y": self.handle.opt['br_y'].constraint[1]}
+        left, top, width, height = region
+        return {"tl_x": left, "tl_y": top, "br_x": left + width, "br_y": top + height}
+
+    def close(self):
+        try:
+            self.handle.close()
+        except Exception:
+            pass
+
+
+class SaneScanningBackend(UnixScanningBackend):
+    """Scan through python-sane, keeping one warm handle open per device.
+
+    Opening a device (loading the backend, USB/network handshake, lamp
+    warm-up, calibration) happens once; later scans reuse the handle until it
+    has been idle for ``scanning.sane_idle_timeout`` seconds. Feeder batches
+    still use ``scanimage --batch``.
+    """
+
+    def __init__(self, config):
+        if sane is None:
+            raise RuntimeError("python-sane is not installed (pip install python-sane)")
+        super().__init__(config)
+        self.idle_timeout = float(config['scanning'].get('sane_idle_timeout', 120))
+        self._sessions = {}
+        self._lock = threading.Lock()
+        sane.init()
+
+        self._reaper = threading.Thread(target=self._reap_idle, name="sane-reaper", daemon=True)
+        self._reaper.start()
+
+    def _session(self, device_name):
+        with self._lock:
+            session = self._sessions.get(device_name)
+            if session is None:
+                session = self._sessions[device_name] = _Session(device_name)
+            return session
+
+    def close_session(self, device_name):
+        with self._lock:
+            session = self._sessions.pop(device_name, None)
+        if session is not None:
+            with session.lock:
+                session.close()
+
+    def close(self):
+        with self._lock:
+            names = list(self._sessions)
+        for name in names:
+            self.close_session(name)
+
+    def _reap_idle(self):
+        while True:
+            time.sleep(max(1.0, min(self.idle_timeout / 4, 30.0)))
+            now = time.monotonic()
+            with self._lock:
+                idle = [
+                    name for name, session in self._sessions.items()
+                    if now - session.last_used > self.idle_timeout and not session.lock.locked()
+                ]
+            for name in idle:
+                self.close_session(name)
+
+    def scan_document(self, colormode, target_file_path, device=None, resolution=None, region=None,
+                      progress=None):
+        # progress is not reported: the scan is a single blocking call
+        device_name = device or self.config['scanning'].get('unix_device_name')
+
+        if not device_name:
+            return False, "No Unix SANE device configured (scanning.unix_device_name)."
+
+        resolution = resolution or self.config['scanning'].get('resolution', 300)
+        mode = self._mode_from_colormode(colormode)
+
+        for attempt in (0, 1):
+            try:
+                session = self._session(device_name)
+                with session.lock:
+                    session.apply(mode=mode, resolution=resolution, **session.geometry(region))
+                    with metrics.phase("device"):
+                        image = session.handle.scan()
+                    session.last_used = time.monotonic()
+                break
+            except Exception as e:
+                # The handle may have gone stale (device unplugged, backend
+                # reset); reopen it once before giving up.
+                self.close_session(device_name)
+                if attempt:
+                    # Reopening did not help; SANE itself needs restarting
+                    raise BackendError(f"Error from scanner: {e}") from e
+
+        with metrics.phase("encode"):
+            save_image(
+                image, target_file_path, mode,
+                self.config['scanning'].get('jpeg_quality'), resolution,
+            )
+        return True, f"Document scanned and saved to {target_file_path}"
+
+    def scan_batch(self, colormode, target_pattern, device=None, on_page=None):
+        # scanimage needs the device to itself
+        self.close_session(device or self.config['scanning'].get('unix_device_name'))
+        return super().scan_batch(colormode, target_pattern, device, on_page)
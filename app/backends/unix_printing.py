@@ -1,30 +1,180 @@
+import os
+import re
 import subprocess
 
+from app.backends.errors import BackendError
+from app.metrics import run_command, run_command_async
+from app.pools import with_failover, with_failover_async
+
+# "request id is HP_LaserJet-42 (1 file(s))"
+_LP_REQUEST_ID = re.compile(r"request id is (\S+)-(\d+)")
+
+# lp errors that are the printer's fault rather than the file's
+_LP_PRINTER_FAULT = re.compile(
+    r"not accepting jobs|does not exist|unable to connect|not available|timed out", re.I)
+
+
+def _printer_fault(result):
+    return bool(_LP_PRINTER_FAULT.search(result['message']))
+
+
+def summarize_results(results, printer):
+    """Turn per-file print results into the status line shown in the UI."""
+    failed = [r for r in results if not r['ok']]
+    if not failed:
+        jobs = ", ".join(str(r['job_id']) for r in results if r['job_id'] is not None)
+        return (
+            f"Files sent to printer{(' ' + printer) if printer else ''}"
+            f"{f' (jobs {jobs})' if jobs else ''}"
+        )
+
+    lines = [f"{len(results) - len(failed)} of {len(results)} files sent to printer"]
+    for r in failed:
+        lines.append(f"Error printing {os.path.basename(r['path'])}: {r['message']}")
+    return "\n".join(lines)
+
 
 class UnixPrintingBackend:
-    def __init__(self, config):
+    # lp has copied every file to the spool by the time it exits
+    spools = True
+
+    def __init__(self, config, pool=None):
         self.config = config
+        # With a pool, jobs without an explicit printer go to its least busy member
+        self.pool = pool
+
+    def _lp_command(self, path, printer):
+        cmd = ["lp"]
+        if printer:
+            cmd += ["-d", printer]
+        cmd.append(path)
+        return cmd
+
+    def _lp_result(self, path, printer, stdout):
+        stdout = stdout.decode(errors='ignore')
+        match = _LP_REQUEST_ID.search(stdout)
+        return {
+            'path': path,
+            'ok': True,
+            'job_id': int(match.group(2)) if match else None,
+            'printer': match.group(1) if match else printer,
+            'message': stdout.strip(),
+        }
+
+    def _lp_error(self, path, printer, error, timeout):
+        """The result dict for a failed lp; raises when lp could not be run at all."""
+        if isinstance(error, subprocess.CalledProcessError):
+            message = (error.stderr or error.stdout).decode(errors='ignore').strip()
+        elif isinstance(error, subprocess.TimeoutExpired):
+            message = f"lp timed out after {timeout} s"
+        elif isinstance(error, FileNotFoundError):
+            raise error
+        else:
+            raise BackendError(f"Could not run lp: {error}") from error
+        return {'path': path, 'ok': False, 'job_id': None, 'printer': printer, 'message': message}
+
+    def _lp(self, path, printer):
+        timeout = self.config['printing'].get('lp_timeout', 60)
+        try:
+            result = run_command(
+                self._lp_command(path, printer),
+                timeout=timeout,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+            )
+        except (subprocess.SubprocessError, OSError) as e:
+            return self._lp_error(path, printer, e, timeout)
+        return self._lp_result(path, printer, result.stdout)
 
-    def print_files(self, file_paths):
-        printer = self.config['printing'].get('default_printer') or None
+    async def _lp_async(self, path, printer):
+        timeout = self.config['printing'].get('lp_timeout', 60)
+        try:
+            result = await run_command_async(
+                self._lp_command(path, printer),
+                timeout=timeout,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+            )
+        except (subprocess.SubprocessError, OSError) as e:
+            return self._lp_error(path, printer, e, timeout)
+        return self._lp_result(path, printer, result.stdout)
+
+    def _first_printer(self, file_paths, printer):
+        """Whether the batch is pooled and the printer it starts on.
+
+        The third value holds the batch's results already when a pool has
+        no printer available.
+        """
+        pooled = printer is None and self.pool is not None
+        if not pooled:
+            return False, printer or self.config['printing'].get('default_printer') or None, None
+        printer = self.pool.choose()
+        if printer is None:
+            return True, None, [
+                {'path': p, 'ok': False, 'job_id': None, 'printer': None,
+                 'message': "No printer in the pool is available"}
+                for p in file_paths
+            ]
+        return True, printer, None
+
+    def _lp_missing(self, results, file_paths, printer):
+        message = "Printing command 'lp' not found. Install CUPS or configure printing manually."
+        # Nothing else in the batch can succeed either
+        return results + [
+            {'path': p, 'ok': False, 'job_id': None, 'printer': printer, 'message': message}
+            for p in file_paths[len(results):]
+        ]
+
+    def submit_files(self, file_paths, printer=None):
+        """Submit each file with ``lp`` and return one result dict per file.
+
+        A failing file does not stop the rest of the batch. Pooled batches
+        move to another printer when one refuses a file.
+        """
+        pooled, printer, results = self._first_printer(file_paths, printer)
+        if results is not None:
+            return results
+        results = []
 
         for path in file_paths:
-            cmd = ["lp"]
-            if printer:
-                cmd += ["-d", printer]
-            cmd.append(path)
+            try:
+                if pooled:
+                    result, printer = with_failover(
+                        self.pool, printer, lambda p: self._lp(path, p), _printer_fault,
+                    )
+                else:
+                    result = self._lp(path, printer)
+            except FileNotFoundError:
+                return self._lp_missing(results, file_paths, printer)
+            results.append(result)
+
+        return results
+
+    async def submit_files_async(self, file_paths, printer=None):
+        """submit_files() for the event loop.
 
+        No thread is held while lp runs, and cancelling the call kills it.
+        """
+        pooled, printer, results = self._first_printer(file_paths, printer)
+        if results is not None:
+            return results
+        results = []
+
+        for path in file_paths:
             try:
-                result = subprocess.run(
-                    cmd,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True,
-                    check=True,
-                )
+                if pooled:
+                    result, printer = await with_failover_async(
+                        self.pool, printer, lambda p: self._lp_async(path, p), _printer_fault,
+                    )
+                else:
+                    result = await self._lp_async(path, printer)
             except FileNotFoundError:
-                return "Printing command 'lp' not found. Install CUPS or configure printing manually."
-            except subprocess.CalledProcessError as e:
-                return f"Error printing {path}: {e.stderr.strip() or e.stdout.strip()}"
+                return self._lp_missing(results, file_paths, printer)
+            results.append(result)
+
+        return results
 
-        return f"Files sent to printer{(' ' + printer) if printer else ''}"
+    def print_files(self, file_paths, printer=None):
+        results = self.submit_files(file_paths, printer)
+        printer = next((r['printer'] for r in results if r['printer']), printer)
+        return summarize_results(results, printer)
@@ -1,4 +1,45 @@
+import re
 import subprocess
+import threading
+import time
+
+from app import metrics
+from app.backends.errors import BackendError
+from app.encoding import encode_page, scan_format
+from app.stream import DEFAULT_STRIP_HEIGHT, encode_stream, is_pnm
+
+# What scanimage --progress writes to stderr, rewriting the line with \r
+_PROGRESS = re.compile(r"Progress: ([\d.]+)%")
+
+# Seconds between updates of the partially scanned image
+ROWS_INTERVAL = 0.5
+
+
+class _ProgressReporter:
+    """Turn scanimage's progress meter and the rows encoded so far into
+    ``progress(percent=...)`` and ``progress(rows=...)`` calls, each only
+    when there is something new to show."""
+
+    def __init__(self, progress):
+        self.progress = progress
+        self._percent = None
+        self._shown = 0.0
+
+    def line(self, line):
+        match = _PROGRESS.search(line)
+        if match is None:
+            return False
+        percent = float(match.group(1))
+        if self._percent is None or int(percent) != int(self._percent):
+            self._percent = percent
+            self.progress(percent=percent)
+        return True
+
+    def strip(self, preview, rows):
+        now = time.monotonic()
+        if now - self._shown >= ROWS_INTERVAL:
+            self._shown = now
+            self.progress(rows=preview.crop((0, 0, preview.width, rows)))
 
 
 class UnixScanningBackend:
@@ -14,34 +55,199 @@ class UnixScanningBackend:
             return "Lineart"
         return "Color"
 
-    def scan_document(self, colormode, target_file_path):
-        device_name = self.config['scanning'].get('unix_device_name')
-        resolution = self.config['scanning'].get('resolution', 300)
-
-        if not device_name:
-            return False, "No Unix SANE device configured (scanning.unix_device_name)."
-
+    def _build_command(self, colormode, device_name, resolution=None, region=None):
+        resolution = resolution or self.config['scanning'].get('resolution', 300)
         mode = self._mode_from_colormode(colormode)
 
         cmd = [
             "scanimage",
             f"--device-name={device_name}",
-            "--format=jpeg",
+            f"--format={scan_format(mode, self.config['scanning'].get('jpeg_quality'))}",
             f"--mode={mode}",
             f"--resolution={resolution}",
         ]
+        if region:
+            # Scan area in mm from the top-left corner of the glass
+            left, top, width, height = region
+            cmd += ["-l", f"{left:g}", "-t", f"{top:g}", "-x", f"{width:g}", "-y", f"{height:g}"]
+        return cmd
+
+    def scan_document(self, colormode, target_file_path, device=None, resolution=None, region=None,
+                      progress=None):
+        """Scan one page; ``resolution`` and ``region`` override the configured full page.
+
+        ``progress(percent=...)`` is called as scanimage reports progress
+        and, for pages encoded in strips, ``progress(rows=image)`` with
+        the top of the page preview as it comes in.
+        """
+        device_name = device or self.config['scanning'].get('unix_device_name')
+
+        if not device_name:
+            return False, "No Unix SANE device configured (scanning.unix_device_name)."
+
+        cmd = self._build_command(colormode, device_name, resolution, region)
+        timeout = self.config['scanning'].get('timeout', 300)
+        reporter = None
+        if progress is not None:
+            reporter = _ProgressReporter(progress)
+            cmd.append("--progress")
 
         try:
+            if self._streamed(colormode):
+                # Encoded strip by strip while the page is still coming in
+                metrics.run_command(
+                    cmd,
+                    consume=lambda out: self._encode_stream(
+                        colormode, out, target_file_path, resolution,
+                        on_strip=reporter.strip if reporter else None,
+                    ),
+                    timeout=timeout,
+                    on_stderr=reporter.line if reporter else None,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                )
+                return True, f"Document scanned and saved to {target_file_path}"
+
             with open(target_file_path, "wb") as out:
-                subprocess.run(
+                metrics.run_command(
                     cmd,
+                    timeout=timeout,
+                    on_stderr=reporter.line if reporter else None,
                     stdout=out,
                     stderr=subprocess.PIPE,
-                    check=True,
                 )
         except FileNotFoundError:
             return False, "scanimage command not found. Install SANE (e.g., sane-utils)."
         except subprocess.CalledProcessError as e:
             return False, f"Error from scanner: {e.stderr.decode(errors='ignore').strip()}"
+        except subprocess.TimeoutExpired:
+            return False, f"The scanner did not finish within {timeout} s"
+        except ValueError as e:
+            return False, f"Error reading the scan: {e}"
 
+        with metrics.phase("encode"):
+            self._encode(colormode, target_file_path, resolution)
         return True, f"Document scanned and saved to {target_file_path}"
+
+    def _streamed(self, colormode):
+        """True when pages arrive uncompressed and are encoded in strips."""
+        scanning = self.config['scanning']
+        mode = self._mode_from_colormode(colormode)
+        return (scan_format(mode, scanning.get('jpeg_quality')) == "pnm"
+                and scanning.get('strip_height', DEFAULT_STRIP_HEIGHT) > 0)
+
+    def _encode_stream(self, colormode, src, path, resolution=None, on_strip=None):
+        scanning = self.config['scanning']
+        encode_stream(
+            src, path, self._mode_from_colormode(colormode),
+            scanning.get('jpeg_quality'), resolution or scanning.get('resolution', 300),
+            scanning.get('strip_height', DEFAULT_STRIP_HEIGHT),
+            preview=(scanning.get('preview_max_edge', 1024), scanning.get('preview_format', 'jpeg')),
+            on_strip=on_strip,
+        )
+
+    def _encode(self, colormode, path, resolution=None):
+        if self._streamed(colormode) and is_pnm(path):
+            with open(path, "rb") as src:
+                self._encode_stream(colormode, src, path, resolution)
+            return
+        scanning = self.config['scanning']
+        encode_page(
+            path, self._mode_from_colormode(colormode),
+            scanning.get('jpeg_quality'), resolution or scanning.get('resolution', 300),
+        )
+
+    def scan_batch(self, colormode, target_pattern, device=None, on_page=None):
+        """Scan every sheet in the document feeder with ``scanimage --batch``.
+
+        ``target_pattern`` contains a ``%d``-style placeholder for the page
+        number. scanimage reports each page on stdout once its file is
+        complete, and ``on_page(path)`` is called right then, while later
+        pages are still feeding. Returns ``(ok, message, pages)``.
+        """
+        device_name = device or self.config['scanning'].get('unix_device_name')
+
+        if not device_name:
+            return False, "No Unix SANE device configured (scanning.unix_device_name).", []
+
+        cmd = self._build_command(colormode, device_name) + [
+            f"--source={self.config['scanning'].get('adf_source', 'ADF')}",
+            f"--batch={target_pattern}",
+            "--batch-print",
+        ]
+
+        pages = []
+        timeout = self.config['scanning'].get('timeout', 300)
+        start = time.perf_counter()
+        try:
+            proc = subprocess.Popen(
+                cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+            )
+        except FileNotFoundError:
+            metrics.COMMAND_FAILURES.inc(command="scanimage")
+            return False, "scanimage command not found. Install SANE (e.g., sane-utils).", pages
+        except OSError as e:
+            metrics.COMMAND_FAILURES.inc(command="scanimage")
+            raise BackendError(f"Could not run scanimage: {e}") from e
+        spawned = time.perf_counter()
+        metrics.COMMAND_SPAWN_SECONDS.observe(spawned - start, command="scanimage")
+
+        # A feeder that jams stops producing pages: kill scanimage when none
+        # arrives within the timeout, so the device worker is freed
+        timed_out = threading.Event()
+        timer = None
+
+        def expire():
+            timed_out.set()
+            proc.kill()
+
+        def rearm():
+            nonlocal timer
+            if timer is not None:
+                timer.cancel()
+            if timeout:
+                timer = threading.Timer(timeout, expire)
+                timer.daemon = True
+                timer.start()
+
+        # The scheduler kills the scan if its client goes away
+        with proc, metrics.killable(proc):
+            rearm()
+            try:
+                for line in proc.stdout:
+                    path = line.strip()
+                    if not path:
+                        continue
+                    if timer is not None:
+                        timer.cancel()  # encoding is not the scanner's time
+                    self._encode(colormode, path)
+                    pages.append(path)
+                    if on_page:
+                        on_page(path)
+                    rearm()
+                stderr = proc.stderr.read()
+            finally:
+                if timer is not None:
+                    timer.cancel()
+        finished = time.perf_counter()
+        metrics.COMMAND_SECONDS.observe(finished - start, command="scanimage")
+        trace = metrics.current_trace()
+        if trace is not None:
+            # "device" includes the time on_page spent encoding
+            trace.add("spawn", spawned - start)
+            trace.add("device", finished - spawned)
+
+        if timed_out.is_set():
+            metrics.COMMAND_FAILURES.inc(command="scanimage")
+            return False, f"The scanner delivered no page within {timeout} s", pages
+
+        # An emptied feeder ends the batch with 0; anything else (a jam, an
+        # open cover) is an error even if some pages made it
+        if proc.returncode != 0:
+            metrics.COMMAND_FAILURES.inc(command="scanimage")
+            return False, f"Error from scanner: {stderr.strip()}", pages
+
+        return True, f"Scanned {len(pages)} page(s)", pages
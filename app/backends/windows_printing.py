@@ -6,9 +6,10 @@ class WindowsPrintingBackend:
     def __init__(self, config):
         self.config = config
 
-    def print_files(self, file_paths):
+    def print_files(self, file_paths, printer=None):
         printer = (
-            self.config['printing'].get('default_printer')
+            printer
+            or self.config['printing'].get('default_printer')
             or win32print.GetDefaultPrinter()
         )
 
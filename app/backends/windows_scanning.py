@@ -1,14 +1,27 @@
 from app import scanner
+from app.encoding import MODE_NAMES, encode_page
 
 
 class WindowsScanningBackend:
     def __init__(self, config):
         self.config = config
 
-    def scan_document(self, colormode, target_file_path):
+    def scan_document(self, colormode, target_file_path, device=None, resolution=None, region=None,
+                      progress=None):
+        # progress is not reported: the scan is a single blocking call
+        if device is None:
+            device = self.config['scanning']["device_num"]
         ok, msg = scanner.scan_document_without_selection(
-            self.config['scanning']["device_num"],
+            device,
             target_file_path,
             colormode,
+            resolution or self.config['scanning'].get('resolution', 300),
+            region,
         )
+        if ok:
+            # WIA hands over a JPEG whatever the mode; store Lineart as G4
+            encode_page(
+                target_file_path, MODE_NAMES.get(colormode, "Color"),
+                self.config['scanning'].get('jpeg_quality'),
+            )
         return ok, msg
@@ -0,0 +1,264 @@
+"""Print-ready conversion of uploads, done once per distinct file.
+
+Office documents are converted to PDF with headless LibreOffice (when it is
+installed) and images larger than a page at the printer's resolution are
+scaled down, so CUPS never has to rasterise a 12 MP photo itself. The work
+runs in a process pool and the results are kept in a cache keyed by the
+SHA-256 of the upload, so printing the same file again costs one hash.
+"""
+
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+OFFICE_EXTENSIONS = {".doc", ".docx", ".odt", ".rtf", ".txt", ".csv",
+                     ".xls", ".xlsx", ".ods", ".ppt", ".pptx", ".odp"}
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".tif", ".tiff"}
+
+# A4 in inches; images are fitted into this at the printer's resolution
+PAGE_INCHES = (8.27, 11.69)
+
+_HASH_CHUNK = 1024 * 1024
+
+# A partial file this old was left by a conversion that never finished
+STALE_PART_AGE = 3600
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def part_path(target):
+    """Where a conversion writes ``target`` until it is complete."""
+    root, ext = os.path.splitext(target)
+    return f"{root}.part{ext}"
+
+
+# ---------------------- Pool workers ----------------------
+
+def _office_to_pdf(src, dst, soffice, timeout):
+    # Concurrent soffice processes must not share a user profile
+    profile = os.path.join(tempfile.gettempdir(), f"easyprint-lo-{os.getpid()}")
+    with tempfile.TemporaryDirectory() as outdir:
+        subprocess.run(
+            [soffice, f"-env:UserInstallation=file://{profile}", "--headless",
+             "--convert-to", "pdf", "--outdir", outdir, src],
+            check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+            timeout=timeout,
+        )
+        produced = os.path.join(outdir, os.path.splitext(os.path.basename(src))[0] + ".pdf")
+        shutil.move(produced, dst)
+    return dst
+
+
+def _fit_image(src, dst, dpi):
+    from PIL import Image
+
+    with Image.open(src) as image:
+        short, long = sorted(image.size)
+        scale = min(PAGE_INCHES[0] * dpi / short, PAGE_INCHES[1] * dpi / long)
+        if scale >= 1:
+            return None
+        size = (round(image.width * scale), round(image.height * scale))
+        fmt = image.format
+        # Keep the orientation tag, or phone photos would print sideways
+        exif = image.getexif()
+        image.draft("RGB", size)
+        resized = image.resize(size, Image.LANCZOS, reducing_gap=2.0)
+    if fmt == "JPEG":
+        resized.save(dst, "JPEG", quality=90, dpi=(dpi, dpi), exif=exif)
+    else:
+        resized.save(dst, fmt, dpi=(dpi, dpi), exif=exif)
+    return dst
+
+
+# ---------------------- Cache ----------------------
+
+class ConversionCache:
+    """Converted files on disk, evicted least recently used above ``max_bytes``."""
+
+    def __init__(self, directory, max_bytes, stale_after=STALE_PART_AGE):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.stale_after = stale_after
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key, ext):
+        return os.path.join(self.directory, key + ext)
+
+    def get(self, key, ext):
+        path = self.path(key, ext)
+        try:
+            # The modification time doubles as the LRU timestamp
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def enforce(self):
+        now = time.time()
+        with self._lock:
+            entries = []
+            for name in os.listdir(self.directory):
+                path = os.path.join(self.directory, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                if ".part" in name:
+                    # Still being written, unless its worker died long ago
+                    if now - st.st_mtime > self.stale_after:
+                        try:
+                            os.remove(path)
+                        except OSError:
+                            pass
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+
+
+class PrintConverter:
+    """Turn uploads into print-ready files, converting each distinct file once."""
+
+    def __init__(self, config):
+        printing = config['printing']
+        self.enabled = printing.get('convert', True)
+        self.dpi = int(printing.get('dpi', 300))
+        self.workers = int(printing.get('convert_workers', 2))
+        self.timeout = printing.get('convert_timeout', 120)
+        self.soffice = shutil.which("soffice") or shutil.which("libreoffice")
+        self.cache = ConversionCache(
+            os.path.join(config['storage']['upload_dir'], "print_cache"),
+            int(printing.get('convert_cache_mb', 512)) * 1024 * 1024,
+        )
+        self._pool = None
+        self._pending = {}
+        # Keys of images that are already small enough to print as they are
+        self._as_is = set()
+        self._lock = threading.Lock()
+
+    def _executor(self):
+        if self._pool is None:
+            # Forking the threaded server could copy a held lock into the child
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._pool
+
+    def _plan(self, path):
+        """Return (key, target extension, worker, args) or None to print as-is."""
+        ext = os.path.splitext(path)[1].lower()
+        if ext in OFFICE_EXTENSIONS and self.soffice:
+            return f"pdf-{file_digest(path)}", ".pdf", _office_to_pdf, (self.soffice, self.timeout)
+        if ext in IMAGE_EXTENSIONS:
+            return f"{self.dpi}dpi-{file_digest(path)}", ext, _fit_image, (self.dpi,)
+        return None
+
+    def _submit(self, path):
+        """Return a ready path, or (future, key, target) of a running conversion."""
+        plan = self._plan(path)
+        if plan is None:
+            return path
+        key, ext, worker, args = plan
+        if key in self._as_is:
+            return path
+
+        cached = self.cache.get(key, ext)
+        if cached:
+            return cached
+
+        target = self.cache.path(key, ext)
+        with self._lock:
+            # Two users uploading the same file share one conversion
+            future = self._pending.get(key)
+            if future is None:
+                future = self._executor().submit(worker, path, part_path(target), *args)
+                self._pending[key] = future
+        return future, key, target
+
+    def _finish(self, key, produced, target):
+        with self._lock:
+            self._pending.pop(key, None)
+            if produced is None:
+                self._as_is.add(key)
+            elif os.path.exists(produced):
+                os.replace(produced, target)
+        self.cache.enforce()
+
+    async def prepare_async(self, paths):
+        """Return the print-ready path for each of ``paths``, in order.
+
+        Files that need no conversion, or whose conversion failed, are
+        returned unchanged so CUPS can still try them. Conversions are
+        awaited, not waited for.
+        """
+        if not self.enabled:
+            return list(paths)
+        # Hashing reads every upload; keep that off the event loop
+        submitted = await asyncio.to_thread(lambda: [self._submit(path) for path in paths])
+        running = [asyncio.wrap_future(item[0]) for item in submitted if not isinstance(item, str)]
+        if running:
+            # Not gather(): cancelling this call must not cancel conversions
+            # other requests share. Failures are reported by _collect().
+            await asyncio.wait(running)
+            for future in running:
+                if not future.cancelled():
+                    future.exception()
+        return self._collect(paths, submitted)
+
+    def _collect(self, paths, submitted):
+        ready = []
+        for path, item in zip(paths, submitted):
+            if isinstance(item, str):
+                ready.append(item)
+                continue
+
+            future, key, target = item
+            try:
+                produced = future.result()
+            except Exception as e:
+                with self._lock:
+                    self._pending.pop(key, None)
+                    # A failed or killed worker may have written part of it
+                    try:
+                        os.remove(part_path(target))
+                    except OSError:
+                        pass
+                print(f"print conversion of {os.path.basename(path)} failed: {e}")
+                if isinstance(e, BrokenProcessPool):
+                    # A worker died; the next conversion gets a fresh pool
+                    self.close()
+                ready.append(path)
+                continue
+            self._finish(key, produced, target)
+            ready.append(target if produced else path)
+        return ready
+
+    def close(self):
+        """Stop the worker processes; a later conversion starts new ones."""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,130 @@
+"""In-process registry of printers and scanners.
+
+Discovery reuses the parsers from ``get_start_params.py``. Probing
+(``scanimage -L`` especially) can take many seconds, so lookups always
+answer from the cache and a stale cache is refreshed on a background
+thread. The last known devices are persisted, which makes them available
+immediately after a restart.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+
+import get_start_params
+
+
+class DeviceRegistry:
+    def __init__(self, snapshot_path, ttl=300.0):
+        self.snapshot_path = snapshot_path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._refreshing = threading.Lock()
+        self._printers = []
+        self._scanners = []
+        self._updated = 0.0
+        self._load_snapshot()
+
+    def _load_snapshot(self):
+        try:
+            with open(self.snapshot_path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        self._printers = data.get("printers", [])
+        self._scanners = [tuple(s) for s in data.get("scanners", [])]
+        self._updated = data.get("updated", 0.0)
+
+    def _save_snapshot(self):
+        tmp = f"{self.snapshot_path}.tmp"
+        with self._lock:
+            data = {
+                "printers": self._printers,
+                "scanners": self._scanners,
+                "updated": self._updated,
+            }
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, self.snapshot_path)
+
+    @property
+    def stale(self):
+        return time.time() - self._updated > self.ttl
+
+    @property
+    def refreshing(self):
+        return self._refreshing.locked()
+
+    def printers(self):
+        """Known printer names; never waits for a probe."""
+        self._refresh_if_stale()
+        with self._lock:
+            return list(self._printers)
+
+    def scanners(self):
+        """Known scanners as ``(device_id, description)``; never waits for a probe."""
+        self._refresh_if_stale()
+        with self._lock:
+            return list(self._scanners)
+
+    def is_known_scanner(self, device):
+        with self._lock:
+            return any(str(dev) == str(device) for dev, _ in self._scanners)
+
+    def _refresh_if_stale(self):
+        if self.stale:
+            self.refresh_async()
+
+    def refresh_async(self):
+        """Start a background probe unless one is already running."""
+        if self.refreshing:
+            return
+        threading.Thread(target=self.refresh, name="device-refresh", daemon=True).start()
+
+    @staticmethod
+    def _probe(kind, probe):
+        """Run one probe; None if it failed, so the last known list is kept."""
+        try:
+            return probe(strict=True)
+        except Exception as e:
+            print(f"Could not list {kind}, keeping the last known ones: {e}")
+            return None
+
+    def refresh(self):
+        """Probe printers and scanners now (blocking) and persist the result.
+
+        A probe that fails leaves its list as it was, and nothing is saved,
+        so a passing CUPS or SANE outage does not wipe the snapshot.
+        """
+        if not self._refreshing.acquire(blocking=False):
+            return
+        try:
+            if sys.platform.startswith("win"):
+                list_printers = get_start_params.list_windows_printers
+                list_scanners = get_start_params.list_windows_scanners
+            else:
+                list_printers = get_start_params.list_unix_printers
+                list_scanners = get_start_params.list_unix_scanners
+
+            printers = self._probe("printers", list_printers)
+            # Printers answer quickly; publish them before the slow scanner probe
+            if printers is not None:
+                with self._lock:
+                    self._printers = printers
+            scanners = self._probe("scanners", list_scanners)
+
+            with self._lock:
+                if scanners is not None:
+                    self._scanners = [tuple(s) for s in scanners]
+                # Also after a failure, or every lookup would start a new probe
+                self._updated = time.time()
+            if printers is None or scanners is None:
+                return
+            try:
+                self._save_snapshot()
+            except OSError:
+                pass
+        finally:
+            self._refreshing.release()
@@ -0,0 +1,71 @@
+"""Per-mode page encoding applied to every scan before it becomes a PDF.
+
+Lineart pages are stored as 1-bit CCITT Group 4 TIFFs, Gray pages as
+single-channel JPEGs and Color pages as JPEGs. The scanner's own JPEG is
+kept as-is unless ``scanning.jpeg_quality`` asks for a specific quality, in
+which case the page is scanned uncompressed and encoded here once.
+"""
+
+import os
+
+from .pdf import is_g4_tiff, is_jpeg, read_jpeg_info
+
+DEFAULT_JPEG_QUALITY = 85
+
+MODE_NAMES = {1: "Color", 2: "Gray", 4: "Lineart"}
+
+_EXTENSIONS = {"Lineart": ".tif"}
+
+
+def extension(mode):
+    """File extension of an encoded page in ``mode`` ("Color", "Gray", "Lineart")."""
+    return _EXTENSIONS.get(mode, ".jpg")
+
+
+def scan_format(mode, quality=None):
+    """``scanimage --format`` to request so that encoding loses nothing extra."""
+    if mode == "Lineart":
+        return "tiff"
+    return "pnm" if quality else "jpeg"
+
+
+def is_encoded(path, mode):
+    """True when ``path`` already is in the final format for ``mode``."""
+    if mode == "Lineart":
+        return is_g4_tiff(path)
+    if not is_jpeg(path):
+        return False
+    return mode != "Gray" or read_jpeg_info(path).components == 1
+
+
+def save_image(image, path, mode, quality=None, resolution=None):
+    """Write a PIL image to ``path`` in the final format for ``mode``."""
+    dpi = (resolution, resolution) if resolution else image.info.get("dpi")
+    extra = {"dpi": dpi} if dpi else {}
+
+    # Write to a temporary name so a reader never sees half a page
+    tmp = f"{path}.tmp"
+    if mode == "Lineart":
+        if image.mode != "1":
+            image = image.convert("1")
+        # One strip, so the G4 data can be copied into the PDF unchanged
+        image.save(tmp, "TIFF", compression="group4", tiffinfo={278: image.height}, **extra)
+    else:
+        target = "L" if mode == "Gray" else "RGB"
+        if image.mode != target:
+            image = image.convert(target)
+        image.save(tmp, "JPEG", quality=quality or DEFAULT_JPEG_QUALITY, **extra)
+    os.replace(tmp, path)
+    return path
+
+
+def encode_page(path, mode, quality=None, resolution=None):
+    """Re-encode the scanned page at ``path`` in place unless it already fits ``mode``."""
+    if is_encoded(path, mode):
+        return path
+
+    from PIL import Image  # only needed when the scanner's output is not kept
+
+    with Image.open(path) as image:
+        image.load()
+        return save_image(image, path, mode, quality, resolution)
@@ -0,0 +1,127 @@
+"""How long scans and prints take, learned from the jobs that ran.
+
+Durations are kept per (kind, device, mode, resolution): an exponentially
+weighted average, which follows a device that gets slower or faster, and
+the last ``samples`` durations for percentiles. Recording a job is a dict
+update; the store is written to disk by a background thread at most every
+``save_interval`` seconds, never by the handler that recorded it.
+"""
+
+import json
+import os
+import threading
+import time
+
+ALPHA = 0.2
+SAMPLES = 50
+SAVE_INTERVAL = 30.0
+
+
+def percentile(values, p):
+    """The ``p``-th percentile (0-100) of ``values``, by nearest rank."""
+    ordered = sorted(values)
+    return ordered[round(p / 100 * (len(ordered) - 1))]
+
+
+class DurationStats:
+    def __init__(self, path, alpha=ALPHA, samples=SAMPLES, save_interval=SAVE_INTERVAL):
+        self.path = path
+        self.alpha = alpha
+        self.samples = samples
+        self.save_interval = save_interval
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._dirty = threading.Event()
+        self._writer = None
+        self._load()
+
+    @staticmethod
+    def _key(kind, device, mode, resolution):
+        return (kind, str(device), mode, int(resolution) if resolution else 0)
+
+    def _load(self):
+        try:
+            with open(self.path, "r") as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return
+        for entry in entries:
+            self._stats[tuple(entry['key'])] = {
+                "average": entry['average'],
+                "count": entry['count'],
+                "recent": entry['recent'][-self.samples:],
+            }
+
+    def save(self):
+        tmp = f"{self.path}.tmp"
+        with self._lock:
+            self._dirty.clear()
+            entries = [{"key": list(key), **stats, "recent": list(stats['recent'])}
+                       for key, stats in self._stats.items()]
+        with open(tmp, "w") as f:
+            json.dump(entries, f)
+        os.replace(tmp, self.path)
+
+    def _save_periodically(self):
+        while True:
+            self._dirty.wait()
+            # Whatever else finishes meanwhile goes into the same write
+            time.sleep(self.save_interval)
+            try:
+                self.save()
+            except OSError as e:
+                print(f"Could not save duration estimates: {e}")
+
+    def record(self, kind, device, mode, resolution, seconds):
+        """Learn that a job took ``seconds``."""
+        if seconds <= 0:
+            return
+        key = self._key(kind, device, mode, resolution)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = {"average": seconds, "count": 0, "recent": []}
+            else:
+                stats['average'] += self.alpha * (seconds - stats['average'])
+            stats['count'] += 1
+            stats['recent'].append(seconds)
+            del stats['recent'][:-self.samples]
+            if self._writer is None:
+                self._writer = threading.Thread(
+                    target=self._save_periodically, name="duration-estimates", daemon=True
+                )
+                self._writer.start()
+        self._dirty.set()
+
+    def _matching(self, kind, device, mode, resolution):
+        # None matches anything, e.g. the same mode on any scanner
+        want = (kind, None if device is None else str(device), mode,
+                None if resolution is None else int(resolution))
+        return [stats for key, stats in self._stats.items()
+                if all(w is None or w == k for w, k in zip(want, key))]
+
+    def estimate(self, kind, device=None, mode=None, resolution=None):
+        """Expected duration in seconds, or None if nothing like it ran yet.
+
+        Leaving out ``device``, ``mode`` or ``resolution`` averages over
+        every value seen for it.
+        """
+        with self._lock:
+            matching = self._matching(kind, device, mode, resolution)
+            if not matching:
+                return None
+            return sum(stats['average'] for stats in matching) / len(matching)
+
+    def summary(self, kind, device=None, mode=None, resolution=None):
+        """The estimate with its spread: average, p50, p90 and sample count."""
+        with self._lock:
+            matching = self._matching(kind, device, mode, resolution)
+            if not matching:
+                return None
+            recent = [s for stats in matching for s in stats['recent']]
+            return {
+                "average": sum(stats['average'] for stats in matching) / len(matching),
+                "p50": percentile(recent, 50),
+                "p90": percentile(recent, 90),
+                "count": sum(stats['count'] for stats in matching),
+            }
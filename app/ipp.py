@@ -0,0 +1,321 @@
+"""Just enough of the IPP/1.1 wire format (RFC 8010) to talk to CUPS."""
+
+import http.client
+import itertools
+import os
+import struct
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import quote, unquote, urlsplit
+
+# Operations
+PRINT_JOB = 0x0002
+GET_JOB_ATTRIBUTES = 0x0009
+GET_JOBS = 0x000A
+CUPS_GET_DEFAULT = 0x4001
+
+# Delimiter tags
+OPERATION_ATTRIBUTES = 0x01
+JOB_ATTRIBUTES = 0x02
+END_OF_ATTRIBUTES = 0x03
+PRINTER_ATTRIBUTES = 0x04
+
+# Value tags
+INTEGER = 0x21
+BOOLEAN = 0x22
+ENUM = 0x23
+TEXT = 0x41
+NAME = 0x42
+KEYWORD = 0x44
+URI = 0x45
+CHARSET = 0x47
+NATURAL_LANGUAGE = 0x48
+MIME_MEDIA_TYPE = 0x49
+
+# Status code of an operation on a job the scheduler no longer has
+NOT_FOUND = 0x0406
+
+# Job attributes the tracker reads
+_JOB_ATTRIBUTES = ["job-id", "job-state", "job-state-reasons", "job-printer-uri"]
+
+# job-state enum values
+JOB_STATES = {
+    3: "pending",
+    4: "held",
+    5: "processing",
+    6: "stopped",
+    7: "canceled",
+    8: "aborted",
+    9: "completed",
+}
+
+_COPY_CHUNK = 64 * 1024
+
+
+class IppError(Exception):
+    pass
+
+
+class IppResponse:
+    def __init__(self, status: int, groups: List[Tuple[int, Dict[str, list]]]):
+        self.status = status
+        self.groups = groups
+
+    @property
+    def ok(self) -> bool:
+        return self.status < 0x0100
+
+    def group(self, tag: int) -> Dict[str, list]:
+        """Return the first attribute group with ``tag`` (empty if absent)."""
+        for group_tag, attrs in self.groups:
+            if group_tag == tag:
+                return attrs
+        return {}
+
+    def all(self, tag: int) -> List[Dict[str, list]]:
+        return [attrs for group_tag, attrs in self.groups if group_tag == tag]
+
+    def first(self, tag: int, name: str, default=None):
+        values = self.group(tag).get(name)
+        return values[0] if values else default
+
+    def message(self) -> str:
+        text = self.first(OPERATION_ATTRIBUTES, "status-message")
+        return text or f"IPP status 0x{self.status:04x}"
+
+
+def _encode_value(tag: int, value) -> bytes:
+    if tag in (INTEGER, ENUM):
+        return struct.pack(">i", value)
+    if tag == BOOLEAN:
+        return b"\x01" if value else b"\x00"
+    return str(value).encode("utf-8")
+
+
+def encode_request(operation: int, request_id: int,
+                   attributes: Iterable[Tuple[int, str, object]],
+                   job_attributes: Iterable[Tuple[int, str, object]] = ()) -> bytes:
+    """Encode an IPP request header.
+
+    Attributes are ``(value_tag, name, value)``; a list value becomes a
+    multi-valued attribute.
+    """
+    out = bytearray(struct.pack(">BBHI", 2, 0, operation, request_id))
+
+    for group_tag, attrs in ((OPERATION_ATTRIBUTES, attributes), (JOB_ATTRIBUTES, job_attributes)):
+        attrs = list(attrs)
+        if not attrs:
+            continue
+        out.append(group_tag)
+        for tag, name, value in attrs:
+            values = value if isinstance(value, (list, tuple)) else [value]
+            for i, item in enumerate(values):
+                encoded_name = name.encode("ascii") if i == 0 else b""
+                encoded_value = _encode_value(tag, item)
+                out += struct.pack(">BH", tag, len(encoded_name)) + encoded_name
+                out += struct.pack(">H", len(encoded_value)) + encoded_value
+
+    out.append(END_OF_ATTRIBUTES)
+    return bytes(out)
+
+
+def decode_response(data: bytes) -> IppResponse:
+    if len(data) < 8:
+        raise IppError("Truncated IPP response")
+
+    status, = struct.unpack(">H", data[2:4])
+    groups: List[Tuple[int, Dict[str, list]]] = []
+    current: Optional[Dict[str, list]] = None
+    last_name = None
+    pos = 8
+
+    while pos < len(data):
+        tag = data[pos]
+        pos += 1
+        if tag == END_OF_ATTRIBUTES:
+            break
+        if tag < 0x10:
+            current = {}
+            groups.append((tag, current))
+            continue
+        if current is None:
+            raise IppError("Attribute outside of a group")
+
+        name_len, = struct.unpack(">H", data[pos:pos + 2])
+        pos += 2
+        name = data[pos:pos + name_len].decode("utf-8")
+        pos += name_len
+        value_len, = struct.unpack(">H", data[pos:pos + 2])
+        pos += 2
+        raw = data[pos:pos + value_len]
+        pos += value_len
+
+        if tag in (INTEGER, ENUM) and value_len == 4:
+            value = struct.unpack(">i", raw)[0]
+        elif tag == BOOLEAN:
+            value = raw != b"\x00"
+        elif 0x40 <= tag <= 0x4F:
+            value = raw.decode("utf-8", errors="replace")
+        else:
+            value = raw
+
+        if name:
+            last_name = name
+            current.setdefault(name, []).append(value)
+        elif last_name is not None:
+            current[last_name].append(value)
+
+    return IppResponse(status, groups)
+
+
+class IppClient:
+    """IPP client reusing a single keep-alive HTTP connection.
+
+    Requests are serialized over the connection; a connection dropped by the
+    server between requests is re-opened transparently once.
+    """
+
+    def __init__(self, uri: str = "ipp://localhost:631", timeout: float = 30.0,
+                 user: Optional[str] = None):
+        parts = urlsplit(uri)
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port or 631
+        self.secure = parts.scheme in ("ipps", "https")
+        self.timeout = timeout
+        self.user = user or os.environ.get("USER") or "easyprint"
+        self._conn = None
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def printer_uri(self, printer: str) -> str:
+        return f"ipp://{self.host}:{self.port}/printers/{quote(printer)}"
+
+    def _connection(self):
+        if self._conn is None:
+            cls = http.client.HTTPSConnection if self.secure else http.client.HTTPConnection
+            self._conn = cls(self.host, self.port, timeout=self.timeout)
+        return self._conn
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def request(self, path: str, operation: int,
+                attributes: Iterable[Tuple[int, str, object]],
+                job_attributes: Iterable[Tuple[int, str, object]] = (),
+                document: Optional[str] = None) -> IppResponse:
+        """Send one IPP operation to ``path`` and return the decoded response.
+
+        ``document`` is a file path whose contents are streamed after the
+        IPP header without being read into memory.
+        """
+        base = [
+            (CHARSET, "attributes-charset", "utf-8"),
+            (NATURAL_LANGUAGE, "attributes-natural-language", "en"),
+        ]
+        with self._lock:
+            header = encode_request(
+                operation, next(self._ids), base + list(attributes), job_attributes
+            )
+            length = len(header) + (os.path.getsize(document) if document else 0)
+
+            for attempt in (0, 1):
+                conn = self._connection()
+                try:
+                    conn.request(
+                        "POST", path, body=self._body(header, document),
+                        headers={"Content-Type": "application/ipp",
+                                 "Content-Length": str(length)},
+                    )
+                    response = conn.getresponse()
+                    data = response.read()
+                except (http.client.RemoteDisconnected, BrokenPipeError,
+                        ConnectionResetError, http.client.CannotSendRequest):
+                    # Keep-alive connection went stale; reconnect once
+                    conn.close()
+                    self._conn = None
+                    if attempt:
+                        raise
+                    continue
+                except Exception:
+                    conn.close()
+                    self._conn = None
+                    raise
+
+                if response.status != 200:
+                    raise IppError(f"HTTP {response.status} {response.reason} from {path}")
+                return decode_response(data)
+
+    @staticmethod
+    def _body(header: bytes, document: Optional[str]):
+        yield header
+        if document:
+            with open(document, "rb") as f:
+                while True:
+                    chunk = f.read(_COPY_CHUNK)
+                    if not chunk:
+                        break
+                    yield chunk
+
+    def default_printer(self) -> Optional[str]:
+        response = self.request("/", CUPS_GET_DEFAULT, [
+            (KEYWORD, "requested-attributes", ["printer-name"]),
+        ])
+        if not response.ok:
+            return None
+        return response.first(PRINTER_ATTRIBUTES, "printer-name")
+
+    @staticmethod
+    def _job(attrs: Dict[str, list]) -> Dict[str, object]:
+        printer_uri = (attrs.get("job-printer-uri") or [""])[0]
+        return {
+            "job_id": attrs["job-id"][0],
+            "state": JOB_STATES.get((attrs.get("job-state") or [0])[0], "unknown"),
+            "reasons": ", ".join(r for r in attrs.get("job-state-reasons", []) if r != "none"),
+            "printer": unquote(printer_uri.rsplit("/", 1)[-1]) if printer_uri else None,
+        }
+
+    def get_jobs(self, which: str = "not-completed") -> List[Dict[str, object]]:
+        """Return id, state and printer of the jobs selected by ``which``.
+
+        "all" includes every job CUPS retains, which grows without bound;
+        finished jobs are better looked up one by one with get_job().
+        """
+        response = self.request("/", GET_JOBS, [
+            (URI, "printer-uri", f"ipp://{self.host}:{self.port}/"),
+            (NAME, "requesting-user-name", self.user),
+            (KEYWORD, "which-jobs", which),
+            (KEYWORD, "requested-attributes", _JOB_ATTRIBUTES),
+        ])
+        if not response.ok:
+            raise IppError(response.message())
+        return [self._job(attrs) for attrs in response.all(JOB_ATTRIBUTES) if "job-id" in attrs]
+
+    def get_job(self, job_id: int) -> Optional[Dict[str, object]]:
+        """Return the job like get_jobs() does, or None if the scheduler forgot it."""
+        response = self.request("/", GET_JOB_ATTRIBUTES, [
+            (URI, "job-uri", f"ipp://{self.host}:{self.port}/jobs/{job_id}"),
+            (NAME, "requesting-user-name", self.user),
+            (KEYWORD, "requested-attributes", _JOB_ATTRIBUTES),
+        ])
+        if response.status == NOT_FOUND:
+            return None
+        if not response.ok:
+            raise IppError(response.message())
+        attrs = response.group(JOB_ATTRIBUTES)
+        return self._job(attrs) if "job-id" in attrs else None
+
+    def print_job(self, printer: str, path: str, job_name: Optional[str] = None) -> IppResponse:
+        return self.request(
+            f"/printers/{quote(printer)}",
+            PRINT_JOB,
+            [
+                (URI, "printer-uri", self.printer_uri(printer)),
+                (NAME, "requesting-user-name", self.user),
+                (NAME, "job-name", job_name or os.path.basename(path)),
+                (MIME_MEDIA_TYPE, "document-format", "application/octet-stream"),
+            ],
+            document=path,
+        )
@@ -1,10 +1,25 @@
+import asyncio
 import gradio as gr
 import os
-from datetime import datetime
 from functools import partial
-from PIL import Image
 import sys
+import threading
+import time
 
+from . import metrics
+from .convert import PrintConverter
+from .devices import DeviceRegistry
+from .estimates import DurationStats
+from .ocr import OcrService
+from .pools import pool_from_config
+from . import regions
+from .encoding import MODE_NAMES, extension
+from .backends.errors import BackendError
+from .export import export_link
+from .pdf import PdfWriter, image_to_pdf, is_g4_tiff, is_jpeg
+from .print_jobs import PrintJobTracker, lpstat_jobs
+from .scan_queue import ScanScheduler, DONE
+from .storage import ScanStore
 from .utils import load_config, ensure_directories, check_auth
 
 # Import platform-specific backends conditionally so that
@@ -13,88 +28,834 @@ if sys.platform.startswith("win"):
     from app.backends.windows_printing import WindowsPrintingBackend
     from app.backends.windows_scanning import WindowsScanningBackend
 else:
-    from app.backends.unix_printing import UnixPrintingBackend
+    from app.backends.ipp_printing import IppPrintingBackend
+    from app.backends.unix_printing import UnixPrintingBackend, summarize_results
     from app.backends.unix_scanning import UnixScanningBackend
 
+# Appended to the scan message while its searchable PDF is being made
+OCR_RUNNING = " (recognising text...)"
+
+# Seconds between scan status updates when the scanner reports nothing new
+SCAN_HEARTBEAT = 1.0
+
+# Colour modes offered in the scan tab; their durations are learned
+SCAN_MODES = [("Grayscale", 2), ("Color", 1), ("Black and White", 4)]
+
+# Glass height in mm that a region's share of the scan time is taken from
+GLASS_HEIGHT = 297
+
+# Scans per page of the History tab
+HISTORY_PAGE = 12
+
+# What "Export recent" covers
+EXPORT_DAYS = 7
+
+# Seconds between checks that the web server thread is still alive
+SERVER_WATCH_INTERVAL = 1.0
+
 
 class PrinterScannerApp:
-    def __init__(self, printer: str | None = None, scanner: str | None = None):
+    def __init__(self, printer: str | list | None = None, scanner: str | list | None = None):
         self.config = load_config()
         ensure_directories(self.config)
+        self.storage = ScanStore(self.config)
+        metrics.configure_trace_log(self.config['server'].get('trace_log'))
 
-        # Allow overriding printer and scanner via command-line arguments
+        # Allow overriding printer and scanner via command-line arguments;
+        # several of either replace the configured pool, the first being
+        # the default.
         if printer:
+            printers = [printer] if isinstance(printer, str) else list(printer)
             self.config.setdefault('printing', {})
-            self.config['printing']['default_printer'] = printer
+            self.config['printing']['default_printer'] = printers[0]
+            if len(printers) > 1:
+                self.config['printing']['pool'] = printers
 
         if scanner:
+            scanners = [scanner] if isinstance(scanner, str) else list(scanner)
             self.config.setdefault('scanning', {})
             if sys.platform.startswith("win"):
                 # On Windows, scanner is the numerical device index
                 try:
-                    self.config['scanning']['device_num'] = int(scanner)
+                    scanners = [int(s) for s in scanners]
+                    self.config['scanning']['device_num'] = scanners[0]
                 except ValueError:
                     # If it's not an int, leave config as-is
-                    pass
+                    scanners = []
             else:
                 # On Unix, scanner is the SANE device name
-                self.config['scanning']['unix_device_name'] = scanner
+                self.config['scanning']['unix_device_name'] = scanners[0]
+            if len(scanners) > 1:
+                self.config['scanning']['pool'] = scanners
+
+        # Interchangeable devices that share the load
+        devices_config = self.config.get('devices', {})
+        self.printer_pool = None
+        if not sys.platform.startswith("win"):
+            self.printer_pool = pool_from_config(self.config['printing'], devices_config)
+        self.scanner_pool = pool_from_config(self.config['scanning'], devices_config)
 
         # Select platform-specific backends
+        self.print_backend = self._create_print_backend()
+        self.scan_backend = self._create_scan_backend()
+        self._restart_lock = threading.Lock()
         if sys.platform.startswith("win"):
-            self.print_backend = WindowsPrintingBackend(self.config)
-            self.scan_backend = WindowsScanningBackend(self.config)
+            default_scanner = self.config['scanning'].get('device_num')
         else:
-            self.print_backend = UnixPrintingBackend(self.config)
-            self.scan_backend = UnixScanningBackend(self.config)
+            default_scanner = self.config['scanning'].get('unix_device_name')
+
+        # Uploads are converted to print-ready files once per distinct file
+        self.converter = PrintConverter(self.config)
+        self.ocr = OcrService(self.config, self.storage)
+
+        # Job status is polled by one shared thread, not per user
+        self.print_jobs = None
+        if not sys.platform.startswith("win"):
+            self.print_jobs = PrintJobTracker(
+                self._query_print_jobs,
+                interval=self.config['printing'].get('status_interval', 5),
+                ttl=self.config['printing'].get('status_ttl', 900),
+                lookup=self._lookup_print_job,
+            )
+            if self.printer_pool is not None:
+                self.printer_pool.load = self.print_jobs.queue_length
+
+        # How long jobs take on each device, learned as they finish
+        self.durations = DurationStats(
+            os.path.join(self.config['storage']['scan_dir'], "durations.json")
+        )
+        if self.print_jobs is not None:
+            self.print_jobs.on_finished = self._learn_print
+
+        # One FIFO queue per device so concurrent scans don't collide
+        self.scan_scheduler = ScanScheduler(self.scan_backend, default_scanner, self.scanner_pool)
+        self.scan_scheduler.on_error = lambda job, error, backend: self.restart_backend('scan', backend)
+        self.scan_scheduler.on_finished = self._learn_scan
+        self.scan_scheduler.estimate = self._expected_scan
+        self.default_scanner = default_scanner
+        self.previews = regions.PreviewCache(
+            self.config['storage']['scan_dir'], self.config['scanning'].get('preview_scan_ttl', 300)
+        )
+
+        # Device lists come from a cache (persisted across restarts) that is
+        # refreshed in the background, so the UI never waits on a probe.
+        self.devices = DeviceRegistry(
+            os.path.join(self.config['storage']['scan_dir'], "devices.json"),
+            ttl=self.config.get('devices', {}).get('refresh_interval', 300),
+        )
+        self.devices.refresh_async()
+        if self.printer_pool is not None:
+            self.printer_pool.probe = lambda p: self._listed(p, self.devices.printers())
+        if self.scanner_pool is not None:
+            self.scanner_pool.probe = lambda s: self._listed(
+                s, [device for device, _ in self.devices.scanners()]
+            )
 
         self.setup_app()
 
-    def print_file(self, username, files):
+    @staticmethod
+    def _listed(device, listed):
+        # An empty list means discovery itself failed, which says nothing
+        # about the device
+        return device in listed or not listed
+
+    def _create_print_backend(self):
+        if sys.platform.startswith("win"):
+            return WindowsPrintingBackend(self.config)
+        if self.config['printing'].get('backend', 'ipp') == 'ipp':
+            return IppPrintingBackend(self.config, self.printer_pool)
+        return UnixPrintingBackend(self.config, self.printer_pool)
+
+    def _create_scan_backend(self):
+        if sys.platform.startswith("win"):
+            return WindowsScanningBackend(self.config)
+        if self.config['scanning'].get('engine', 'scanimage') == 'sane':
+            try:
+                # Imported on demand: python-sane is optional and loads
+                # every SANE backend library when imported.
+                from app.backends.sane_scanning import SaneScanningBackend
+                return SaneScanningBackend(self.config)
+            except Exception as e:
+                print("SANE engine unavailable, falling back to scanimage\n%s" % e)
+        return UnixScanningBackend(self.config)
+
+    def _query_print_jobs(self):
+        if isinstance(self.print_backend, IppPrintingBackend):
+            # Finished jobs are looked up one by one (_lookup_print_job)
+            return self.print_backend.client.get_jobs("not-completed"), False
+        return lpstat_jobs()
+
+    def _lookup_print_job(self, job_id):
+        if isinstance(self.print_backend, IppPrintingBackend):
+            return self.print_backend.client.get_job(job_id)
+        return None
+
+    def restart_backend(self, kind, failed=None):
+        """Replace a failed backend without touching the server or the UI.
+
+        ``failed`` is the backend that raised; when concurrent failures
+        restart it, only the first one does.
+        """
+        with self._restart_lock:
+            if kind == 'print':
+                if failed is not None and failed is not self.print_backend:
+                    return
+                old, self.print_backend = self.print_backend, self._create_print_backend()
+                close = getattr(old, 'close', None)
+                if close:
+                    try:
+                        close()
+                    except Exception:
+                        pass
+                # Conversion workers are started again on demand
+                self.converter.close()
+            else:
+                if failed is not None and failed is not self.scan_backend:
+                    return
+                # Scans on other devices may still be using the old one
+                self.scan_backend = self._create_scan_backend()
+                self.scan_scheduler.replace_backend(self.scan_backend)
+        print(f"{kind} backend restarted")
+
+    async def print_file(self, username, files, printer=None):
+        message, _ = await self.submit_print(username, files, printer)
+        return message
+
+    async def submit_print(self, username, files, printer=None):
+        """Print ``files`` and return the status line and the per-file results.
+
+        The results are None when nothing was submitted or the backend does
+        not report individual jobs.
+        """
+        trace = metrics.Trace("print", user=username)
+        with metrics.IN_FLIGHT.track(op="print"):
+            try:
+                message, results = await self._print_file(trace, username, files, printer)
+            except asyncio.CancelledError:
+                trace.finish("cancelled")
+                raise
+        trace.finish("ok" if message.startswith("Files sent") else "error")
+        return message, results
+
+    async def _print_file(self, trace, username, files, printer):
         if self.config['server']['auth_enabled'] and not username:
-            return "Authentication required"
+            return "Authentication required", None
 
+        default_printer = self.config['printing'].get('default_printer') or None
+        pool = self.printer_pool.members if self.printer_pool else []
+        if not printer and not pool:
+            printer = default_printer
+        # No printer with a pool lets the backend pick the least busy member
+        printer = printer or None
+        if (printer and printer != default_printer and printer not in pool
+                and printer not in self.devices.printers()):
+            return f"Unknown printer: {printer}", None
+
+        backend = self.print_backend
         try:
+            validate_start = time.perf_counter()
             file_paths = []
             for file in files:
+                # Gradio 3 passes file objects whose .name is the temp file
+                # path; newer versions pass the path itself.
+                path = getattr(file, 'name', file)
+
                 # Check file extension
-                _, ext = os.path.splitext(file.name)
+                _, ext = os.path.splitext(path)
                 if ext.lower() not in self.config['printing']['allowed_extensions']:
-                    return f"File type {ext} not allowed"
+                    return f"File type {ext} not allowed", None
 
-                # Gradio's file objects expose a .name which is the temp file path
-                file_paths.append(file.name)
+                file_paths.append(path)
+            trace.add("validate", time.perf_counter() - validate_start)
 
-            return self.print_backend.print_files(file_paths)
+            with trace.phase("convert"):
+                ready = await self.converter.prepare_async(file_paths)
 
+            if self.print_jobs is None:
+                with metrics.bind(trace):
+                    return await asyncio.to_thread(backend.print_files, ready, printer), None
+
+            with metrics.bind(trace):
+                results = await backend.submit_files_async(ready, printer)
+            # Report and track jobs under the names that were uploaded
+            for result, path in zip(results, file_paths):
+                result['path'] = path
+            self.print_jobs.track(results, owner=username)
+            printer = next((r['printer'] for r in results if r['printer']), printer)
+            return summarize_results(results, printer) + self._print_wait_note(printer), results
+
+        except BackendError as e:
+            self.restart_backend('print', backend)
+            return f"Error printing file: {str(e)}", None
         except Exception as e:
-            return f"Error printing file: {str(e)}"
+            # The upload or its conversion, not the printing system
+            return f"Error printing file: {str(e)}", None
+
+    # ---------------------- Duration estimates ----------------------
+
+    def _learn_print(self, job):
+        # From the start of printing, not submission: time spent waiting in
+        # the CUPS queue is what _print_wait_note multiplies out
+        mode = os.path.splitext(job['file'])[1].lower()
+        self.durations.record(
+            "print", job['printer'], mode, self.config['printing'].get('dpi'),
+            job['finished'] - job['started'],
+        )
+
+    def _print_wait_note(self, printer):
+        expected = self.durations.estimate("print", printer) if printer else None
+        if expected is None or self.print_jobs is None:
+            return ""
+        # Our jobs are in the queue already
+        wait = self.print_jobs.queue_length(printer) * expected
+        return f" (printed in about {wait:.0f}s)" if wait >= 1 else ""
+
+    def _scan_key(self, job):
+        resolution = job.resolution or self.config['scanning'].get('resolution', 300)
+        return job.device, MODE_NAMES.get(job.colormode), resolution
+
+    def _learn_scan(self, job):
+        # A region's time depends on its size; it would skew the page estimate
+        if job.region:
+            return
+        device, mode, resolution = self._scan_key(job)
+        seconds = job.finished - job.started
+        if job.batch:
+            if job.pages:
+                self.durations.record("feeder", device, mode, resolution, seconds / len(job.pages))
+            return
+        self.durations.record("scan", device, mode, resolution, seconds)
+
+    def _expected_scan(self, job):
+        if job.batch:
+            return None  # the number of sheets is unknown
+        device, mode, resolution = self._scan_key(job)
+        expected = self.durations.estimate("scan", device, mode, resolution)
+        if expected is None:
+            # Learned on another scanner, better than nothing
+            expected = self.durations.estimate("scan", None, mode, resolution)
+        if expected is not None and job.region:
+            _, top, _, height = job.region
+            expected *= min(1.0, (top + height) / GLASS_HEIGHT)
+        return expected
+
+    def mode_choices(self, device=None):
+        """The colour modes, labelled with how long a page takes on ``device``."""
+        resolution = self.config['scanning'].get('resolution', 300)
+        # "" is the pool's "first free scanner"; 0 is the first WIA device
+        if device == "":
+            device = None
+        choices = []
+        for label, colormode in SCAN_MODES:
+            summary = self.durations.summary(
+                "scan", device, MODE_NAMES[colormode], resolution
+            )
+            if summary is not None:
+                label += f" (ca {summary['average']:.0f}s"
+                if summary['count'] >= 5 and summary['p90'] > 1.2 * summary['average']:
+                    label += f", up to {summary['p90']:.0f}s"
+                label += ")"
+            choices.append((label, colormode))
+        return choices
+
+    def refresh_mode_choices(self, device):
+        return gr.update(choices=self.mode_choices(device))
+
+    def list_print_jobs(self, username):
+        if self.print_jobs is None:
+            return []
+        if self.config['server']['auth_enabled']:
+            if not username:
+                return []
+            return self.print_jobs.rows(owner=username)
+        return self.print_jobs.rows()
+
+    @staticmethod
+    def _health_label(pool, label, device):
+        """``label``, marked if ``pool`` currently skips ``device`` as unhealthy."""
+        if pool is not None and pool.status().get(device) == "down":
+            return f"{label} - not responding"
+        return label
+
+    def printer_choices(self):
+        printers = self.devices.printers()
+        default = self.config['printing'].get('default_printer')
+        if default and default not in printers:
+            printers.insert(0, default)
+        choices = [(self._health_label(self.printer_pool, p, p), p) for p in printers]
+        if self.printer_pool is not None:
+            choices.insert(0, ("Least busy printer", ""))
+        return choices
+
+    def scanner_choices(self):
+        scanners = [(self._health_label(self.scanner_pool, f"{desc} ({dev})", dev), dev)
+                    for dev, desc in self.devices.scanners()]
+        if self.default_scanner is not None and not self.devices.is_known_scanner(self.default_scanner):
+            scanners.insert(0, (self._health_label(self.scanner_pool, str(self.default_scanner),
+                                                   self.default_scanner), self.default_scanner))
+        if self.scanner_pool is not None:
+            scanners.insert(0, ("First free scanner", ""))
+        return scanners
+
+    def refresh_devices(self):
+        # Kick off a probe and answer from the cache right away; newly found
+        # devices show up on the next refresh or page load.
+        self.devices.refresh_async()
+        return (
+            gr.update(choices=self.printer_choices()),
+            gr.update(choices=self.scanner_choices()),
+        )
+
+    async def scan_document(self, username, colormode, use_feeder=False, device=None, selection=None):
+        """Scan a page, or the feeder; ``selection`` is the region picked on a preview."""
+        region = None
+        if selection and selection.get('region') and not use_feeder:
+            # Only the scanner the preview came from knows where the region is
+            region = tuple(selection['region'])
+            device = selection.get('device') or device
+        trace = metrics.Trace(
+            "scan", user=username, mode=MODE_NAMES.get(colormode), feeder=bool(use_feeder),
+            region=region is not None,
+        )
+        outcome = "error"
+        metrics.IN_FLIGHT.inc(op="scan")
+        try:
+            async for update in self._scan_document(
+                    trace, username, colormode, use_feeder, device, region):
+                message = update[-1]
+                if isinstance(message, str) and message.startswith("Scan completed"):
+                    outcome = "ok"
+                yield update
+        finally:
+            metrics.IN_FLIGHT.dec(op="scan")
+            trace.finish(outcome)
+
+    def _record_scan(self, trace, status, colormode):
+        if status and status['started']:
+            trace.add("queue", status['started'] - status['submitted'])
+            if status['finished']:
+                metrics.SCAN_SECONDS.observe(
+                    status['finished'] - status['started'], mode=MODE_NAMES.get(colormode, "")
+                )
+
+    def _resolve_scanner(self, device):
+        """The scanner to submit to (None lets the pool pick), or an error message."""
+        pool = self.scanner_pool.members if self.scanner_pool else []
+        if device is None or device == "":
+            # With a pool the scheduler picks the first free scanner
+            return (None if pool else self.default_scanner), None
+        if (device != self.default_scanner and device not in pool
+                and not self.devices.is_known_scanner(device)):
+            return None, f"Unknown scanner: {device}"
+        return device, None
+
+    def _queue_message(self, status, what="Scanning"):
+        if status['state'] == 'queued':
+            wait = status['wait']
+            wait = f", about {wait:.0f}s" if wait is not None and wait >= 1 else ""
+            return (f"Waiting for scanner (position {status['position']} "
+                    f"of {status['depth']} in queue{wait})")
+        message = f"{what} on {status['device']}..." if self.scanner_pool else f"{what}..."
+        if status['progress'] is not None:
+            message += f" {status['progress']:.0f}%"
+        return f"{message} ({time.time() - status['started']:.0f} s)"
 
-    def scan_document(self, username, colormode):
+    async def _scan_document(self, trace, username, colormode, use_feeder, device, region=None):
         if self.config['server']['auth_enabled'] and not username:
-            return "Authentication required"
+            yield None, None, "Authentication required"
+            return
+
+        device, error = self._resolve_scanner(device)
+        if error:
+            yield None, None, error
+            return
 
         try:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            output_file = os.path.join(
-                self.config['storage']['scan_dir'],
-                f"scan_{timestamp}.jpg"
-            )
+            # Unique per scan, so two scans in the same second can't collide
+            stem = self.storage.new_stem()
+            if use_feeder:
+                async for update in self._scan_batch(trace, username, colormode, stem, device):
+                    yield update
+                return
 
-            ok, msg = self.scan_backend.scan_document(colormode, output_file)
+            output_file = stem + extension(MODE_NAMES.get(colormode))
+            # The page on the glass is about to change; its preview goes with it
+            self.previews.drop(device, username)
 
-            if not ok:
-                return None, None, msg
+            job_id = self.scan_scheduler.submit(
+                colormode, output_file, device=device, owner=username, trace=trace,
+                region=region,
+            )
+
+            # Report queue progress while the device worker handles the job;
+            # waiting here is an await, not a blocked worker thread.
+            status = None
+            shown = None
+            try:
+                async for status in self.scan_scheduler.watch(job_id, SCAN_HEARTBEAT):
+                    if status['state'] in ('queued', 'running'):
+                        # The top of the page shows as soon as it is encoded
+                        rows = status['rows']
+                        image = gr.update() if rows is shown else rows
+                        shown = rows
+                        yield gr.update(), image, self._queue_message(
+                            status, "Scanning region" if region else "Scanning"
+                        )
+            finally:
+                # Does nothing once the job is done; otherwise the client went
+                # away mid-scan and the scanner is freed for the next user
+                if self.scan_scheduler.cancel(job_id):
+                    self._after_job(job_id, lambda: self._discard(output_file))
+            self._record_scan(trace, status, colormode)
 
-            # load the image to add it into preview
-            image = Image.open(output_file)
-            pdfPath = output_file.replace(".jpg", ".pdf")
-            image.save(pdfPath, "PDF", resolution=300.0)
+            if status is None or status['state'] != DONE:
+                yield None, None, status['message'] if status else "Scan job was lost"
+                return
 
-            return [output_file, pdfPath], image, "Scan completed successfully"
+            yield await asyncio.to_thread(
+                self._finish_scan, output_file, username, colormode, trace
+            )
 
         except Exception as e:
-            return None, None, [f"Error scanning document: {str(e)}"]
+            yield None, None, [f"Error scanning document: {str(e)}"]
+
+    async def _scan_batch(self, trace, username, colormode, stem, device=None):
+        if not hasattr(self.scan_backend, 'scan_batch'):
+            yield None, None, "Document feeder scanning is not supported on this platform"
+            return
+
+        pattern = f"{stem}_p%03d" + extension(MODE_NAMES.get(colormode))
+        pdfPath = f"{stem}.pdf"
+        resolution = float(self.config['scanning'].get('resolution', 300))
+
+        # Pages are appended to the PDF on the device worker as soon as
+        # scanimage finishes them; after each page the file is a complete PDF.
+        pdf_file = open(pdfPath, "wb")
+        writer = PdfWriter(pdf_file)
+        blank = []
+
+        def on_page(path):
+            with trace.phase("postprocess"):
+                keep = self._postprocess(path, colormode, drop_blank=True)
+            if not keep:
+                blank.append(path)
+                os.remove(path)
+                return False
+            with metrics.PDF_SECONDS.time(method="incremental"), trace.phase("encode"):
+                writer.add_page(path, resolution)
+                writer.flush()
+
+        job_id = None
+        try:
+            job_id = self.scan_scheduler.submit(
+                colormode, pattern, device=device, owner=username,
+                batch=True, on_page=on_page, trace=trace,
+            )
+
+            status = None
+            async for status in self.scan_scheduler.watch(job_id, SCAN_HEARTBEAT):
+                if status['state'] == 'queued':
+                    yield gr.update(), gr.update(), self._queue_message(status)
+                elif status['state'] == 'running' and status['pages']:
+                    yield [pdfPath], gr.update(), (
+                        f"Scanned {len(status['pages'])} page(s), feeding next sheet..."
+                    )
+                elif status['state'] == 'running':
+                    yield gr.update(), gr.update(), "Scanning from document feeder..."
+        finally:
+            if job_id is not None and self.scan_scheduler.cancel(job_id):
+                # The worker may still be adding a page to the PDF
+                def cleanup():
+                    writer.close()
+                    pdf_file.close()
+                    self._discard(pdfPath, *self.scan_scheduler.get(job_id).pages)
+                self._after_job(job_id, cleanup)
+            else:
+                writer.close()
+                pdf_file.close()
+        self._record_scan(trace, status, colormode)
+
+        if status is None or not writer.page_count:
+            if not writer.page_count:
+                os.remove(pdfPath)
+            if status is None:
+                yield None, None, "Scan job was lost"
+            elif status['state'] != DONE:
+                yield None, None, status['message']
+            else:
+                yield None, None, f"Only blank pages were scanned ({len(blank)} skipped)"
+            return
+
+        preview = await asyncio.to_thread(self._preview, status['pages'][0])
+        scan_id = await asyncio.to_thread(
+            self.storage.add, stem, [pdfPath, *status['pages'], preview],
+            username, MODE_NAMES.get(colormode), len(status['pages']),
+        )
+        self.ocr.submit(scan_id, pdfPath, status['pages'])
+        if status['state'] != DONE:
+            # A jam or open cover mid-batch: keep what was scanned before it
+            yield [pdfPath], preview, (
+                f"{status['message']} ({len(status['pages'])} pages scanned before the error)"
+            )
+            return
+        skipped = f", {len(blank)} blank skipped" if blank else ""
+        yield [pdfPath], preview, (
+            f"Scan completed successfully ({len(status['pages'])} pages{skipped})"
+            + self._ocr_note(pdfPath)
+        )
+
+    def _finish_scan(self, output_file, username=None, colormode=None, trace=None):
+        resolution = float(self.config['scanning'].get('resolution', 300))
+        pdfPath = os.path.splitext(output_file)[0] + ".pdf"
+        with metrics.bind(trace), metrics.phase("postprocess"):
+            self._postprocess(output_file, colormode)
+        start = time.perf_counter()
+        if is_jpeg(output_file) or is_g4_tiff(output_file):
+            # Embed the encoded page as-is instead of decoding and re-encoding it
+            method = "direct"
+            image_to_pdf(output_file, pdfPath, resolution)
+        else:
+            from PIL import Image
+            method = "pil"
+            Image.open(output_file).save(pdfPath, "PDF", resolution=resolution)
+        elapsed = time.perf_counter() - start
+        metrics.PDF_SECONDS.observe(elapsed, method=method)
+        if trace is not None:
+            trace.add("encode", elapsed)
+
+        preview = self._preview(output_file)
+        scan_id = self.storage.add(
+            os.path.splitext(output_file)[0], [pdfPath, output_file, preview],
+            username, MODE_NAMES.get(colormode),
+        )
+        self.ocr.submit(scan_id, pdfPath, [output_file])
+
+        return [output_file, pdfPath], preview, "Scan completed successfully" + self._ocr_note(pdfPath)
+
+    def _after_job(self, job_id, cleanup):
+        """Run ``cleanup()`` once a cancelled job's worker has let go of its files."""
+        def run():
+            self.scan_scheduler.wait(job_id)
+            cleanup()
+        threading.Thread(target=run, name=f"scan-cleanup-{job_id}", daemon=True).start()
+
+    @staticmethod
+    def _discard(*paths):
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _ocr_note(self, pdfPath):
+        return OCR_RUNNING if self.ocr.pending(pdfPath) else ""
+
+    async def searchable_scan(self, files, message):
+        """Add the searchable PDF of the last scan to the downloads once OCR is done.
+
+        Chained after the scan, so waiting here does not hold up the next scan.
+        """
+        if not files or not isinstance(message, str) or OCR_RUNNING not in message:
+            return gr.update(), gr.update()
+        pdf = next((f for f in files if f.endswith(".pdf")), None)
+        if pdf is None:
+            return gr.update(), gr.update()
+        # Gradio hands back its own copies; the scan's name is unique in scan_dir
+        searchable = await self.ocr.wait(
+            os.path.join(self.storage.scan_dir, os.path.basename(pdf))
+        )
+        message = message.replace(OCR_RUNNING, "")
+        if searchable is None:
+            return gr.update(), f"{message} (text recognition failed)"
+        return [*files, searchable], f"{message} (searchable PDF added)"
+
+    def _postprocess(self, path, colormode, drop_blank=False):
+        """Crop the page's margins; returns False for a blank page to drop."""
+        scanning = self.config['scanning']
+        drop_blank = drop_blank and scanning.get('skip_blank_pages', False)
+        if not drop_blank and not scanning.get('auto_crop', False):
+            return True
+
+        from .postprocess import analyze, crop_page, is_blank  # NumPy only when enabled
+
+        analysis = analyze(path)
+        if drop_blank and is_blank(analysis, scanning.get('blank_threshold', 0.002)):
+            return False
+        if scanning.get('auto_crop', False):
+            crop_page(path, MODE_NAMES.get(colormode), analysis, scanning.get('jpeg_quality'))
+        return True
+
+    def _preview(self, scan_path):
+        # Only a bounded thumbnail goes to the browser; the full-resolution
+        # scan is available through the download component.
+        from .preview import make_preview  # PIL is only needed once a scan exists
+
+        scanning = self.config['scanning']
+        return make_preview(
+            scan_path,
+            max_edge=scanning.get('preview_max_edge', 1024),
+            fmt=scanning.get('preview_format', 'jpeg'),
+        )
+
+    # ---------------------- Preview and region ----------------------
+
+    def _preview_resolution(self):
+        return self.config['scanning'].get('preview_scan_resolution', regions.PREVIEW_RESOLUTION)
+
+    async def preview_scan(self, username, device, selection=None, rescan=False):
+        """Quick low-resolution pass over the glass to pick a region on.
+
+        The preview is kept per scanner and user, so asking again shows it at once
+        unless ``rescan`` is set. Yields (preview image, selection, message).
+        """
+        if self.config['server']['auth_enabled'] and not username:
+            yield None, None, "Authentication required"
+            return
+        if not device and selection:
+            # With a pool, stay on the scanner of the previous preview
+            device = selection.get('device')
+        device, error = self._resolve_scanner(device)
+        if error:
+            yield None, None, error
+            return
+
+        cached = self.previews.get(device, username) if device is not None and not rescan else None
+        if cached:
+            yield (await asyncio.to_thread(regions.mark, cached, self._preview_resolution()),
+                   {"device": device, "preview": cached},
+                   "Click two opposite corners of the area to scan")
+            return
+
+        resolution = self._preview_resolution()
+        output_file = self.storage.new_stem(regions.PREVIEW_PREFIX) + extension(
+            MODE_NAMES.get(regions.PREVIEW_COLORMODE))
+        job_id = self.scan_scheduler.submit(
+            regions.PREVIEW_COLORMODE, output_file, device=device, owner=username,
+            resolution=resolution,
+        )
+        status = None
+        try:
+            async for status in self.scan_scheduler.watch(job_id, SCAN_HEARTBEAT):
+                if status['state'] in ('queued', 'running'):
+                    yield gr.update(), gr.update(), self._queue_message(status, "Previewing")
+        finally:
+            if self.scan_scheduler.cancel(job_id):
+                self._after_job(job_id, lambda: self._discard(output_file))
+
+        if status is None or status['state'] != DONE:
+            yield None, None, status['message'] if status else "Scan job was lost"
+            return
+        self.previews.put(status['device'], username, output_file)
+        yield (await asyncio.to_thread(regions.mark, output_file, resolution),
+               {"device": status['device'], "preview": output_file},
+               "Click two opposite corners of the area to scan")
+
+    def select_region(self, selection, evt: gr.SelectData):
+        """Place a corner of the region where the preview was clicked."""
+        if not selection or not os.path.exists(selection.get('preview', "")):
+            return None, None, "Take a preview first"
+        resolution = self._preview_resolution()
+        point = tuple(evt.index)
+        corner = selection.get('corner')
+        if corner is None:
+            selection = {**selection, "corner": point, "region": None}
+            return (regions.mark(selection['preview'], resolution, corner=point),
+                    selection, "Now click the opposite corner")
+
+        region = regions.region_from_corners(corner, point, resolution)
+        selection = {**selection, "corner": None, "region": region}
+        if region is None:
+            return (regions.mark(selection['preview'], resolution), selection,
+                    "That area is too small; click two opposite corners")
+        return (regions.mark(selection['preview'], resolution, region=region), selection,
+                f"Start Scan captures {regions.describe(region)}")
+
+    def forget_preview(self, username, selection):
+        """Drop the preview and region; they only apply to the scanner they were taken on."""
+        if selection:
+            self.previews.drop(selection.get('device'), username)
+        return None, None
+
+    def clear_region(self, selection):
+        if not selection or not os.path.exists(selection.get('preview', "")):
+            return None, None, ""
+        selection = {**selection, "corner": None, "region": None}
+        return (regions.mark(selection['preview'], self._preview_resolution()), selection,
+                "Start Scan captures the full page")
+
+    # ---------------------- History ----------------------
+
+    def _thumbnail(self, scan):
+        previews = [f for f in scan['files'] if ".preview." in os.path.basename(f)]
+        if previews and os.path.exists(previews[0]):
+            return previews[0]
+        # Older scans: made now, for the pages that are actually shown
+        pages = [f for f in scan['files'][1:]
+                 if f not in previews and not f.endswith(".pdf") and os.path.exists(f)]
+        return self._preview(pages[0]) if pages else None
+
+    def history(self, username, cursors=None):
+        """One page of ``username``'s scans from the index, newest first.
+
+        ``cursors`` holds the ``before`` value of every page up to the one
+        to show. Returns the gallery, the selection choices, the cursors,
+        the ``before`` value of the next older page (None at the end) and a
+        status line.
+        """
+        cursors = list(cursors or [None])
+        if self.config['server']['auth_enabled'] and not username:
+            return [], gr.update(choices=[], value=[]), [None], None, "Log in to see your scans"
+
+        scans = self.storage.list(owner=username, limit=HISTORY_PAGE + 1, before=cursors[-1])
+        older = scans[HISTORY_PAGE - 1]['created'] if len(scans) > HISTORY_PAGE else None
+        scans = scans[:HISTORY_PAGE]
+
+        gallery, choices = [], []
+        for scan in scans:
+            pages = f"{scan['pages']} page{'s' if scan['pages'] != 1 else ''}"
+            label = " · ".join(filter(None, [
+                time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(scan['created'])),
+                scan['mode'], pages,
+            ]))
+            thumbnail = self._thumbnail(scan)
+            if thumbnail:
+                gallery.append((thumbnail, label))
+            choices.append((label, scan['id']))
+
+        if not scans:
+            status = "No scans yet"
+        else:
+            status = f"Page {len(cursors)}: {len(scans)} scan{'s' if len(scans) != 1 else ''}"
+        return gallery, gr.update(choices=choices, value=[]), cursors, older, status
+
+    def history_older(self, username, cursors, older):
+        if older is None:
+            return self.history(username, cursors)
+        return self.history(username, list(cursors) + [older])
+
+    def history_newer(self, username, cursors):
+        return self.history(username, list(cursors)[:-1] or [None])
+
+    def export_selected(self, username, scan_ids):
+        if self.config['server']['auth_enabled'] and not username:
+            return "Log in to export your scans"
+        if not scan_ids:
+            return "Select the scans to export first"
+        return self._download_link(export_link(username, ids=scan_ids),
+                                   f"Download {len(scan_ids)} scans as ZIP")
+
+    def export_recent(self, username):
+        if self.config['server']['auth_enabled'] and not username:
+            return "Log in to export your scans"
+        since = time.time() - EXPORT_DAYS * 86400
+        if not self.storage.list(owner=username, limit=1, since=since):
+            return f"No scans in the last {EXPORT_DAYS} days"
+        return self._download_link(export_link(username, since=since),
+                                   f"Download the last {EXPORT_DAYS} days as ZIP")
+
+    @staticmethod
+    def _download_link(url, text):
+        return f'<a href="{url}" download>{text}</a> (link valid for an hour)'
 
     def setup_app(self):
         self.app = gr.Blocks()
@@ -147,33 +908,201 @@ class PrinterScannerApp:
 
             with gr.Tab("Print Document"):
                 file_input = gr.File(label="Upload files to print", file_count='multiple')
+                with gr.Row():
+                    printer_dropdown = gr.Dropdown(
+                        label="Printer",
+                        choices=self.printer_choices(),
+                        value="" if self.printer_pool else
+                        self.config['printing'].get('default_printer') or None,
+                    )
+                    printer_refresh_button = gr.Button("Refresh devices", size="sm")
                 print_button = gr.Button("Print")
                 print_output = gr.Textbox(label="Status")
+                with gr.Row():
+                    gr.Markdown("### Print jobs")
+                    jobs_refresh_button = gr.Button("Refresh", size="sm")
+                jobs_table = gr.Dataframe(
+                    headers=["Job", "File", "Printer", "State", "Submitted"],
+                    interactive=False,
+                )
                 print_button.click(
                     fn=partial(self.print_file),
-                    inputs=[username_state, file_input],
-                    outputs=print_output
+                    inputs=[username_state, file_input, printer_dropdown],
+                    outputs=print_output,
+                    api_name="print_file",
+                    # Handlers are async: a waiting session holds no thread
+                    concurrency_limit=self.config['printing'].get('concurrency_limit', 16),
+                ).then(
+                    fn=self.list_print_jobs,
+                    inputs=[username_state],
+                    outputs=jobs_table
+                )
+                jobs_refresh_button.click(
+                    fn=self.list_print_jobs,
+                    inputs=[username_state],
+                    outputs=jobs_table
                 )
 
             with gr.Tab("Scan Document"):
                 with gr.Row():
                     with gr.Column():
-                        color_dropdown = gr.Dropdown(choices=[
-                            ("Grayscale (ca 12s)", 2),
-                            ("Color (ca 17s)", 1),
-                            ("Black and White (ca 6s)", 4)])
+                        with gr.Row():
+                            scanner_dropdown = gr.Dropdown(
+                                label="Scanner",
+                                choices=self.scanner_choices(),
+                                value="" if self.scanner_pool else self.default_scanner,
+                            )
+                            scanner_refresh_button = gr.Button("Refresh devices", size="sm")
+                        color_dropdown = gr.Dropdown(choices=self.mode_choices(
+                            None if self.scanner_pool else self.default_scanner))
+                        feeder_checkbox = gr.Checkbox(
+                            label="Scan all pages from the document feeder",
+                            value=False,
+                        )
+                        with gr.Row():
+                            preview_button = gr.Button("Preview")
+                            rescan_button = gr.Button("New preview")
+                            full_page_button = gr.Button("Full page")
                         scan_button = gr.Button("Start Scan")
                     with gr.Column():
                         scan_output = gr.File(label="Document Download")
                 scan_result = gr.Textbox(label="Scan Result")
-                scan_image = gr.Image(label="File Preview")
-                scan_button.click(
-                    fn=partial(self.scan_document),
-                    inputs=[username_state, color_dropdown],
-                    outputs=[scan_output, scan_image, scan_result]
+                # The low-resolution preview a region is picked on
+                selection_state = gr.State(None)
+                region_image = gr.Image(
+                    label="Preview: click two opposite corners to scan only that area",
+                    type="pil", interactive=False,
+                )
+                scan_image = gr.Image(label="File Preview", type="filepath")
+
+                for button, rescan in ((preview_button, False), (rescan_button, True)):
+                    button.click(
+                        fn=partial(self.preview_scan, rescan=rescan),
+                        inputs=[username_state, scanner_dropdown, selection_state],
+                        outputs=[region_image, selection_state, scan_result],
+                        api_name="new_preview" if rescan else "preview_scan",
+                        concurrency_limit=self.config['scanning'].get('concurrency_limit', 32),
+                    )
+                region_image.select(
+                    fn=self.select_region,
+                    inputs=[selection_state],
+                    outputs=[region_image, selection_state, scan_result],
+                )
+                full_page_button.click(
+                    fn=self.clear_region,
+                    inputs=[selection_state],
+                    outputs=[region_image, selection_state, scan_result],
+                )
+
+                scanner_dropdown.change(
+                    fn=self.forget_preview,
+                    inputs=[username_state, selection_state],
+                    outputs=[region_image, selection_state],
+                )
+                scan_done = scan_button.click(
+                    fn=self.scan_document,
+                    inputs=[username_state, color_dropdown, feeder_checkbox, scanner_dropdown,
+                            selection_state],
+                    outputs=[scan_output, scan_image, scan_result],
+                    api_name="scan_document",
+                    concurrency_limit=self.config['scanning'].get('concurrency_limit', 32),
+                )
+                scan_done.then(
+                    fn=self.searchable_scan,
+                    inputs=[scan_output, scan_result],
+                    outputs=[scan_output, scan_result],
+                    concurrency_limit=None,
+                )
+                # The estimates in the labels include the scan just made
+                for trigger in (scan_done.then, scanner_dropdown.change, self.app.load):
+                    trigger(
+                        fn=self.refresh_mode_choices,
+                        inputs=[scanner_dropdown],
+                        outputs=[color_dropdown],
+                    )
+
+            # Thumbnails are only looked up once the tab is opened
+            with gr.Tab("History") as history_tab:
+                history_cursors = gr.State([None])
+                history_older = gr.State(None)
+                with gr.Row():
+                    newer_button = gr.Button("Newer", size="sm")
+                    older_button = gr.Button("Older", size="sm")
+                    history_refresh_button = gr.Button("Refresh", size="sm")
+                history_status = gr.Markdown()
+                history_gallery = gr.Gallery(
+                    label="Past scans", columns=6, height="auto",
+                    object_fit="contain", allow_preview=False,
+                )
+                history_selection = gr.CheckboxGroup(label="Select scans to export")
+                with gr.Row():
+                    export_selected_button = gr.Button("Export selected")
+                    export_recent_button = gr.Button(f"Export last {EXPORT_DAYS} days")
+                export_link_html = gr.HTML()
+
+                history_outputs = [history_gallery, history_selection,
+                                   history_cursors, history_older, history_status]
+                for trigger in (history_tab.select, history_refresh_button.click,
+                                username_state.change):
+                    trigger(
+                        fn=self.history,
+                        inputs=[username_state],
+                        outputs=history_outputs,
+                    )
+                older_button.click(
+                    fn=self.history_older,
+                    inputs=[username_state, history_cursors, history_older],
+                    outputs=history_outputs,
+                )
+                newer_button.click(
+                    fn=self.history_newer,
+                    inputs=[username_state, history_cursors],
+                    outputs=history_outputs,
+                )
+                export_selected_button.click(
+                    fn=self.export_selected,
+                    inputs=[username_state, history_selection],
+                    outputs=export_link_html,
+                )
+                export_recent_button.click(
+                    fn=self.export_recent,
+                    inputs=[username_state],
+                    outputs=export_link_html,
                 )
 
-    def run(self):
+            for button in (printer_refresh_button, scanner_refresh_button):
+                button.click(
+                    fn=self.refresh_devices,
+                    outputs=[printer_dropdown, scanner_dropdown]
+                )
+            self.app.load(
+                fn=self.refresh_devices,
+                outputs=[printer_dropdown, scanner_dropdown]
+            )
+
+    def _add_routes(self, server_app):
+        from fastapi import APIRouter, Depends
+        from fastapi.responses import PlainTextResponse
+
+        from .api import create_router, include_first, user_dependency
+
+        router = APIRouter()
+
+        # The counters are per user and device, so they need the UI credentials
+        # unless server.metrics_public opens them to an unauthenticated scraper
+        protected = not self.config['server'].get('metrics_public', False)
+        dependencies = [Depends(user_dependency(self.config))] if protected else []
+
+        @router.get("/metrics", dependencies=dependencies)
+        def prometheus_metrics():
+            return PlainTextResponse(
+                metrics.render(), media_type="text/plain; version=0.0.4"
+            )
+
+        include_first(server_app, router)
+        include_first(server_app, create_router(self))
+
+    def run(self, timer=None):
         ssl_config = {}
         if self.config['server']['ssl_enabled']:
             ssl_config = {
@@ -194,4 +1123,32 @@ class PrinterScannerApp:
         if port:
             launch_kwargs["server_port"] = port
 
-        self.app.launch(**launch_kwargs)
\ No newline at end of file
+        server_app, _, _ = self.app.launch(prevent_thread_lock=True, **launch_kwargs)
+        self._add_routes(server_app)
+        if timer is not None:
+            timer.mark("server start")
+            print("startup timing:\n" + timer.report())
+        self._watch_server()
+
+    def close(self):
+        """Stop worker processes and device sessions once the server is down for good."""
+        self.converter.close()
+        self.ocr.close()
+        close = getattr(self.scan_backend, 'close', None)
+        if close:
+            close()
+
+    def _watch_server(self):
+        """Block while the web server runs.
+
+        Raises once its thread has died, so run.py relaunches the server;
+        Blocks.block_thread() would go on waiting forever.
+        """
+        server = self.app.server
+        try:
+            while server.thread.is_alive():
+                server.thread.join(SERVER_WATCH_INTERVAL)
+        except KeyboardInterrupt:
+            self.app.close()
+            raise
+        raise RuntimeError("The web server stopped unexpectedly")
\ No newline at end of file
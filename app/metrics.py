@@ -0,0 +1,399 @@
+"""Counters, gauges and histograms exposed in Prometheus text format.
+
+The metric types are deliberately tiny (a lock and a few floats each) so
+recording on every request costs next to nothing. ``Trace`` records the
+per-request phase breakdown and optionally appends it to a JSONL log.
+"""
+
+import asyncio
+import contextvars
+import json
+import subprocess
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Buckets in seconds, spanning a quick lp call up to a slow colour scan
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + list(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_value(key, value))
+        return lines
+
+    def _render_value(self, key, value):
+        return [f"{self.name}{_labels(self.labelnames, key)} {value}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, amount=1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount=1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    @contextmanager
+    def track(self, **labels):
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # per-bucket counts (non-cumulative), sum, count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][bisect_left(self.buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _render_value(self, key, value):
+        counts, total, count = value
+        lines = []
+        cumulative = 0
+        for bound, n in zip(self.buckets + (float("inf"),), counts):
+            cumulative += n
+            le = "+Inf" if bound == float("inf") else repr(float(bound))
+            labels = _labels(self.labelnames, key, ['le="%s"' % le])
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {total}")
+        lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+REGISTRY = []
+
+REQUESTS = Counter(
+    "easyprint_requests_total", "Print and scan requests by outcome", ["op", "outcome"])
+REQUEST_SECONDS = Histogram(
+    "easyprint_request_seconds", "End-to-end handler latency", ["op"])
+IN_FLIGHT = Gauge(
+    "easyprint_requests_in_flight", "Requests currently being handled", ["op"])
+SCAN_SECONDS = Histogram(
+    "easyprint_scan_seconds", "Time the scanner spent on a scan job", ["mode"])
+COMMAND_SECONDS = Histogram(
+    "easyprint_command_seconds", "Runtime of lp/scanimage subprocesses", ["command"])
+COMMAND_SPAWN_SECONDS = Histogram(
+    "easyprint_command_spawn_seconds", "Time to start lp/scanimage subprocesses", ["command"])
+COMMAND_FAILURES = Counter(
+    "easyprint_command_failures_total", "lp/scanimage runs that failed", ["command"])
+PDF_SECONDS = Histogram(
+    "easyprint_pdf_seconds", "Time to build the PDF of a scan", ["method"])
+OCR_SECONDS = Histogram(
+    "easyprint_ocr_seconds", "Time from a scan to its searchable PDF", ["outcome"],
+    buckets=(1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600))
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ---------------------- Per-request traces ----------------------
+
+_trace_log = {"path": None, "lock": threading.Lock()}
+# A context variable rather than a thread-local, so that concurrent
+# handlers on the event loop each see their own trace
+_bound = contextvars.ContextVar("trace", default=None)
+# Thread ident -> process that thread is running through run_command
+_running = {}
+_running_lock = threading.Lock()
+
+
+def configure_trace_log(path):
+    """Append finished request traces to ``path`` as JSON lines (None disables)."""
+    _trace_log["path"] = path or None
+
+
+class Trace:
+    """Phase-by-phase timing of one request (validate, spawn, device, encode...)."""
+
+    def __init__(self, op, **fields):
+        self.op = op
+        self.fields = fields
+        self.start = time.time()
+        self._t0 = time.perf_counter()
+        self.phases = {}
+
+    def add(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def finish(self, outcome):
+        total = time.perf_counter() - self._t0
+        REQUESTS.inc(op=self.op, outcome=outcome)
+        REQUEST_SECONDS.observe(total, op=self.op)
+
+        path = _trace_log["path"]
+        if not path:
+            return
+        record = {
+            "op": self.op,
+            "start": round(self.start, 3),
+            "outcome": outcome,
+            "total": round(total, 4),
+            "phases": {k: round(v, 4) for k, v in self.phases.items()},
+            **self.fields,
+        }
+        line = json.dumps(record) + "\n"
+        with _trace_log["lock"]:
+            with open(path, "a") as f:
+                f.write(line)
+
+
+@contextmanager
+def bind(trace):
+    """Make ``trace`` the current trace of this thread or task (used by run_command)."""
+    token = _bound.set(trace)
+    try:
+        yield trace
+    finally:
+        _bound.reset(token)
+
+
+def current_trace():
+    return _bound.get()
+
+
+@contextmanager
+def phase(name):
+    """Time a block into the thread's current trace, if there is one."""
+    trace = current_trace()
+    if trace is None:
+        yield
+        return
+    with trace.phase(name):
+        yield
+
+
+@contextmanager
+def killable(proc):
+    """Let other threads stop ``proc`` with kill_command() while this block runs."""
+    ident = threading.get_ident()
+    with _running_lock:
+        _running[ident] = proc
+    try:
+        yield proc
+    finally:
+        with _running_lock:
+            _running.pop(ident, None)
+
+
+def kill_command(thread_ident):
+    """Kill the command the thread ``thread_ident`` is waiting for, if any."""
+    with _running_lock:
+        proc = _running.get(thread_ident)
+    if proc is None:
+        return False
+    proc.kill()
+    return True
+
+
+def _record(command, start, spawned, finished):
+    COMMAND_SPAWN_SECONDS.observe(spawned - start, command=command)
+    COMMAND_SECONDS.observe(finished - start, command=command)
+    trace = current_trace()
+    if trace is not None:
+        trace.add("spawn", spawned - start)
+        trace.add("device", finished - spawned)
+
+
+def _read_lines(stream, on_line, kept):
+    # Lines end in \r as well: progress meters rewrite one line in place
+    pending = b""
+    for chunk in iter(lambda: stream.read1(4096), b""):
+        pending += chunk
+        *lines, pending = pending.replace(b"\r", b"\n").split(b"\n")
+        for line in lines:
+            if line and not on_line(line.decode(errors="replace")):
+                kept.append(line + b"\n")
+    if pending and not on_line(pending.decode(errors="replace")):
+        kept.append(pending)
+
+
+def run_command(cmd, consume=None, timeout=None, on_stderr=None, **kwargs):
+    """``subprocess.run(cmd, check=True, **kwargs)`` with spawn/runtime metrics.
+
+    The time to start the process and the time it then runs are recorded
+    separately and added to the thread's trace as "spawn" and "device".
+    With ``consume``, stdout must be a pipe: ``consume(proc.stdout)`` reads
+    it while the command runs, and what it returns becomes the stdout of
+    the result. A command still running after ``timeout`` seconds is
+    killed and TimeoutExpired raised; kill_command() stops it early.
+    With ``on_stderr``, stderr must be a pipe and is read as it is
+    written: each line goes to ``on_stderr(line)``, and the lines it does
+    not return True for make up the stderr of the result.
+    """
+    command = cmd[0]
+    start = time.perf_counter()
+    try:
+        proc = subprocess.Popen(cmd, **kwargs)
+    except OSError:
+        COMMAND_FAILURES.inc(command=command)
+        raise
+    spawned = time.perf_counter()
+
+    reader = None
+    if on_stderr is not None:
+        kept = []
+        reader = threading.Thread(
+            target=_read_lines, args=(proc.stderr, on_stderr, kept),
+            name=f"{command}-stderr", daemon=True,
+        )
+        reader.start()
+
+    timed_out = threading.Event()
+    timer = None
+    if timeout:
+        def expire():
+            timed_out.set()
+            proc.kill()
+        timer = threading.Timer(timeout, expire)
+        timer.daemon = True
+        timer.start()
+
+    with proc, killable(proc):
+        try:
+            if consume is None and reader is None:
+                stdout, stderr = proc.communicate()
+            else:
+                if consume is None:
+                    stdout = proc.stdout.read() if proc.stdout else None
+                else:
+                    try:
+                        stdout = consume(proc.stdout)
+                    except Exception:
+                        proc.kill()
+                        # Output cut short by a command that failed on its own
+                        # (not killed just now) is reported as its error
+                        if proc.wait() <= 0 and not timed_out.is_set():
+                            raise
+                        stdout = None
+                if reader is not None:
+                    reader.join()
+                    stderr = b"".join(kept)
+                else:
+                    stderr = proc.stderr.read() if proc.stderr else None
+                proc.wait()
+        except BaseException:
+            proc.kill()
+            raise
+        finally:
+            if timer is not None:
+                timer.cancel()
+    _record(command, start, spawned, time.perf_counter())
+
+    if timed_out.is_set():
+        COMMAND_FAILURES.inc(command=command)
+        raise subprocess.TimeoutExpired(cmd, timeout, stdout, stderr)
+    if proc.returncode:
+        COMMAND_FAILURES.inc(command=command)
+        raise subprocess.CalledProcessError(proc.returncode, cmd, stdout, stderr)
+    return subprocess.CompletedProcess(cmd, proc.returncode, stdout, stderr)
+
+
+async def run_command_async(cmd, timeout=None, **kwargs):
+    """run_command() for the event loop, without holding a thread while it runs.
+
+    The child is killed when ``timeout`` expires (TimeoutExpired) and when
+    the awaiting task is cancelled, e.g. because the client went away.
+    """
+    command = cmd[0]
+    start = time.perf_counter()
+    try:
+        proc = await asyncio.create_subprocess_exec(*cmd, **kwargs)
+    except OSError:
+        COMMAND_FAILURES.inc(command=command)
+        raise
+    spawned = time.perf_counter()
+
+    try:
+        stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout)
+    except BaseException as e:
+        if proc.returncode is None:
+            proc.kill()
+            await asyncio.shield(proc.wait())
+        COMMAND_FAILURES.inc(command=command)
+        if isinstance(e, asyncio.TimeoutError):
+            raise subprocess.TimeoutExpired(cmd, timeout) from None
+        raise
+    _record(command, start, spawned, time.perf_counter())
+
+    if proc.returncode:
+        COMMAND_FAILURES.inc(command=command)
+        raise subprocess.CalledProcessError(proc.returncode, cmd, stdout, stderr)
+    return subprocess.CompletedProcess(cmd, proc.returncode, stdout, stderr)
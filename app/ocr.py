@@ -0,0 +1,167 @@
+"""Background text recognition that turns scans into searchable PDFs.
+
+After a scan has been stored, its pages are handed to Tesseract in a small
+process pool. Tesseract renders only an invisible text layer
+(``textonly_pdf``), which is laid over the pages of the stored PDF, so the
+images keep the encoding they were scanned with. The result is written
+next to the scan as ``<stem>_searchable.pdf`` and attached to its index
+entry.
+
+Everything runs locally; nothing is sent anywhere.
+"""
+
+import asyncio
+import importlib.util
+import multiprocessing
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from . import metrics
+
+
+def searchable_path(pdf):
+    return os.path.splitext(pdf)[0] + "_searchable.pdf"
+
+
+# ---------------------- Pool worker ----------------------
+
+def _lower_priority(niceness):
+    # OCR is background work; the server's scan handlers come first
+    try:
+        os.nice(niceness)
+    except (AttributeError, OSError):
+        pass
+
+
+def _make_searchable(pdf, pages, dst, tesseract, languages, timeout):
+    from pypdf import PdfReader, PdfWriter, Transformation
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # One Tesseract run for the whole document: a list file of pages in
+        # gives one PDF with a text-only page per image out
+        listing = os.path.join(tmp, "pages.txt")
+        with open(listing, "w") as f:
+            f.write("\n".join(pages) + "\n")
+        env = dict(os.environ, OMP_THREAD_LIMIT="1")
+        subprocess.run(
+            [tesseract, listing, os.path.join(tmp, "text"), "-l", languages,
+             "-c", "textonly_pdf=1", "pdf"],
+            check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+            timeout=timeout, env=env,
+        )
+
+        text = PdfReader(os.path.join(tmp, "text.pdf"))
+        writer = PdfWriter(clone_from=pdf)
+        if len(text.pages) != len(writer.pages):
+            raise ValueError(
+                f"{len(text.pages)} text pages for a {len(writer.pages)} page document"
+            )
+        for page, layer in zip(writer.pages, text.pages):
+            # Both are sized from the image's resolution, but may round differently
+            sx = float(page.mediabox.width) / float(layer.mediabox.width)
+            sy = float(page.mediabox.height) / float(layer.mediabox.height)
+            page.merge_transformed_page(layer, Transformation().scale(sx, sy), over=True)
+        writer.compress_identical_objects()
+
+        part = f"{dst}.part"
+        with open(part, "wb") as f:
+            writer.write(f)
+    os.replace(part, dst)
+    return dst
+
+
+# ---------------------- Service ----------------------
+
+class OcrService:
+    """Queue stored scans for text recognition and hand out the results."""
+
+    def __init__(self, config, storage):
+        ocr = config.get('ocr', {})
+        self.storage = storage
+        self.tesseract = shutil.which(ocr.get('tesseract') or "tesseract")
+        self.enabled = False
+        if ocr.get('enabled', False):
+            if not self.tesseract:
+                print("OCR is enabled but tesseract was not found; scans stay image-only")
+            elif importlib.util.find_spec("pypdf") is None:
+                print("OCR is enabled but pypdf is not installed (pip install pypdf)")
+            else:
+                self.enabled = True
+        self.languages = ocr.get('languages', "eng")
+        self.workers = int(ocr.get('workers', 1))
+        self.niceness = int(ocr.get('niceness', 10))
+        self.timeout = ocr.get('timeout', 600)
+        self._pool = None
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def _executor(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_lower_priority, initargs=(self.niceness,),
+            )
+        return self._pool
+
+    def submit(self, scan_id, pdf, pages):
+        """Start recognising ``pages`` (the images of ``pdf``, in order).
+
+        Returns immediately; does nothing when OCR is disabled.
+        """
+        if not self.enabled or scan_id is None:
+            return
+        dst = searchable_path(pdf)
+        start = time.perf_counter()
+        with self._lock:
+            future = self._executor().submit(
+                _make_searchable, pdf, list(pages), dst,
+                self.tesseract, self.languages, self.timeout,
+            )
+            self._pending[pdf] = future
+
+        def done(future):
+            with self._lock:
+                self._pending.pop(pdf, None)
+            try:
+                future.result()
+            except Exception as e:
+                metrics.OCR_SECONDS.observe(time.perf_counter() - start, outcome="error")
+                print(f"OCR of {os.path.basename(pdf)} failed: {e}")
+                if isinstance(e, BrokenProcessPool):
+                    # A worker died; the next scan gets a fresh pool
+                    self.close()
+                return
+            metrics.OCR_SECONDS.observe(time.perf_counter() - start, outcome="ok")
+            self.storage.add_file(scan_id, dst)
+
+        future.add_done_callback(done)
+
+    def pending(self, pdf):
+        with self._lock:
+            return pdf in self._pending
+
+    async def wait(self, pdf):
+        """Wait for the searchable version of ``pdf``; None if there is none."""
+        with self._lock:
+            future = self._pending.get(pdf)
+        if future is not None:
+            try:
+                await asyncio.wrap_future(future)
+            except Exception:
+                return None
+        dst = searchable_path(pdf)
+        return dst if os.path.exists(dst) else None
+
+    def close(self):
+        """Stop the worker processes; a later scan starts new ones."""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,365 @@
+"""Minimal PDF writer that embeds scanned images without re-encoding them.
+
+JPEGs are copied byte for byte into the PDF as DCTDecode image XObjects and
+single-strip CCITT Group 4 TIFFs as CCITTFaxDecode ones. Only the file
+headers are parsed to learn the image size and colour space, so the page is
+never decoded into a raw bitmap.
+"""
+
+import os
+import shutil
+import struct
+from typing import BinaryIO, Dict, List, NamedTuple, Optional
+
+# Start-of-frame markers carrying the image geometry (baseline, progressive,
+# lossless, arithmetic...). DHT (C4), JPG (C8) and DAC (CC) are not frames.
+_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7,
+                0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+_COLOR_SPACES = {1: "/DeviceGray", 3: "/DeviceRGB", 4: "/DeviceCMYK"}
+
+_COPY_CHUNK = 64 * 1024
+
+
+class JpegInfo(NamedTuple):
+    width: int
+    height: int
+    components: int
+    bits: int
+    dpi: Optional[float]
+    adobe: bool
+
+
+def _read_exact(f: BinaryIO, n: int) -> bytes:
+    data = f.read(n)
+    if len(data) != n:
+        raise ValueError("Truncated JPEG header")
+    return data
+
+
+def read_jpeg_info(path: str) -> JpegInfo:
+    """Parse the JPEG markers up to the first SOF and return the image info."""
+    dpi = None
+    adobe = False
+
+    with open(path, "rb") as f:
+        if f.read(2) != b"\xff\xd8":
+            raise ValueError(f"{path} is not a JPEG file")
+
+        while True:
+            byte = _read_exact(f, 1)
+            if byte != b"\xff":
+                raise ValueError("Invalid JPEG marker")
+            marker = _read_exact(f, 1)[0]
+            # Fill bytes may precede a marker
+            while marker == 0xFF:
+                marker = _read_exact(f, 1)[0]
+
+            # Standalone markers without a length field
+            if marker == 0x01 or 0xD0 <= marker <= 0xD7:
+                continue
+            if marker in (0xD9, 0xDA):
+                raise ValueError("No frame header found in JPEG")
+
+            length = int.from_bytes(_read_exact(f, 2), "big")
+            segment = _read_exact(f, length - 2)
+
+            if marker == 0xE0 and segment[:5] == b"JFIF\x00" and len(segment) >= 12:
+                units = segment[7]
+                x_density = int.from_bytes(segment[8:10], "big")
+                if x_density:
+                    if units == 1:
+                        dpi = float(x_density)
+                    elif units == 2:
+                        dpi = x_density * 2.54
+            elif marker == 0xEE and segment[:5] == b"Adobe":
+                adobe = True
+            elif marker in _SOF_MARKERS:
+                bits = segment[0]
+                height = int.from_bytes(segment[1:3], "big")
+                width = int.from_bytes(segment[3:5], "big")
+                components = segment[5]
+                if components not in _COLOR_SPACES:
+                    raise ValueError(f"Unsupported JPEG component count: {components}")
+                return JpegInfo(width, height, components, bits, dpi, adobe)
+
+
+def is_jpeg(path: str) -> bool:
+    try:
+        with open(path, "rb") as f:
+            return f.read(3) == b"\xff\xd8\xff"
+    except OSError:
+        return False
+
+
+class G4Info(NamedTuple):
+    width: int
+    height: int
+    offset: int
+    length: int
+    black_is_zero: bool
+    dpi: Optional[float]
+
+
+# TIFF field types: (struct code, size)
+_TIFF_TYPES = {1: ("B", 1), 3: ("H", 2), 4: ("I", 4), 5: ("II", 8)}
+
+
+def read_g4_info(path: str) -> G4Info:
+    """Return where the Group 4 data of a single-strip TIFF is and its geometry.
+
+    Raises ValueError for anything else (other compressions, several strips
+    or reversed bit order), which callers treat as "needs re-encoding".
+    """
+    with open(path, "rb") as f:
+        header = f.read(8)
+        if header[:4] not in (b"II*\x00", b"MM\x00*"):
+            raise ValueError(f"{path} is not a TIFF file")
+        order = "<" if header[:2] == b"II" else ">"
+        f.seek(struct.unpack(order + "I", header[4:8])[0])
+        count = struct.unpack(order + "H", f.read(2))[0]
+        entries = f.read(12 * count)
+
+        tags = {}
+        for i in range(count):
+            tag, kind, n = struct.unpack(order + "HHI", entries[12 * i:12 * i + 8])
+            if kind not in _TIFF_TYPES:
+                continue
+            code, size = _TIFF_TYPES[kind]
+            raw = entries[12 * i + 8:12 * i + 12]
+            if size * n > 4:
+                f.seek(struct.unpack(order + "I", raw)[0])
+                raw = f.read(size * n)
+            tags[tag] = struct.unpack(order + code * n, raw[:size * n])
+
+    def tag(number, default=None):
+        return tags[number] if number in tags else default
+
+    if tag(259, (1,))[0] != 4:
+        raise ValueError("TIFF is not CCITT Group 4 compressed")
+    if len(tag(273, ())) != 1 or tag(266, (1,))[0] != 1:
+        raise ValueError("Only single-strip, MSB-first Group 4 TIFFs can be embedded")
+
+    dpi = None
+    if 282 in tags:
+        numerator, denominator = tags[282][:2]
+        unit = tag(296, (2,))[0]
+        if denominator and unit in (2, 3):
+            dpi = numerator / denominator * (2.54 if unit == 3 else 1.0)
+
+    return G4Info(
+        width=tags[256][0],
+        height=tags[257][0],
+        offset=tags[273][0],
+        length=tags[279][0],
+        black_is_zero=tag(262, (0,))[0] == 1,
+        dpi=dpi,
+    )
+
+
+def is_g4_tiff(path: str) -> bool:
+    try:
+        read_g4_info(path)
+        return True
+    except (OSError, ValueError, KeyError, struct.error):
+        return False
+
+
+class _Limited:
+    """File wrapper that stops reading after ``length`` bytes."""
+
+    def __init__(self, f: BinaryIO, length: int):
+        self._f = f
+        self._left = length
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0 or size > self._left:
+            size = self._left
+        data = self._f.read(size)
+        self._left -= len(data)
+        return data
+
+
+class PdfWriter:
+    """Write a PDF document whose pages are full-page scanned images.
+
+    ``flush()`` appends an incremental update (new page tree, xref section
+    and trailer), after which the file on disk is a complete PDF. Pages can
+    therefore be added one by one while earlier ones are already readable.
+    """
+
+    def __init__(self, fileobj: BinaryIO):
+        self._f = fileobj
+        self._offsets: Dict[int, int] = {}
+        self._next_id = 1
+        self._dirty: List[int] = []
+        self._page_ids: List[int] = []
+        self._prev_xref: Optional[int] = None
+        self._closed = False
+
+        self._f.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        # The catalog and page tree are (re)written on every flush, once
+        # the pages written so far are known.
+        self._catalog_id = self._reserve()
+        self._pages_id = self._reserve()
+
+    @property
+    def page_count(self) -> int:
+        return len(self._page_ids)
+
+    def _reserve(self) -> int:
+        obj_id = self._next_id
+        self._next_id += 1
+        return obj_id
+
+    def _begin(self, obj_id: int) -> None:
+        self._offsets[obj_id] = self._f.tell()
+        self._dirty.append(obj_id)
+        self._f.write(f"{obj_id} 0 obj\n".encode("ascii"))
+
+    def _write_object(self, obj_id: int, body: str) -> None:
+        self._begin(obj_id)
+        self._f.write(body.encode("ascii"))
+        self._f.write(b"\nendobj\n")
+
+    def _write_stream(self, obj_id: int, dictionary: str, src: BinaryIO, length: int) -> None:
+        self._begin(obj_id)
+        self._f.write(f"<< {dictionary} /Length {length} >>\nstream\n".encode("ascii"))
+        shutil.copyfileobj(src, self._f, _COPY_CHUNK)
+        self._f.write(b"\nendstream\nendobj\n")
+
+    def _add_image_page(self, image_dict: str, src: BinaryIO, length: int,
+                        width: int, height: int, resolution: float) -> None:
+        image_id = self._reserve()
+        self._write_stream(image_id, image_dict, src, length)
+
+        page_w = width * 72.0 / resolution
+        page_h = height * 72.0 / resolution
+        content = f"q {page_w:.2f} 0 0 {page_h:.2f} 0 0 cm /Im0 Do Q".encode("ascii")
+
+        content_id = self._reserve()
+        self._begin(content_id)
+        self._f.write(f"<< /Length {len(content)} >>\nstream\n".encode("ascii"))
+        self._f.write(content)
+        self._f.write(b"\nendstream\nendobj\n")
+
+        page_id = self._reserve()
+        self._write_object(
+            page_id,
+            f"<< /Type /Page /Parent {self._pages_id} 0 R "
+            f"/MediaBox [0 0 {page_w:.2f} {page_h:.2f}] "
+            f"/Resources << /XObject << /Im0 {image_id} 0 R >> >> "
+            f"/Contents {content_id} 0 R >>",
+        )
+        self._page_ids.append(page_id)
+
+    def add_jpeg_page(self, jpeg_path: str, resolution: Optional[float] = None) -> None:
+        """Append a page holding the JPEG at ``jpeg_path`` as a DCTDecode image.
+
+        ``resolution`` is used when the JPEG does not carry its own density.
+        """
+        info = read_jpeg_info(jpeg_path)
+        resolution = info.dpi or resolution or 300.0
+
+        image_dict = (
+            f"/Type /XObject /Subtype /Image /Width {info.width} /Height {info.height} "
+            f"/ColorSpace {_COLOR_SPACES[info.components]} "
+            f"/BitsPerComponent {info.bits} /Filter /DCTDecode"
+        )
+        if info.components == 4 and info.adobe:
+            # Adobe CMYK JPEGs are stored inverted
+            image_dict += " /Decode [1 0 1 0 1 0 1 0]"
+
+        with open(jpeg_path, "rb") as src:
+            self._add_image_page(
+                image_dict, src, os.fstat(src.fileno()).st_size,
+                info.width, info.height, resolution,
+            )
+
+    def add_g4_page(self, tiff_path: str, resolution: Optional[float] = None) -> None:
+        """Append a page holding a 1-bit Group 4 TIFF as a CCITTFaxDecode image."""
+        info = read_g4_info(tiff_path)
+        resolution = info.dpi or resolution or 300.0
+
+        # The G4 codes describe white and black runs; a BlackIsZero TIFF
+        # stores them the other way round from the PDF default.
+        image_dict = (
+            f"/Type /XObject /Subtype /Image /Width {info.width} /Height {info.height} "
+            f"/ColorSpace /DeviceGray /BitsPerComponent 1 /Filter /CCITTFaxDecode "
+            f"/DecodeParms << /K -1 /Columns {info.width} /Rows {info.height}"
+            f"{' /BlackIs1 true' if info.black_is_zero else ''} >>"
+        )
+        with open(tiff_path, "rb") as src:
+            src.seek(info.offset)
+            self._add_image_page(
+                image_dict, _Limited(src, info.length), info.length,
+                info.width, info.height, resolution,
+            )
+
+    def add_page(self, path: str, resolution: Optional[float] = None) -> None:
+        """Append a JPEG or Group 4 TIFF page, whichever ``path`` holds."""
+        if is_jpeg(path):
+            self.add_jpeg_page(path, resolution)
+        else:
+            self.add_g4_page(path, resolution)
+
+    def flush(self) -> None:
+        """Write the page tree and an xref section so the file is complete."""
+        if not self._dirty and self._prev_xref is not None:
+            return
+
+        kids = " ".join(f"{page_id} 0 R" for page_id in self._page_ids)
+        self._write_object(
+            self._pages_id,
+            f"<< /Type /Pages /Kids [{kids}] /Count {len(self._page_ids)} >>",
+        )
+        if self._prev_xref is None:
+            self._write_object(self._catalog_id, f"<< /Type /Catalog /Pages {self._pages_id} 0 R >>")
+
+        xref_offset = self._f.tell()
+        # Every section restates the head of the free list, then has one
+        # subsection per run of consecutive object ids written since the
+        # previous section.
+        lines = ["xref\n0 1\n0000000000 65535 f \n"]
+        ids = sorted(set(self._dirty))
+        run_start = 0
+        for i in range(1, len(ids) + 1):
+            if i == len(ids) or ids[i] != ids[i - 1] + 1:
+                lines.append(f"{ids[run_start]} {i - run_start}\n")
+                lines += [f"{self._offsets[obj_id]:010d} 00000 n \n" for obj_id in ids[run_start:i]]
+                run_start = i
+
+        prev = f" /Prev {self._prev_xref}" if self._prev_xref is not None else ""
+        lines.append(
+            f"trailer\n<< /Size {self._next_id} /Root {self._catalog_id} 0 R{prev} >>\n"
+            f"startxref\n{xref_offset}\n%%EOF\n"
+        )
+        self._f.write("".join(lines).encode("ascii"))
+        self._f.flush()
+
+        self._prev_xref = xref_offset
+        self._dirty = []
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self.flush()
+
+
+def jpeg_to_pdf(jpeg_path: str, pdf_path: str, resolution: float = 300.0) -> str:
+    """Wrap a single JPEG into a one-page PDF without recompressing it."""
+    with open(pdf_path, "wb") as f:
+        writer = PdfWriter(f)
+        writer.add_jpeg_page(jpeg_path, resolution)
+        writer.close()
+    return pdf_path
+
+
+def image_to_pdf(image_path: str, pdf_path: str, resolution: float = 300.0) -> str:
+    """Wrap a single JPEG or Group 4 TIFF into a one-page PDF as-is."""
+    with open(pdf_path, "wb") as f:
+        writer = PdfWriter(f)
+        writer.add_page(image_path, resolution)
+        writer.close()
+    return pdf_path
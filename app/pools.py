@@ -0,0 +1,135 @@
+"""Pools of interchangeable printers or scanners with health tracking.
+
+A pool hands out the least loaded healthy member. A member that fails
+``failure_threshold`` times in a row is skipped; after ``recheck_interval``
+seconds it is checked again (with ``probe`` if one is set, otherwise the
+next job is allowed to try it) and rejoins the pool if it is back.
+"""
+
+import itertools
+import threading
+import time
+
+
+class DevicePool:
+    def __init__(self, members, strategy="shortest_queue", failure_threshold=2,
+                 recheck_interval=60.0):
+        self.members = list(dict.fromkeys(members))
+        self.strategy = strategy
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.recheck_interval = float(recheck_interval)
+        # load(member) -> number of jobs queued on it; probe(member) -> bool
+        self.load = None
+        self.probe = None
+        self._failures = {}
+        self._down_since = {}
+        self._lock = threading.Lock()
+        self._turn = itertools.count()
+
+    def __len__(self):
+        return len(self.members)
+
+    def _recheck(self, member, now):
+        since = self._down_since.get(member)
+        if since is None:
+            return True
+        if now - since < self.recheck_interval:
+            return False
+        if self.probe is not None:
+            try:
+                alive = self.probe(member)
+            except Exception:
+                alive = False
+            if not alive:
+                self._down_since[member] = now
+                return False
+        # Let the next job try it; one more failure takes it out again
+        self._down_since.pop(member, None)
+        self._failures[member] = self.failure_threshold - 1
+        return True
+
+    def healthy(self):
+        now = time.monotonic()
+        with self._lock:
+            return [m for m in self.members if self._recheck(m, now)]
+
+    def choose(self, exclude=()):
+        """Return the member to use next, or None if every member is down."""
+        candidates = [m for m in self.healthy() if m not in exclude]
+        if not candidates:
+            return None
+        if self.strategy == "round_robin" or self.load is None:
+            return candidates[next(self._turn) % len(candidates)]
+        # min() keeps the first of equally loaded members, so an idle pool
+        # always starts with the first one listed
+        return min(candidates, key=self.load)
+
+    def record_success(self, member):
+        with self._lock:
+            self._failures.pop(member, None)
+            self._down_since.pop(member, None)
+
+    def record_failure(self, member):
+        with self._lock:
+            failures = self._failures.get(member, 0) + 1
+            self._failures[member] = failures
+            if failures >= self.failure_threshold and member not in self._down_since:
+                self._down_since[member] = time.monotonic()
+                print(f"{member} marked unhealthy after {failures} failures")
+
+    def status(self):
+        """Member -> "ok" or "down", for display."""
+        with self._lock:
+            return {m: "down" if m in self._down_since else "ok" for m in self.members}
+
+
+def _next_member(pool, member, result, tried, device_fault):
+    """Record how ``member`` did; return the member to try next, or None to stop."""
+    if result['ok']:
+        pool.record_success(member)
+        return None
+    if device_fault is not None and not device_fault(result):
+        return None
+    pool.record_failure(member)
+    tried.add(member)
+    return pool.choose(exclude=tried)
+
+
+def with_failover(pool, member, attempt, device_fault=None):
+    """Run ``attempt(member)``, moving on to other healthy members while it fails.
+
+    ``attempt`` returns a result dict with an ``ok`` flag. Failures for
+    which ``device_fault(result)`` is false (a bad file, say) are returned
+    as they are. Returns the last result and the member that produced it.
+    """
+    tried = set()
+    while True:
+        result = attempt(member)
+        other = _next_member(pool, member, result, tried, device_fault)
+        if other is None:
+            return result, member
+        member = other
+
+
+async def with_failover_async(pool, member, attempt, device_fault=None):
+    """with_failover() for an ``attempt`` that is a coroutine function."""
+    tried = set()
+    while True:
+        result = await attempt(member)
+        other = _next_member(pool, member, result, tried, device_fault)
+        if other is None:
+            return result, member
+        member = other
+
+
+def pool_from_config(section, devices_config):
+    """Build the pool configured in ``section`` (printing or scanning), if any."""
+    members = list(section.get('pool') or [])
+    if len(members) < 2:
+        return None
+    return DevicePool(
+        members,
+        strategy=section.get('pool_strategy', 'shortest_queue'),
+        failure_threshold=devices_config.get('failure_threshold', 2),
+        recheck_interval=devices_config.get('recheck_interval', 60),
+    )
@@ -0,0 +1,126 @@
+"""Blank-page detection and margin cropping of scanned pages.
+
+Pages are analysed on a copy shrunk to roughly ``ANALYSIS_EDGE`` pixels
+(JPEGs are decoded at reduced size by libjpeg) with vectorised NumPy
+operations. The content box found there is then applied to the
+full-resolution page: bilevel pages are cropped losslessly, JPEGs with
+``jpegtran`` when it is installed and otherwise by re-encoding.
+"""
+
+import os
+import shutil
+import subprocess
+from typing import NamedTuple, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from .encoding import save_image
+from .pdf import is_jpeg
+
+ANALYSIS_EDGE = 512
+
+# A pixel is ink when it is this much darker than the paper
+INK_CONTRAST = 48
+
+# Analysis pixels ignored along each edge, where lids and feeders leave shadows
+EDGE_IGNORE = 2
+
+# A row or column only bounds the content if this share of it is ink
+LINE_NOISE = 0.004
+
+# Content boxes covering more of the page than this are not worth a crop
+MIN_CROP_GAIN = 0.95
+
+
+class PageAnalysis(NamedTuple):
+    ink: float
+    box: Optional[Tuple[int, int, int, int]]
+    size: Tuple[int, int]
+
+
+def _ink_mask(image):
+    """Boolean ink mask of ``image`` at analysis size, and its scale factor."""
+    width, height = image.size
+    factor = max(1, max(width, height) // ANALYSIS_EDGE)
+
+    # JPEGs are decoded straight to a reduced grayscale image
+    image.draft("L", (width // factor, height // factor))
+    if image.mode != "L":
+        image = image.convert("L")
+    reduce = max(1, max(image.size) // ANALYSIS_EDGE)
+    if reduce > 1:
+        image = image.reduce(reduce)
+
+    gray = np.asarray(image)
+    paper = np.percentile(gray, 95)
+    return gray < paper - INK_CONTRAST, width / gray.shape[1]
+
+
+def analyze(path, margin=0.02):
+    """Measure the share of ink on the page and the box around its content.
+
+    ``margin`` (a fraction of the page's short edge) is kept around the
+    content. ``box`` is None when nothing but noise was found.
+    """
+    with Image.open(path) as image:
+        size = image.size
+        mask, factor = _ink_mask(image)
+
+    mask[:EDGE_IGNORE] = False
+    mask[-EDGE_IGNORE:] = False
+    mask[:, :EDGE_IGNORE] = False
+    mask[:, -EDGE_IGNORE:] = False
+
+    rows = np.flatnonzero(mask.mean(axis=1) > LINE_NOISE)
+    cols = np.flatnonzero(mask.mean(axis=0) > LINE_NOISE)
+    ink = float(mask.mean())
+    if not len(rows) or not len(cols):
+        return PageAnalysis(ink, None, size)
+
+    pad = margin * min(size)
+    box = (
+        max(0, int(cols[0] * factor - pad)),
+        max(0, int(rows[0] * factor - pad)),
+        min(size[0], int((cols[-1] + 1) * factor + pad)),
+        min(size[1], int((rows[-1] + 1) * factor + pad)),
+    )
+    return PageAnalysis(ink, box, size)
+
+
+def is_blank(analysis, threshold=0.002):
+    return analysis.box is None or analysis.ink < threshold
+
+
+def _jpegtran_crop(path, box):
+    left, top, right, bottom = box
+    tmp = f"{path}.tmp"
+    # jpegtran moves the corner to the nearest iMCU boundary up and left
+    subprocess.run(
+        ["jpegtran", "-copy", "all", "-crop",
+         f"{right - left}x{bottom - top}+{left}+{top}", "-outfile", tmp, path],
+        check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+    )
+    os.replace(tmp, path)
+
+
+def crop_page(path, mode, analysis, quality=None):
+    """Crop the page at ``path`` in place to ``analysis.box``.
+
+    Returns False when there was nothing worth cropping.
+    """
+    box = analysis.box
+    if box is None:
+        return False
+    width, height = analysis.size
+    if (box[2] - box[0]) * (box[3] - box[1]) > MIN_CROP_GAIN * width * height:
+        return False
+
+    if is_jpeg(path) and shutil.which("jpegtran"):
+        _jpegtran_crop(path, box)
+        return True
+
+    with Image.open(path) as image:
+        image.load()
+        save_image(image.crop(box), path, mode, quality)
+    return True
@@ -0,0 +1,55 @@
+"""Small, cached preview images for the scan tab.
+
+The browser only ever gets a bounded-size thumbnail; the full-resolution
+scan is offered through the download component only.
+"""
+
+import os
+
+from PIL import Image
+
+_EXTENSIONS = {"jpeg": ".jpg", "webp": ".webp"}
+
+
+def preview_path(scan_path, fmt="jpeg"):
+    """Location of the cached preview, next to the scan it was made from."""
+    stem, _ = os.path.splitext(scan_path)
+    return f"{stem}.preview{_EXTENSIONS.get(fmt, '.jpg')}"
+
+
+def make_preview(scan_path, max_edge=1024, fmt="jpeg", quality=75):
+    """Return the path of a thumbnail of ``scan_path``, creating it if needed.
+
+    JPEG scans are decoded in draft mode, which lets libjpeg scale the page
+    down by up to 8x while decoding instead of building the full bitmap.
+    """
+    target = preview_path(scan_path, fmt)
+    try:
+        if os.path.getmtime(target) >= os.path.getmtime(scan_path):
+            return target
+    except OSError:
+        pass
+
+    with Image.open(scan_path) as image:
+        image.draft("RGB" if image.mode not in ("L", "1") else "L", (max_edge, max_edge))
+        if image.mode == "1":
+            # Downscaling a bilevel page directly would just drop pixels
+            image = image.convert("L")
+        image.thumbnail((max_edge, max_edge))
+        return save_preview(image, scan_path, fmt, quality)
+
+
+def save_preview(image, scan_path, fmt="jpeg", quality=75):
+    """Store ``image`` (already thumbnail-sized) as the preview of ``scan_path``."""
+    target = preview_path(scan_path, fmt)
+    if image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+
+    # Write to a temporary name so a concurrent reader never sees half a file
+    tmp = f"{target}.tmp"
+    if fmt == "webp":
+        image.save(tmp, "WEBP", quality=quality)
+    else:
+        image.save(tmp, "JPEG", quality=quality, progressive=True, optimize=True)
+    os.replace(tmp, target)
+    return target
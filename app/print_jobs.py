@@ -0,0 +1,204 @@
+"""Track submitted print jobs with one shared background poller.
+
+However many users are looking at the job list, the scheduler is queried
+once per interval for all active jobs; the UI only reads the cached state.
+"""
+
+import os
+import subprocess
+import threading
+import time
+from collections import Counter, OrderedDict
+
+FINISHED_STATES = ("completed", "canceled", "aborted")
+
+
+def lpstat_jobs():
+    """Fallback query for the lp backend: one ``lpstat`` call for all jobs.
+
+    lpstat only lists jobs that are not finished, so anything missing from
+    the output is reported as completed.
+    """
+    result = subprocess.run(
+        ["lpstat", "-W", "not-completed", "-o"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        check=True,
+    )
+    jobs = []
+    for line in result.stdout.splitlines():
+        # "HP_LaserJet-42  user  1024  Mon 01 Jan 2024 10:00:00"
+        request_id = line.split(maxsplit=1)[0] if line.strip() else ""
+        printer, _, job_id = request_id.rpartition("-")
+        if printer and job_id.isdigit():
+            jobs.append({"job_id": int(job_id), "state": "pending", "reasons": "", "printer": printer})
+    return jobs, True
+
+
+class PrintJobTracker:
+    def __init__(self, query, interval=5.0, ttl=900.0, max_history=200, lookup=None):
+        """``query()`` returns ``(jobs, only_active)`` for all jobs at once.
+
+        ``only_active`` tells whether jobs missing from the answer finished.
+        If not, ``lookup(job_id)`` is asked about each tracked job that is
+        missing; it returns the job or None.
+        """
+        self.query = query
+        self.lookup = lookup
+        self.interval = interval
+        self.ttl = ttl
+        self.max_history = max_history
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._thread = None
+        # Unfinished jobs per printer in the scheduler's last answer
+        self._queues = Counter()
+        # When each printer last finished one of our jobs
+        self._freed = {}
+        self.last_error = None
+        # Called as on_finished(job) for every job seen to complete
+        self.on_finished = None
+
+    def track(self, results, owner=None):
+        """Record the jobs returned by a backend's ``submit_files``."""
+        now = time.time()
+        with self._lock:
+            for r in results:
+                if not r.get('ok') or r.get('job_id') is None:
+                    continue
+                self._jobs[r['job_id']] = {
+                    "job_id": r['job_id'],
+                    "file": os.path.basename(r['path']),
+                    "printer": r.get('printer'),
+                    "owner": owner,
+                    "state": "pending",
+                    "reasons": "",
+                    "submitted": now,
+                    "updated": now,
+                    "started": None,
+                    "finished": None,
+                }
+            self._evict(now)
+            self._ensure_poller()
+            self._wakeup.notify()
+
+    def jobs(self, owner=None):
+        """Newest-first snapshot of tracked jobs, optionally for one user."""
+        with self._lock:
+            return [
+                dict(job) for job in reversed(self._jobs.values())
+                if owner is None or job['owner'] == owner
+            ]
+
+    def queue_length(self, printer):
+        """Jobs waiting on ``printer``, as far as the last poll and our own submissions tell."""
+        with self._lock:
+            ours = sum(1 for job in self._active() if job['printer'] == printer)
+            return max(ours, self._queues.get(printer, 0))
+
+    def _active(self):
+        return [job for job in self._jobs.values() if job['state'] not in FINISHED_STATES]
+
+    def _evict(self, now):
+        for job_id in [
+            job_id for job_id, job in self._jobs.items()
+            if job['finished'] and now - job['finished'] > self.ttl
+        ]:
+            del self._jobs[job_id]
+        # Oldest first; only drop finished jobs to stay within the bound
+        excess = len(self._jobs) - self.max_history
+        for job_id in [job_id for job_id, job in self._jobs.items() if job['finished']]:
+            if excess <= 0:
+                break
+            del self._jobs[job_id]
+            excess -= 1
+
+    def _ensure_poller(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="print-job-poller", daemon=True)
+            self._thread.start()
+
+    def refresh(self):
+        """Update every active job from a single scheduler query."""
+        with self._lock:
+            if not self._active():
+                return
+        try:
+            jobs, only_active = self.query()
+            self.last_error = None
+        except Exception as e:
+            self.last_error = str(e)
+            return
+
+        seen = {job['job_id']: job for job in jobs}
+        if not only_active and self.lookup is not None:
+            with self._lock:
+                missing = [job['job_id'] for job in self._active() if job['job_id'] not in seen]
+            for job_id in missing:
+                try:
+                    remote = self.lookup(job_id)
+                except Exception as e:
+                    self.last_error = str(e)
+                    continue
+                if remote is not None:
+                    seen[job_id] = remote
+        now = time.time()
+        completed = []
+        with self._lock:
+            self._queues = Counter(
+                job['printer'] for job in jobs
+                if job['printer'] and job['state'] not in FINISHED_STATES
+            )
+            for job in self._active():
+                remote = seen.get(job['job_id'])
+                if remote is not None:
+                    state, reasons = remote['state'], remote['reasons']
+                elif only_active:
+                    state, reasons = "completed", ""
+                else:
+                    continue
+                if state != job['state'] or reasons != job['reasons']:
+                    job['state'] = state
+                    job['reasons'] = reasons
+                    job['updated'] = now
+                if state == "processing" and not job['started']:
+                    job['started'] = now
+                if state in FINISHED_STATES and not job['finished']:
+                    job['finished'] = now
+                    if not job['started']:
+                        # Finished between two polls (or lpstat, which has no
+                        # processing state): it started once the printer was
+                        # done with our previous job, at the earliest
+                        job['started'] = max(job['submitted'], self._freed.get(job['printer'], 0))
+                    self._freed[job['printer']] = now
+                    if state == "completed":
+                        completed.append(dict(job))
+            self._evict(now)
+
+        if self.on_finished:
+            for job in completed:
+                self.on_finished(job)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                # Sleep until there is something to watch
+                while not self._active():
+                    self._wakeup.wait()
+            self.refresh()
+            time.sleep(self.interval)
+
+    def rows(self, owner=None):
+        """Job list formatted for the UI table."""
+        return [
+            [
+                job['job_id'],
+                job['file'],
+                job['printer'] or "",
+                job['state'] + (f" ({job['reasons']})" if job['reasons'] else ""),
+                time.strftime("%H:%M:%S", time.localtime(job['submitted'])),
+            ]
+            for job in self.jobs(owner)
+        ]
@@ -0,0 +1,123 @@
+"""Preview scans and scan regions.
+
+A preview is a quick low-resolution pass over the whole glass. The user
+marks a region on it, and the final scan captures only that area at full
+resolution (``scanimage -l/-t/-x/-y``), which is much faster and smaller
+for business cards, IDs and receipts than a full page.
+
+Regions are ``(left, top, width, height)`` in millimetres from the
+top-left corner of the glass, the unit scanimage uses by default.
+Previews are kept per device for a while so several regions can be taken
+from one preview. Their files (``preview_*`` in the scan directory) are
+not indexed scans and are deleted by the cache itself.
+"""
+
+import os
+import threading
+import time
+
+PREVIEW_RESOLUTION = 75
+
+# File name prefix of preview scans
+PREVIEW_PREFIX = "preview"
+
+# Previews are taken in grayscale: enough to place a region, and fast
+PREVIEW_COLORMODE = 2
+
+# Smaller selections are taken to be stray clicks
+MIN_REGION_MM = 5
+
+MM_PER_INCH = 25.4
+
+
+def region_from_corners(a, b, resolution=PREVIEW_RESOLUTION):
+    """The region between pixels ``a`` and ``b`` of a preview, or None if it is too small."""
+    (x0, y0), (x1, y1) = a, b
+    scale = MM_PER_INCH / resolution
+    left, top = min(x0, x1) * scale, min(y0, y1) * scale
+    width, height = abs(x1 - x0) * scale, abs(y1 - y0) * scale
+    if width < MIN_REGION_MM or height < MIN_REGION_MM:
+        return None
+    return round(left, 1), round(top, 1), round(width, 1), round(height, 1)
+
+
+def describe(region):
+    left, top, width, height = region
+    return f"{width:.0f} x {height:.0f} mm at {left:.0f}, {top:.0f} mm"
+
+
+def mark(preview, resolution=PREVIEW_RESOLUTION, region=None, corner=None):
+    """``preview`` as an RGB image with ``region`` outlined or ``corner`` marked."""
+    from PIL import Image, ImageDraw
+
+    with Image.open(preview) as image:
+        image = image.convert("RGB")
+    draw = ImageDraw.Draw(image)
+    if region is not None:
+        scale = resolution / MM_PER_INCH
+        left, top, width, height = (v * scale for v in region)
+        draw.rectangle([left, top, left + width, top + height], outline=(220, 30, 30), width=2)
+    if corner is not None:
+        x, y = corner
+        draw.line([x - 6, y, x + 6, y], fill=(220, 30, 30), width=2)
+        draw.line([x, y - 6, x, y + 6], fill=(220, 30, 30), width=2)
+    return image
+
+
+class PreviewCache:
+    """The latest preview of each device per user, until it is ``ttl`` seconds old.
+
+    The glass may hold something else by then; a new preview replaces the
+    old one, whose file is removed. Keeping them per user means nobody is
+    shown what someone else left on the glass. Preview files left in
+    ``directory`` by an earlier run are removed at startup.
+    """
+
+    def __init__(self, directory, ttl=300):
+        self.ttl = ttl
+        self._previews = {}
+        self._lock = threading.Lock()
+        for name in os.listdir(directory):
+            if name.startswith(PREVIEW_PREFIX + "_"):
+                _remove(os.path.join(directory, name))
+
+    def _expire(self):
+        # Called with the lock held; returns the files to remove
+        now = time.monotonic()
+        expired = [key for key, (_, taken) in self._previews.items() if now - taken > self.ttl]
+        return [self._previews.pop(key)[0] for key in expired]
+
+    def get(self, device, owner):
+        """Path of ``owner``'s preview on ``device``, or None if there is no fresh one."""
+        with self._lock:
+            stale = self._expire()
+            entry = self._previews.get((device, owner))
+        for path in stale:
+            _remove(path)
+        if entry is None or not os.path.exists(entry[0]):
+            return None
+        return entry[0]
+
+    def put(self, device, owner, path):
+        key = (device, owner)
+        with self._lock:
+            stale = self._expire()
+            old = self._previews.get(key)
+            self._previews[key] = (path, time.monotonic())
+        if old is not None and old[0] != path:
+            stale.append(old[0])
+        for old_path in stale:
+            _remove(old_path)
+
+    def drop(self, device, owner):
+        with self._lock:
+            old = self._previews.pop((device, owner), None)
+        if old is not None:
+            _remove(old[0])
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,411 @@
+"""Per-device scan scheduler.
+
+Each scanner device is owned by a single worker thread with a FIFO queue,
+so concurrent users are serialized instead of colliding with "device busy".
+Submitting a scan returns a job id immediately; callers poll ``status`` or
+subscribe to state changes instead of blocking on the scanner. While a
+page is scanned, its progress reaches subscribers the same way.
+"""
+
+import asyncio
+import itertools
+import threading
+import time
+from collections import deque
+
+from app import metrics
+from app.backends.errors import BackendError
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+FINISHED_STATES = (DONE, FAILED)
+
+CANCELLED = "Scan cancelled"
+
+# How many finished jobs are kept around so late pollers can still read them
+_FINISHED_HISTORY = 200
+
+
+def _close(backend):
+    close = getattr(backend, 'close', None)
+    if close:
+        try:
+            close()
+        except Exception as e:
+            print(f"Could not close scan backend: {e}")
+
+
+class ScanJob:
+    def __init__(self, job_id, device, colormode, output_file, owner=None,
+                 batch=False, on_page=None, trace=None, resolution=None, region=None):
+        self.id = job_id
+        self.device = device
+        self.colormode = colormode
+        self.output_file = output_file
+        self.owner = owner
+        # Batch jobs scan the whole document feeder; output_file is then a
+        # page-numbered pattern and on_page is called for every page; it
+        # may return False to leave the page out.
+        self.batch = batch
+        self.on_page = on_page
+        # None scans the full glass at the configured resolution
+        self.resolution = resolution
+        self.region = region
+        # Reported by the backend while the page is scanned: percent done
+        # and the top of the page image so far
+        self.progress = None
+        self.rows = None
+        self.pages = []
+        self.trace = trace
+        self.state = QUEUED
+        self.cancelled = False
+        self.ok = None
+        self.message = ""
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+
+
+class _DeviceWorker:
+    def __init__(self, scheduler, device):
+        self.scheduler = scheduler
+        self.device = device
+        self.queue = deque()
+        self.current = None
+        self.thread = threading.Thread(
+            target=self._run, name=f"scan-worker-{device}", daemon=True
+        )
+        self.thread.start()
+
+    def _run(self):
+        lock = self.scheduler._lock
+        while True:
+            with lock:
+                while not self.queue:
+                    self.scheduler._cond.wait()
+                job = self.queue.popleft()
+                job.state = RUNNING
+                job.started = time.time()
+                self.current = job
+                waiting = list(self.queue)
+
+            # Everyone behind this job moved up one place
+            self.scheduler._notify(job, *waiting)
+
+            backend = self.scheduler._acquire_backend()
+            try:
+                with metrics.bind(job.trace):
+                    ok, msg = self._scan(job, backend)
+            except Exception as e:
+                ok, msg = False, f"Error scanning document: {e}"
+                # A bad page (encoding, post-processing) is the job's problem
+                if isinstance(e, BackendError) and self.scheduler.on_error and not job.cancelled:
+                    self.scheduler.on_error(job, e, backend)
+            finally:
+                self.scheduler._release_backend(backend)
+
+            pool = self.scheduler.pool
+            if job.cancelled:
+                # Killed on purpose; says nothing about the scanner
+                ok, msg = False, CANCELLED
+            elif pool is not None and job.device in pool.members:
+                if ok:
+                    pool.record_success(job.device)
+                else:
+                    pool.record_failure(job.device)
+
+            with lock:
+                self.current = None
+                self.scheduler._finish(job, ok, msg)
+
+            self.scheduler._notify(job)
+            if ok and self.scheduler.on_finished:
+                try:
+                    self.scheduler.on_finished(job)
+                except Exception as e:
+                    print(f"Could not record scan job {job.id}: {e}")
+
+    def _scan(self, job, backend):
+        if job.batch:
+            ok, msg, _ = backend.scan_batch(
+                job.colormode, job.output_file, device=job.device,
+                on_page=lambda path: self._page_done(job, path),
+            )
+            return ok, msg
+        return backend.scan_document(
+            job.colormode, job.output_file, device=job.device,
+            resolution=job.resolution, region=job.region,
+            progress=lambda **update: self._progress(job, **update),
+        )
+
+    def _progress(self, job, percent=None, rows=None):
+        with self.scheduler._lock:
+            if percent is not None:
+                job.progress = percent
+            if rows is not None:
+                job.rows = rows
+        self.scheduler._notify(job)
+
+    def _page_done(self, job, path):
+        if job.on_page and job.on_page(path) is False:
+            return
+        with self.scheduler._lock:
+            job.pages.append(path)
+        self.scheduler._notify(job)
+
+
+class ScanScheduler:
+    def __init__(self, backend, default_device=None, pool=None):
+        self.backend = backend
+        self.default_device = default_device
+        # Scans without an explicit device go to the pool's first free scanner
+        self.pool = pool
+        if pool is not None:
+            pool.load = self.load
+        # Called as on_error(job, exception, backend) when the backend raised
+        # a BackendError
+        self.on_error = None
+        # Called as on_finished(job) after every scan that succeeded
+        self.on_finished = None
+        # estimate(job) -> expected seconds of scanning, or None if unknown
+        self.estimate = None
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._workers = {}
+        self._jobs = {}
+        self._listeners = {}
+        self._finished = deque()
+        self._ids = itertools.count(1)
+        # Scans running on each backend, and replaced backends still in use
+        self._users = {}
+        self._retired = []
+
+    def _acquire_backend(self):
+        with self._lock:
+            backend = self.backend
+            self._users[id(backend)] = self._users.get(id(backend), 0) + 1
+            return backend
+
+    def _release_backend(self, backend):
+        with self._lock:
+            users = self._users.pop(id(backend)) - 1
+            if users:
+                self._users[id(backend)] = users
+                return
+            if not any(old is backend for old in self._retired):
+                return
+            self._retired = [old for old in self._retired if old is not backend]
+        _close(backend)
+
+    def replace_backend(self, backend):
+        """Send later scans to ``backend``.
+
+        The old backend is closed once the scans still running on it, on
+        other devices, have finished.
+        """
+        with self._lock:
+            old, self.backend = self.backend, backend
+            if self._users.get(id(old)):
+                self._retired.append(old)
+                return
+        _close(old)
+
+    def submit(self, colormode, output_file, device=None, owner=None,
+               batch=False, on_page=None, trace=None, resolution=None, region=None):
+        """Queue a scan on ``device`` and return its job id without waiting."""
+        if device is None and self.pool is not None:
+            device = self.pool.choose()
+        if device is None:
+            device = self.default_device
+        with self._lock:
+            job = ScanJob(next(self._ids), device, colormode, output_file, owner,
+                          batch, on_page, trace, resolution, region)
+            self._jobs[job.id] = job
+            worker = self._workers.get(device)
+            if worker is None:
+                worker = self._workers[device] = _DeviceWorker(self, device)
+            worker.queue.append(job)
+            self._cond.notify_all()
+        self._notify(job)
+        return job.id
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _finish(self, job, ok, message):
+        # Called with the lock held
+        job.ok = ok
+        job.message = message
+        job.state = DONE if ok else FAILED
+        job.finished = time.time()
+        self._finished.append(job.id)
+        while len(self._finished) > _FINISHED_HISTORY:
+            self._jobs.pop(self._finished.popleft(), None)
+
+    def cancel(self, job_id):
+        """Drop a queued job, or kill the scan of a running one.
+
+        Returns False if the job had already finished. A running job is
+        reported as cancelled once its worker has stopped the scanner.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.state in FINISHED_STATES:
+                return False
+            job.cancelled = True
+            worker = self._workers[job.device]
+            queued = job.state == QUEUED
+            if queued:
+                worker.queue.remove(job)
+                self._finish(job, False, CANCELLED)
+                waiting = list(worker.queue)
+
+        if queued:
+            self._notify(job, *waiting)
+        else:
+            # Only scans run as a command can be stopped half-way
+            metrics.kill_command(worker.thread.ident)
+        return True
+
+    def load(self, device):
+        """Jobs queued on or being scanned by ``device``."""
+        with self._lock:
+            worker = self._workers.get(device)
+            if worker is None:
+                return 0
+            return len(worker.queue) + (worker.current is not None)
+
+    def status(self, job_id):
+        """Return a snapshot of the job with its queue position (1 = next up)."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+
+            position = 0
+            depth = 0
+            wait = None
+            worker = self._workers.get(job.device)
+            if worker:
+                depth = len(worker.queue)
+                if job.state == QUEUED:
+                    position = worker.queue.index(job) + 1
+                    wait = self._wait(worker, position)
+
+            return {
+                "id": job.id,
+                "device": job.device,
+                "state": job.state,
+                "position": position,
+                "depth": depth,
+                "wait": wait,
+                "ok": job.ok,
+                "message": job.message,
+                "output_file": job.output_file,
+                "pages": list(job.pages),
+                "progress": job.progress,
+                "rows": job.rows,
+                "submitted": job.submitted,
+                "started": job.started,
+                "finished": job.finished,
+            }
+
+    def _wait(self, worker, position):
+        # Called with the lock held: the expected seconds until the job at
+        # ``position`` starts, or None if a job ahead of it is unknown
+        if self.estimate is None:
+            return None
+        wait = 0.0
+        current = worker.current
+        if current is not None:
+            expected = self.estimate(current)
+            if expected is None:
+                return None
+            wait += max(0.0, expected - (time.time() - current.started))
+        for ahead in list(worker.queue)[:position - 1]:
+            expected = self.estimate(ahead)
+            if expected is None:
+                return None
+            wait += expected
+        return wait
+
+    def subscribe(self, job_id, callback):
+        """Call ``callback(status)`` whenever the job changes state or position.
+
+        Returns a function that removes the subscription. Callbacks run on the
+        scheduler's threads and must not block.
+        """
+        with self._lock:
+            self._listeners.setdefault(job_id, []).append(callback)
+
+        def unsubscribe():
+            with self._lock:
+                callbacks = self._listeners.get(job_id, [])
+                if callback in callbacks:
+                    callbacks.remove(callback)
+                if not callbacks:
+                    self._listeners.pop(job_id, None)
+
+        return unsubscribe
+
+    def _notify(self, *jobs):
+        for job in jobs:
+            with self._lock:
+                callbacks = list(self._listeners.get(job.id, ()))
+            if not callbacks:
+                continue
+            status = self.status(job.id)
+            for callback in callbacks:
+                try:
+                    callback(status)
+                except Exception:
+                    pass
+
+    async def watch(self, job_id, heartbeat=None):
+        """Async iterator over status snapshots until the job finishes.
+
+        Waiting costs no thread: the event loop is woken by the worker.
+        With ``heartbeat``, a snapshot also comes at least that many
+        seconds apart, so callers can show the time passing.
+        """
+        loop = asyncio.get_running_loop()
+        changed = asyncio.Event()
+        unsubscribe = self.subscribe(
+            job_id, lambda _status: loop.call_soon_threadsafe(changed.set)
+        )
+        try:
+            while True:
+                changed.clear()
+                status = self.status(job_id)
+                if status is None:
+                    return
+                yield status
+                if status["state"] in FINISHED_STATES:
+                    return
+                try:
+                    await asyncio.wait_for(changed.wait(), heartbeat)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            unsubscribe()
+
+    def wait(self, job_id, timeout=None):
+        """Block until the job finishes and return its final status."""
+        finished = threading.Event()
+
+        def on_change(status):
+            if status["state"] in FINISHED_STATES:
+                finished.set()
+
+        unsubscribe = self.subscribe(job_id, on_change)
+        try:
+            status = self.status(job_id)
+            if status and status["state"] not in FINISHED_STATES:
+                finished.wait(timeout)
+            return self.status(job_id)
+        finally:
+            unsubscribe()
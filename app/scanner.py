@@ -2,12 +2,17 @@ import win32com.client
 import pythoncom
 from enum import Enum
 
+# WIA format GUID for JPEG; the scan is saved as-is and embedded into the PDF
+# without re-encoding (see app/pdf.py).
+WIA_FORMAT_JPEG = "{B96B3CAE-0728-11D3-9D7B-0000F81EF32E}"
+
 class ImageMode(Enum):
     COLOR = 1
     GRAYSCALE = 2
     BLACK_AND_WHITE = 4
 
-def scan_document_without_selection(device_num, target_file_path, ImageMode=ImageMode.COLOR):
+def scan_document_without_selection(device_num, target_file_path, ImageMode=ImageMode.COLOR,
+                                    resolution=300, region=None):
     try:
         # Initialize WIA Automation
         pythoncom.CoInitialize()
@@ -23,13 +28,25 @@ def scan_document_without_selection(device_num, target_file_path, ImageMode=Imag
 
         # Adjust scanner settings (e.g., DPI, color mode)
         item.Properties["6146"].Value = ImageMode  # 1 = Color, 2 = Grayscale, 4 = Black/White
-        item.Properties["6147"].Value = 300  # DPI X (300x300 resolution)
-        item.Properties["6148"].Value = 300  # DPI Y
-        item.Properties["6149"].Value = 0    # xPos
-        item.Properties["6150"].Value = 0    # yPos
+        item.Properties["6147"].Value = resolution  # DPI X
+        item.Properties["6148"].Value = resolution  # DPI Y
+        if region:
+            # (left, top, width, height) in mm; WIA wants pixels at the scan resolution
+            left, top, width, height = (round(v / 25.4 * resolution) for v in region)
+            item.Properties["6149"].Value = left    # xPos
+            item.Properties["6150"].Value = top     # yPos
+            item.Properties["6151"].Value = width   # xExtent
+            item.Properties["6152"].Value = height  # yExtent
+        else:
+            # The extents stay as the last region set them; reset to the whole bed
+            # (bed sizes are in thousandths of an inch)
+            item.Properties["6149"].Value = 0    # xPos
+            item.Properties["6150"].Value = 0    # yPos
+            item.Properties["6151"].Value = device.Properties["3074"].Value * resolution // 1000
+            item.Properties["6152"].Value = device.Properties["3075"].Value * resolution // 1000
         
         # Execute the scan
-        image = item.Transfer()
+        image = item.Transfer(WIA_FORMAT_JPEG)
         
         # Save the scanned file
         image.SaveFile(target_file_path)
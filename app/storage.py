@@ -0,0 +1,182 @@
+"""Scan storage: collision-free file names, an SQLite index and retention.
+
+Every scan gets a unique stem in ``storage.scan_dir``; all files derived
+from it (JPEG pages, PDF, preview...) share that stem. The index records
+size, mode, owner and timestamps, so history is listed and quotas are
+enforced without walking the directory.
+"""
+
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS scans (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    stem TEXT NOT NULL UNIQUE,
+    created REAL NOT NULL,
+    last_access REAL NOT NULL,
+    owner TEXT,
+    mode TEXT,
+    pages INTEGER NOT NULL DEFAULT 1,
+    bytes INTEGER NOT NULL DEFAULT 0,
+    files TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS scans_created ON scans (created);
+CREATE INDEX IF NOT EXISTS scans_owner_created ON scans (owner, created);
+CREATE INDEX IF NOT EXISTS scans_last_access ON scans (last_access);
+"""
+
+_COLUMNS = ("id", "stem", "created", "last_access", "owner", "mode",
+            "pages", "bytes", "files")
+
+
+class ScanStore:
+    def __init__(self, config):
+        storage = config['storage']
+        self.scan_dir = storage['scan_dir']
+        self.max_age = float(storage.get('max_age_days') or 0) * 86400
+        self.max_bytes = int(float(storage.get('max_size_mb') or 0) * 1024 * 1024)
+
+        index_path = storage.get('index_path') or os.path.join(self.scan_dir, "index.sqlite3")
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(index_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+
+    def new_stem(self, prefix="scan"):
+        """Return a fresh, collision-free path stem (no extension) for a scan."""
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        return os.path.join(self.scan_dir, f"{prefix}_{timestamp}_{secrets.token_hex(4)}")
+
+    def _row(self, row):
+        if row is None:
+            return None
+        record = dict(zip(_COLUMNS, row))
+        record['files'] = [os.path.join(self.scan_dir, f) for f in json.loads(record['files'])]
+        return record
+
+    def add(self, stem, files, owner=None, mode=None, pages=1):
+        """Index a finished scan; ``files[0]`` is the document itself."""
+        files = [f for f in files if f and os.path.exists(f)]
+        size = sum(os.path.getsize(f) for f in files)
+        now = time.time()
+
+        with self._lock, self._db:
+            cursor = self._db.execute(
+                "INSERT INTO scans (stem, created, last_access, owner, mode, pages, bytes, files)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (os.path.basename(stem), now, now, owner, mode, pages, size,
+                 json.dumps([os.path.relpath(f, self.scan_dir) for f in files])),
+            )
+            scan_id = cursor.lastrowid
+
+        self.enforce()
+        return scan_id
+
+    def add_file(self, scan_id, path):
+        """Attach a file derived later (e.g. an OCR result) to an indexed scan."""
+        with self._lock, self._db:
+            row = self._db.execute("SELECT files FROM scans WHERE id = ?", (scan_id,)).fetchone()
+            if row is None:
+                return
+            files = json.loads(row[0])
+            rel = os.path.relpath(path, self.scan_dir)
+            if rel not in files:
+                files.append(rel)
+            self._db.execute(
+                "UPDATE scans SET files = ?, bytes = bytes + ? WHERE id = ?",
+                (json.dumps(files), os.path.getsize(path), scan_id),
+            )
+
+    def get(self, scan_id, touch=True):
+        with self._lock, self._db:
+            if touch:
+                self._db.execute("UPDATE scans SET last_access = ? WHERE id = ?", (time.time(), scan_id))
+            row = self._db.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM scans WHERE id = ?", (scan_id,)
+            ).fetchone()
+        return self._row(row)
+
+    def find_by_stem(self, stem):
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM scans WHERE stem = ?", (os.path.basename(stem),)
+            ).fetchone()
+        return self._row(row)
+
+    def list(self, owner=None, limit=20, before=None, since=None):
+        """Newest-first page of scans, using keyset pagination on ``created``.
+
+        Pass the ``created`` value of the last row as ``before`` to get the
+        next page; each page costs one indexed range query. ``since`` leaves
+        out scans created before it.
+        """
+        where, args = [], []
+        if owner is not None:
+            where.append("owner = ?")
+            args.append(owner)
+        if before is not None:
+            where.append("created < ?")
+            args.append(before)
+        if since is not None:
+            where.append("created >= ?")
+            args.append(since)
+        sql = f"SELECT {', '.join(_COLUMNS)} FROM scans"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY created DESC LIMIT ?"
+        args.append(limit)
+
+        with self._lock:
+            rows = self._db.execute(sql, args).fetchall()
+        return [self._row(row) for row in rows]
+
+    def total_bytes(self):
+        with self._lock:
+            return self._db.execute("SELECT COALESCE(SUM(bytes), 0) FROM scans").fetchone()[0]
+
+    def delete(self, scan_id):
+        record = self.get(scan_id, touch=False)
+        if record is None:
+            return
+        for path in record['files']:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM scans WHERE id = ?", (scan_id,))
+
+    def enforce(self):
+        """Apply the retention policy: drop expired scans, then least recently
+        used ones until the byte quota is met. Returns the number removed."""
+        removed = 0
+        if self.max_age:
+            with self._lock:
+                expired = [row[0] for row in self._db.execute(
+                    "SELECT id FROM scans WHERE created < ?", (time.time() - self.max_age,)
+                )]
+            for scan_id in expired:
+                self.delete(scan_id)
+                removed += 1
+
+        if self.max_bytes:
+            excess = self.total_bytes() - self.max_bytes
+            if excess > 0:
+                with self._lock:
+                    candidates = self._db.execute(
+                        "SELECT id, bytes FROM scans ORDER BY last_access ASC"
+                    ).fetchall()
+                for scan_id, size in candidates:
+                    if excess <= 0:
+                        break
+                    self.delete(scan_id)
+                    excess -= size
+                    removed += 1
+
+        return removed
@@ -0,0 +1,195 @@
+"""Strip-by-strip encoding of uncompressed scans in bounded memory.
+
+A 600 dpi colour page is about 100 MB of pixels, an A3 one about 400 MB.
+Instead of decoding such a page in one piece, the PNM that ``scanimage``
+writes is read a fixed number of rows at a time; each strip is
+JPEG-encoded on its own and shrunk into the preview, so only one strip of
+the page is ever held in memory.
+
+The strips still make one ordinary baseline JPEG: they are encoded with
+identical tables, and their entropy-coded data is joined with restart
+markers under a single frame header for the whole page. A restart marker
+resets the decoder's DC prediction, which is exactly the state a fresh
+encoder starts each strip in.
+"""
+
+import io
+import math
+import os
+
+from PIL import Image
+
+from .encoding import DEFAULT_JPEG_QUALITY
+from .preview import save_preview
+
+DEFAULT_STRIP_HEIGHT = 256
+
+_PNM_MODES = {b"P5": "L", b"P6": "RGB"}
+
+# The restart interval (MCUs per strip) is a 16-bit field
+_MAX_RESTART_INTERVAL = 0xFFFF
+
+
+def is_pnm(path):
+    try:
+        with open(path, "rb") as f:
+            return f.read(2) in _PNM_MODES
+    except OSError:
+        return False
+
+
+def _token(f):
+    token = b""
+    while True:
+        c = f.read(1)
+        if not c:
+            raise ValueError("Truncated PNM header")
+        if c == b"#" and not token:
+            f.readline()  # scanimage adds a "# SANE data follows" comment
+        elif c.isspace():
+            if token:
+                return token
+        else:
+            token += c
+
+
+def read_pnm_header(f):
+    """Read a binary PGM/PPM header from ``f``; return (PIL mode, width, height)."""
+    magic = _token(f)
+    mode = _PNM_MODES.get(magic)
+    if mode is None:
+        raise ValueError(f"Cannot stream a PNM of type {magic.decode(errors='replace')}")
+    width, height, maxval = (int(_token(f)) for _ in range(3))
+    if maxval != 255:
+        raise ValueError("Only 8-bit scans can be streamed")
+    return mode, width, height
+
+
+def _split_jpeg(data):
+    """Split a baseline JPEG into its header segments, SOS segment and scan data."""
+    if data[:2] != b"\xff\xd8" or data[-2:] != b"\xff\xd9":
+        raise ValueError("Unexpected JPEG framing")
+    segments = []
+    pos = 2
+    while True:
+        marker = data[pos + 1]
+        end = pos + 2 + int.from_bytes(data[pos + 2:pos + 4], "big")
+        if marker == 0xDA:
+            return segments, data[pos:end], data[end:-2]
+        segments.append((marker, data[pos:end]))
+        pos = end
+
+
+class StripJpegWriter:
+    """Write one JPEG of ``width`` x ``height`` to ``f`` from strips of ``strip_height`` rows.
+
+    Every strip but the last must be exactly ``strip_height`` rows, a
+    multiple of the MCU height (16 for colour, 8 for gray).
+    """
+
+    def __init__(self, f, width, height, mode, strip_height, quality=None, dpi=None):
+        self.f = f
+        self.width = width
+        self.height = height
+        self.mode = mode
+        self.strip_height = strip_height
+        self.options = {"quality": quality or DEFAULT_JPEG_QUALITY}
+        if mode == "RGB":
+            self.options["subsampling"] = "4:2:0"
+        if dpi:
+            self.options["dpi"] = (dpi, dpi)
+        self._tables = None
+        self._strips = 0
+
+    @staticmethod
+    def mcu_height(mode):
+        return 16 if mode == "RGB" else 8
+
+    def write(self, strip):
+        buf = io.BytesIO()
+        strip.save(buf, "JPEG", **self.options)
+        segments, sos, data = _split_jpeg(buf.getvalue())
+        tables = b"".join(segment for marker, segment in segments if marker != 0xC0)
+
+        if self._tables is None:
+            self._tables = tables
+            mcu = self.mcu_height(self.mode)
+            interval = math.ceil(self.width / mcu) * (self.strip_height // mcu)
+            header = bytearray(b"\xff\xd8")
+            for marker, segment in segments:
+                if marker == 0xC0:
+                    # The frame header of the first strip, with the page's height
+                    segment = segment[:5] + self.height.to_bytes(2, "big") + segment[7:]
+                header += segment
+            header += b"\xff\xdd\x00\x04" + interval.to_bytes(2, "big")
+            self.f.write(header + sos)
+        else:
+            if tables != self._tables:
+                raise ValueError("Strips were encoded with different tables")
+            self.f.write(bytes((0xFF, 0xD0 + (self._strips - 1) % 8)))
+        self.f.write(data)
+        self._strips += 1
+
+    def close(self):
+        self.f.write(b"\xff\xd9")
+
+
+def _strip_height(requested, mode, width, factor):
+    # Strips must end on MCU rows and on rows of the shrunk preview
+    align = math.lcm(StripJpegWriter.mcu_height(mode), factor)
+    rows = max(align, requested // align * align)
+    mcu = StripJpegWriter.mcu_height(mode)
+    while rows > align and math.ceil(width / mcu) * (rows // mcu) > _MAX_RESTART_INTERVAL:
+        rows -= align
+    return rows
+
+
+def encode_stream(src, path, mode, quality=None, resolution=None,
+                  strip_height=DEFAULT_STRIP_HEIGHT, preview=None, on_strip=None):
+    """Encode the 8-bit PNM read from ``src`` into the JPEG ``path``, a strip at a time.
+
+    ``mode`` is "Color" or "Gray". With ``preview`` as ``(max_edge, fmt)``
+    the page's preview is built from the same strips, and
+    ``on_strip(preview, rows)`` is called after each strip with the
+    preview and how many of its rows are done. Raises ValueError if the
+    stream is not a PNM or ends early.
+    """
+    source_mode, width, height = read_pnm_header(src)
+    target = "L" if mode == "Gray" else "RGB"
+
+    factor = max(1, max(width, height) // preview[0]) if preview else 1
+    rows = _strip_height(strip_height, target, width, factor)
+    thumbnail = None
+    if preview:
+        thumbnail = Image.new(target, (math.ceil(width / factor), math.ceil(height / factor)))
+
+    row_bytes = width * len(source_mode)
+    tmp = f"{path}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            writer = StripJpegWriter(f, width, height, target, rows, quality, resolution)
+            done = 0
+            while done < height:
+                count = min(rows, height - done)
+                data = src.read(row_bytes * count)
+                if len(data) != row_bytes * count:
+                    raise ValueError(f"The scan ended after {done} of {height} rows")
+                strip = Image.frombuffer(source_mode, (width, count), data, "raw", source_mode, 0, 1)
+                if strip.mode != target:
+                    strip = strip.convert(target)
+                writer.write(strip)
+                if thumbnail is not None:
+                    thumbnail.paste(strip.reduce(factor) if factor > 1 else strip, (0, done // factor))
+                done += count
+                if on_strip is not None and thumbnail is not None:
+                    on_strip(thumbnail, math.ceil(done / factor))
+            writer.close()
+    except BaseException:
+        os.remove(tmp)
+        raise
+    os.replace(tmp, path)
+
+    if thumbnail is not None:
+        thumbnail.thumbnail((preview[0], preview[0]))
+        save_preview(thumbnail, path, preview[1])
+    return path
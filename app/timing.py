@@ -0,0 +1,21 @@
+"""Wall-clock timing of startup phases (``python run.py --timing``)."""
+
+import time
+
+
+class StartupTimer:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.last = self.start
+        self.phases = []
+
+    def mark(self, name):
+        """Record the time spent since the previous mark under ``name``."""
+        now = time.perf_counter()
+        self.phases.append((name, now - self.last))
+        self.last = now
+
+    def report(self):
+        lines = [f"  {name:<24} {seconds * 1000:>8.1f} ms" for name, seconds in self.phases]
+        lines.append(f"  {'total':<24} {(self.last - self.start) * 1000:>8.1f} ms")
+        return "\n".join(lines)
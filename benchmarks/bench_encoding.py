@@ -0,0 +1,95 @@
+"""Size and time of each colour mode's page encoding vs. a plain JPEG.
+
+The baseline is what scanimage used to produce for every mode: a JPEG at
+libjpeg's default quality. Lineart is compared with its Group 4 encoding,
+Gray and Color with JPEGs at the given scanning.jpeg_quality values. For
+each the table shows the time to encode the page, the time to wrap it into
+a PDF and the resulting PDF size.
+
+Run from the repository root:
+  python -m benchmarks.bench_encoding [--width 2480 --height 3508 --repeat 3]
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from PIL import Image, ImageDraw
+
+from app.encoding import save_image
+from app.pdf import image_to_pdf
+
+MODES = {"Lineart": "1", "Gray": "L", "Color": "RGB"}
+
+
+def make_page(width, height, mode):
+    # Lines of "text" on a slightly noisy background, like a scanned letter
+    rng = random.Random(0)
+    page = Image.new("L", (width, height), 235)
+    draw = ImageDraw.Draw(page)
+    line_height = max(height // 80, 4)
+    for y in range(height // 10, height * 9 // 10, line_height * 2):
+        x = width // 10
+        while x < width * 9 // 10:
+            word = rng.randint(line_height, line_height * 6)
+            draw.rectangle((x, y, x + word, y + line_height), fill=rng.randint(10, 60))
+            x += word + line_height
+    page = Image.blend(page, Image.effect_noise((width, height), 20), 0.1)
+    if mode == "1":
+        return page.point(lambda v: 255 if v > 128 else 0).convert("1")
+    if mode == "RGB":
+        tint = Image.linear_gradient("L").resize((width, height))
+        return Image.merge("RGB", (page, page, Image.blend(page, tint, 0.3)))
+    return page
+
+
+def measure(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--width", type=int, default=2480)
+    parser.add_argument("--height", type=int, default=3508)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--qualities", default="50,85",
+                        help="comma-separated scanning.jpeg_quality values for Gray/Color")
+    args = parser.parse_args()
+
+    print(f"{'mode':<8} {'encoding':<10} {'encode s':>9} {'pdf s':>7} {'pdf KB':>9} {'ratio':>6}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode, pil_mode in MODES.items():
+            page = make_page(args.width, args.height, pil_mode)
+
+            baseline = os.path.join(tmp, f"{mode}_baseline.jpg")
+            scanner_image = page.convert("L") if pil_mode == "1" else page
+            encode_s = measure(lambda: scanner_image.save(baseline, "JPEG", quality=75), args.repeat)
+            pdf_path = os.path.join(tmp, f"{mode}_baseline.pdf")
+            pdf_s = measure(lambda: image_to_pdf(baseline, pdf_path), args.repeat)
+            baseline_size = os.path.getsize(pdf_path)
+            print(f"{mode:<8} {'jpeg q75':<10} {encode_s:>9.3f} {pdf_s:>7.3f} "
+                  f"{baseline_size / 1024:>9.0f} {1:>6.2f}")
+
+            if mode == "Lineart":
+                variants = [("g4", None, "tif")]
+            else:
+                variants = [(f"jpeg q{q}", int(q), "jpg") for q in args.qualities.split(",")]
+            for name, quality, ext in variants:
+                encoded = os.path.join(tmp, f"{mode}_{quality}.{ext}")
+                encode_s = measure(lambda: save_image(page, encoded, mode, quality, 300), args.repeat)
+                pdf_path = os.path.join(tmp, f"{mode}_{quality}.pdf")
+                pdf_s = measure(lambda: image_to_pdf(encoded, pdf_path), args.repeat)
+                size = os.path.getsize(pdf_path)
+                print(f"{mode:<8} {name:<10} {encode_s:>9.3f} {pdf_s:>7.3f} "
+                      f"{size / 1024:>9.0f} {size / baseline_size:>6.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Compare scan-to-PDF conversion: PIL re-encode vs direct DCTDecode embedding.
+
+Run from the repository root:
+  python -m benchmarks.bench_pdf [--width 2480 --height 3508 --repeat 5]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+from PIL import Image
+
+from app.pdf import jpeg_to_pdf
+
+
+def make_sample_jpeg(path, width, height, mode):
+    # A gradient with noise compresses roughly like a real scanned page
+    noise = Image.effect_noise((width, height), 40)
+    gradient = Image.linear_gradient("L").resize((width, height))
+    gray = Image.blend(noise, gradient, 0.5)
+    image = gray if mode == "L" else Image.merge("RGB", (gray, gradient, noise))
+    image.save(path, "JPEG", quality=85, dpi=(300, 300))
+
+
+def pil_path(jpeg_path, pdf_path):
+    image = Image.open(jpeg_path)
+    image.save(pdf_path, "PDF", resolution=300.0)
+
+
+def direct_path(jpeg_path, pdf_path):
+    jpeg_to_pdf(jpeg_path, pdf_path, 300.0)
+
+
+def measure(fn, jpeg_path, pdf_path, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(jpeg_path, pdf_path)
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    fn(jpeg_path, pdf_path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return min(timings), peak, os.path.getsize(pdf_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--width", type=int, default=2480)
+    parser.add_argument("--height", type=int, default=3508)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'mode':<6} {'method':<8} {'best s':>8} {'peak MB':>9} {'pdf KB':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in ("L", "RGB"):
+            jpeg_path = os.path.join(tmp, f"sample_{mode}.jpg")
+            make_sample_jpeg(jpeg_path, args.width, args.height, mode)
+
+            for name, fn in (("pil", pil_path), ("direct", direct_path)):
+                pdf_path = os.path.join(tmp, f"sample_{mode}_{name}.pdf")
+                seconds, peak, size = measure(fn, jpeg_path, pdf_path, args.repeat)
+                # tracemalloc only sees Python allocations; PIL's decoded
+                # bitmap lives in C memory, so the PIL peak is a lower bound.
+                print(f"{mode:<6} {name:<8} {seconds:>8.3f} {peak / 2**20:>9.1f} {size / 1024:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
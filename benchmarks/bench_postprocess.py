@@ -0,0 +1,98 @@
+"""Time blank-page detection and auto-crop against the per-page budget.
+
+Synthetic 300 dpi pages (a receipt in one corner, a full letter and an
+empty sheet with dust) are written in each mode's stored format, then
+analysed and cropped the way the scan handlers do it. Exits non-zero when
+a page takes longer than --budget milliseconds.
+
+Run from the repository root:
+  python -m benchmarks.bench_postprocess [--repeat 5 --budget 100]
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from PIL import Image, ImageDraw
+
+from app.encoding import save_image
+from app.postprocess import analyze, crop_page, is_blank
+
+WIDTH, HEIGHT = 2480, 3508
+MODES = {"Lineart": "1", "Gray": "L", "Color": "RGB"}
+
+
+def make_page(kind, pil_mode):
+    rng = random.Random(kind)
+    page = Image.new("L", (WIDTH, HEIGHT), 240)
+    draw = ImageDraw.Draw(page)
+    if kind == "receipt":
+        area = (150, 150, 950, 1800)
+    elif kind == "letter":
+        area = (250, 300, WIDTH - 250, HEIGHT - 300)
+    else:
+        area = None
+        for _ in range(30):
+            x, y = rng.randrange(WIDTH), rng.randrange(HEIGHT)
+            draw.ellipse((x, y, x + 3, y + 3), fill=90)
+    if area:
+        left, top, right, bottom = area
+        for y in range(top, bottom, 50):
+            x = left
+            while x < right:
+                word = rng.randint(40, 200)
+                draw.rectangle((x, y, min(x + word, right), y + 25), fill=30)
+                x += word + 25
+    if pil_mode == "1":
+        return page.point(lambda v: 255 if v > 128 else 0).convert("1")
+    if pil_mode == "RGB":
+        return Image.merge("RGB", (page, page, page.point(lambda v: max(v - 20, 0))))
+    return page
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=100.0, help="milliseconds per page")
+    args = parser.parse_args()
+
+    print(f"jpegtran: {'yes' if shutil.which('jpegtran') else 'no (JPEG crops re-encode)'}")
+    print(f"{'mode':<8} {'page':<8} {'analyze ms':>10} {'crop ms':>8} {'total ms':>9} "
+          f"{'blank':>6} {'kept area':>9}")
+    over_budget = False
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode, pil_mode in MODES.items():
+            for kind in ("receipt", "letter", "blank"):
+                source = os.path.join(tmp, f"{mode}_{kind}_source")
+                save_image(make_page(kind, pil_mode), source, mode, None, 300)
+                path = os.path.join(tmp, f"{mode}_{kind}")
+
+                best = None
+                for _ in range(args.repeat):
+                    shutil.copyfile(source, path)
+                    start = time.perf_counter()
+                    analysis = analyze(path)
+                    analyzed = time.perf_counter()
+                    crop_page(path, mode, analysis)
+                    done = time.perf_counter()
+                    timing = (analyzed - start, done - analyzed, done - start)
+                    if best is None or timing[2] < best[2]:
+                        best = timing
+
+                with Image.open(path) as cropped:
+                    kept = cropped.width * cropped.height / (WIDTH * HEIGHT)
+                over_budget |= best[2] * 1000 > args.budget
+                print(f"{mode:<8} {kind:<8} {best[0] * 1000:>10.1f} {best[1] * 1000:>8.1f} "
+                      f"{best[2] * 1000:>9.1f} {str(is_blank(analysis)):>6} {kept:>9.0%}")
+
+    if over_budget:
+        print(f"over the {args.budget:.0f} ms budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
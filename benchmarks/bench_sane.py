@@ -0,0 +1,58 @@
+"""Scan latency: one scanimage process per scan vs a warm python-sane handle.
+
+Needs SANE with the ``test`` backend enabled (and python-sane for the warm
+engine). Run from the repository root:
+  python -m benchmarks.bench_sane [--device test --mode 2 --repeat 5]
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from app.backends.unix_scanning import UnixScanningBackend
+
+
+def run(backend, device, colormode, repeat, tmp):
+    timings = []
+    for i in range(repeat):
+        target = os.path.join(tmp, f"{type(backend).__name__}_{i}.jpg")
+        start = time.perf_counter()
+        ok, msg = backend.scan_document(colormode, target, device=device)
+        timings.append(time.perf_counter() - start)
+        if not ok:
+            raise SystemExit(msg)
+    return timings
+
+
+def report(name, timings):
+    warm = timings[1:] or timings
+    print(f"{name:<10} {timings[0]:>8.3f} {statistics.median(warm):>8.3f} {max(warm):>8.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--device", default="test")
+    parser.add_argument("--mode", type=int, default=2, help="1 = Color, 2 = Gray, 4 = Lineart")
+    parser.add_argument("--resolution", type=int, default=150)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    config = {'scanning': {'unix_device_name': args.device, 'resolution': args.resolution}}
+
+    print(f"{'engine':<10} {'first s':>8} {'median s':>8} {'max s':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        report("scanimage", run(UnixScanningBackend(config), args.device, args.mode, args.repeat, tmp))
+
+        try:
+            from app.backends.sane_scanning import SaneScanningBackend
+            backend = SaneScanningBackend(config)
+        except RuntimeError as e:
+            print(f"sane       skipped: {e}")
+            return
+        report("sane", run(backend, args.device, args.mode, args.repeat, tmp))
+
+
+if __name__ == "__main__":
+    main()
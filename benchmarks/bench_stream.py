@@ -0,0 +1,116 @@
+"""Peak memory of encoding uncompressed scans: strip streaming vs whole pages.
+
+A producer process writes a synthetic page as PNM to a pipe, the way
+``scanimage --format=pnm`` does, and a fresh consumer process encodes it
+to JPEG either strip by strip (app.stream) or by decoding the whole page
+(app.encoding.encode_page). The consumer reports its peak RSS. Exits
+non-zero when a streamed page exceeds --cap-mb.
+
+Run from the repository root:
+  python -m benchmarks.bench_stream [--cap-mb 64 --strip-height 256]
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+PAGES = {
+    "A4 300dpi": (2480, 3508),
+    "A4 600dpi": (4960, 7016),
+    "A3 600dpi": (7016, 9920),
+}
+MODES = {"Color": 3, "Gray": 1}
+
+
+def produce(width, height, channels):
+    import numpy as np
+
+    out = sys.stdout.buffer
+    out.write(f"P{6 if channels == 3 else 5}\n# SANE data follows\n{width} {height}\n255\n".encode())
+    # Lines of "text" on paper, generated a band at a time
+    band = np.full((64, width, channels), 235, np.uint8)
+    rng = np.random.default_rng(1)
+    for x in range(width // 20, width - width // 20, 40):
+        band[20:44, x:x + rng.integers(10, 35)] = (40, 40, 90)[:channels]
+    for row in range(0, height, 64):
+        out.write(band[:min(64, height - row)].tobytes())
+
+
+def consume(method, mode, strip_height, path):
+    start = time.perf_counter()
+    if method == "stream":
+        from app.stream import encode_stream
+
+        encode_stream(sys.stdin.buffer, path, mode, 85, 300, strip_height, preview=(1024, "jpeg"))
+    else:
+        from app.encoding import encode_page
+        from app.preview import make_preview
+
+        with open(path, "wb") as f:
+            for chunk in iter(lambda: sys.stdin.buffer.read(1024 * 1024), b""):
+                f.write(chunk)
+        encode_page(path, mode, 85, 300)
+        make_preview(path)
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is in kilobytes on Linux
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(json.dumps({"seconds": elapsed, "peak_mb": peak}))
+
+
+def run(method, mode, size, strip_height, path):
+    me = [sys.executable, "-m", "benchmarks.bench_stream"]
+    producer = subprocess.Popen(
+        me + ["--produce", str(size[0]), str(size[1]), str(MODES[mode])],
+        stdout=subprocess.PIPE,
+    )
+    with producer:
+        result = subprocess.run(
+            me + ["--consume", method, mode, str(strip_height), path],
+            stdin=producer.stdout, capture_output=True, text=True, check=True,
+        )
+    return json.loads(result.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cap-mb", type=float, default=64.0, help="peak RSS allowed when streaming")
+    parser.add_argument("--strip-height", type=int, default=256)
+    parser.add_argument("--skip-whole", action="store_true", help="only measure streaming")
+    parser.add_argument("--produce", nargs=3, type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--consume", nargs=4, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.produce:
+        produce(*args.produce)
+        return
+    if args.consume:
+        method, mode, strip_height, path = args.consume
+        consume(method, mode, int(strip_height), path)
+        return
+
+    methods = ["stream"] if args.skip_whole else ["stream", "whole"]
+    print(f"{'page':<10} {'mode':<6} {'method':<7} {'peak MB':>8} {'seconds':>8} {'JPEG MB':>8}")
+    over_cap = False
+    with tempfile.TemporaryDirectory() as tmp:
+        for page, size in PAGES.items():
+            for mode in MODES:
+                for method in methods:
+                    path = os.path.join(tmp, f"{method}.jpg")
+                    result = run(method, mode, size, args.strip_height, path)
+                    if method == "stream":
+                        over_cap |= result["peak_mb"] > args.cap_mb
+                    print(f"{page:<10} {mode:<6} {method:<7} {result['peak_mb']:>8.0f} "
+                          f"{result['seconds']:>8.2f} {os.path.getsize(path) / 1e6:>8.1f}")
+
+    if over_cap:
+        print(f"streamed encoding went over the {args.cap_mb:.0f} MB cap")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
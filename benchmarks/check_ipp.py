@@ -0,0 +1,78 @@
+"""Check the IPP print backend against the stub scheduler in benchmarks/fakes.
+
+Submits a batch with Print-Job and checks that it went over one
+connection, follows the jobs with Get-Jobs and Get-Job-Attributes until
+they complete, then stops the scheduler and checks that the batch falls
+back to the fake ``lp``. Exits non-zero on the first failed check.
+
+Run from the repository root:
+  python -m benchmarks.check_ipp [--files 5]
+"""
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from app.backends.ipp_printing import IppPrintingBackend
+from benchmarks.fakes.ipp_server import StubIppServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FAKES = os.path.join(ROOT, "benchmarks", "fakes")
+
+
+def check(condition, message):
+    if not condition:
+        raise SystemExit(f"FAIL: {message}")
+    print(f"ok    {message}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=5)
+    args = parser.parse_args()
+    os.environ["PATH"] = FAKES + os.pathsep + os.environ.get("PATH", "")
+
+    server = StubIppServer(latency=0.5)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    config = {"printing": {"cups_uri": server.uri, "default_printer": None}}
+    backend = IppPrintingBackend(config)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for i in range(args.files):
+            path = os.path.join(tmp, f"page{i}.pdf")
+            with open(path, "wb") as f:
+                f.write(os.urandom(4096))
+            paths.append(path)
+
+        # Print-Job
+        results = backend.submit_files(paths)
+        check(all(r['ok'] for r in results), f"Print-Job accepted {len(paths)} files")
+        job_ids = [r['job_id'] for r in results]
+        check(len(set(job_ids)) == len(paths) and None not in job_ids, "each file got its own job id")
+        check(all(r['printer'] == "Fake_Printer" for r in results), "CUPS-Get-Default chose the printer")
+        check(all(server.jobs[j]['size'] == 4096 for j in job_ids), "documents arrived complete")
+        check(server.connections == 1, "the batch used one connection")
+
+        # Get-Jobs and Get-Job-Attributes
+        active = {job['job_id'] for job in backend.client.get_jobs("not-completed")}
+        check(active == set(job_ids), "Get-Jobs lists the unfinished jobs")
+        time.sleep(server.latency)
+        check(not backend.client.get_jobs("not-completed"), "Get-Jobs drops completed jobs")
+        check(all(backend.client.get_job(j)['state'] == "completed" for j in job_ids),
+              "Get-Job-Attributes reports completed jobs")
+        check(backend.client.get_job(10**6) is None, "Get-Job-Attributes returns None for unknown jobs")
+        check(server.connections == 1, "polling reused the connection")
+
+        # lp fallback
+        server.shutdown()
+        server.server_close()
+        backend.client.close()
+        results = backend.submit_files(paths, "Fake_Printer")
+        check(all(r['ok'] for r in results), "an unreachable scheduler falls back to lp")
+
+
+if __name__ == "__main__":
+    main()
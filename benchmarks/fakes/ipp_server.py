@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""Stand-in for the CUPS scheduler's IPP/1.1 endpoint.
+
+Answers CUPS-Get-Default, Print-Job, Get-Jobs and Get-Job-Attributes over
+keep-alive HTTP, for one or more fake printers. A submitted job is
+"pending", then "processing", then "completed" after FAKE_IPP_LATENCY
+seconds (default 0.2). The wire format is written out here rather than
+taken from app.ipp, so the client is checked against an independent
+encoding.
+
+Run on its own:
+  benchmarks/fakes/ipp_server.py --port 8631
+"""
+
+import argparse
+import http.server
+import itertools
+import os
+import struct
+import threading
+import time
+
+PRINT_JOB = 0x0002
+GET_JOB_ATTRIBUTES = 0x0009
+GET_JOBS = 0x000A
+CUPS_GET_DEFAULT = 0x4001
+
+OK = 0x0000
+NOT_FOUND = 0x0406
+NOT_SUPPORTED = 0x0501
+
+INTEGER, ENUM, NAME, KEYWORD, URI, CHARSET, LANGUAGE = 0x21, 0x23, 0x42, 0x44, 0x45, 0x47, 0x48
+
+PENDING, PROCESSING, COMPLETED = 3, 5, 9
+
+
+def parse(data):
+    """Operation, request id, operation attributes and the document bytes."""
+    _, _, operation, request_id = struct.unpack(">BBHI", data[:8])
+    attrs, group, name, pos = {}, None, None, 8
+    while pos < len(data):
+        tag = data[pos]
+        pos += 1
+        if tag == 0x03:
+            break
+        if tag < 0x10:
+            group = tag
+            continue
+        name_len, = struct.unpack(">H", data[pos:pos + 2])
+        name = data[pos + 2:pos + 2 + name_len].decode() or name
+        pos += 2 + name_len
+        value_len, = struct.unpack(">H", data[pos:pos + 2])
+        raw = data[pos + 2:pos + 2 + value_len]
+        pos += 2 + value_len
+        if group == 0x01:
+            value = struct.unpack(">i", raw)[0] if tag in (INTEGER, ENUM) else raw.decode()
+            attrs.setdefault(name, []).append(value)
+    return operation, request_id, attrs, data[pos:]
+
+
+def encode(status, request_id, groups):
+    """``groups`` is a list of (group tag, [(value tag, name, value), ...])."""
+    out = bytearray(struct.pack(">BBHI", 1, 1, status, request_id))
+    for group, attrs in groups:
+        out.append(group)
+        for tag, name, value in attrs:
+            raw = struct.pack(">i", value) if tag in (INTEGER, ENUM) else str(value).encode()
+            out += struct.pack(">BH", tag, len(name)) + name.encode()
+            out += struct.pack(">H", len(raw)) + raw
+    out.append(0x03)
+    return bytes(out)
+
+
+class StubIppServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address=("127.0.0.1", 0), printers=("Fake_Printer",), latency=None):
+        super().__init__(address, _Handler)
+        self.printers = list(printers)
+        self.latency = float(os.environ.get("FAKE_IPP_LATENCY", "0.2")) if latency is None else latency
+        self.jobs = {}
+        self.connections = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    @property
+    def uri(self):
+        return f"ipp://{self.server_address[0]}:{self.server_address[1]}"
+
+    def state(self, job):
+        elapsed = time.time() - job['submitted']
+        if elapsed >= self.latency:
+            return COMPLETED
+        return PROCESSING if elapsed >= self.latency / 2 else PENDING
+
+    def job_attributes(self, job):
+        return [
+            (INTEGER, "job-id", job['id']),
+            (ENUM, "job-state", self.state(job)),
+            (KEYWORD, "job-state-reasons", "none"),
+            (URI, "job-printer-uri", f"{self.uri}/printers/{job['printer']}"),
+        ]
+
+    def handle_ipp(self, data):
+        operation, request_id, attrs, document = parse(data)
+        groups = [(0x01, [(CHARSET, "attributes-charset", "utf-8"),
+                          (LANGUAGE, "attributes-natural-language", "en")])]
+
+        if operation == CUPS_GET_DEFAULT:
+            groups.append((0x04, [(NAME, "printer-name", self.printers[0])]))
+            return encode(OK, request_id, groups)
+
+        if operation == PRINT_JOB:
+            printer = attrs.get("printer-uri", [""])[0].rsplit("/", 1)[-1]
+            if printer not in self.printers:
+                return encode(NOT_FOUND, request_id, groups)
+            with self._lock:
+                job = {"id": next(self._ids), "printer": printer, "submitted": time.time(),
+                       "name": attrs.get("job-name", [""])[0], "size": len(document)}
+                self.jobs[job['id']] = job
+            groups.append((0x02, self.job_attributes(job)))
+            return encode(OK, request_id, groups)
+
+        if operation == GET_JOBS:
+            which = attrs.get("which-jobs", ["not-completed"])[0]
+            with self._lock:
+                jobs = list(self.jobs.values())
+            for job in jobs:
+                done = self.state(job) == COMPLETED
+                if which == "all" or done == (which == "completed"):
+                    groups.append((0x02, self.job_attributes(job)))
+            return encode(OK, request_id, groups)
+
+        if operation == GET_JOB_ATTRIBUTES:
+            job_id = int(attrs.get("job-uri", ["/0"])[0].rsplit("/", 1)[-1] or 0)
+            job = self.jobs.get(job_id)
+            if job is None:
+                return encode(NOT_FOUND, request_id, groups)
+            groups.append((0x02, self.job_attributes(job)))
+            return encode(OK, request_id, groups)
+
+        return encode(NOT_SUPPORTED, request_id, groups)
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        with self.server._lock:
+            self.server.connections += 1
+
+    def do_POST(self):
+        data = self.rfile.read(int(self.headers['Content-Length']))
+        body = self.server.handle_ipp(data)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/ipp")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8631)
+    parser.add_argument("--printer", action="append", help="Printer name (repeat for several)")
+    args = parser.parse_args()
+
+    server = StubIppServer(("127.0.0.1", args.port), args.printer or ["Fake_Printer"])
+    print(f"Fake IPP scheduler on {server.uri}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+"""Concurrent print/scan load test with fake ``lp`` and ``scanimage``.
+
+The fakes in benchmarks/fakes are put first on PATH, so no printer or
+scanner is needed; their latency, failure rate and output size are set
+with the options below. By default the handler methods of
+PrinterScannerApp are driven directly. With --url, a running server is
+driven through gradio_client instead, and with --api through its HTTP API
+(start it with PATH=benchmarks/fakes:$PATH so it uses the fakes too).
+
+Run from the repository root:
+  python -m benchmarks.load --users 20 --iterations 5 --output load.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+
+import yaml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FAKES = os.path.join(ROOT, "benchmarks", "fakes")
+
+
+def percentiles(values):
+    if not values:
+        return {"p50": None, "p95": None, "p99": None}
+    if len(values) == 1:
+        return {"p50": values[0], "p95": values[0], "p99": values[0]}
+    cuts = statistics.quantiles(values, n=100, method="inclusive")
+    return {"p50": cuts[49], "p95": cuts[94], "p99": cuts[98]}
+
+
+def git_version():
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"], cwd=ROOT,
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    return {"server": round(own, 1), "largest_child": round(children, 1)}
+
+
+def prepare_workdir(workdir):
+    """Write a config pointing at the fakes and chdir into ``workdir``."""
+    with open(os.path.join(ROOT, "config", "config.yaml")) as f:
+        config = yaml.safe_load(f)
+
+    config['server']['auth_enabled'] = False
+    config['storage']['upload_dir'] = os.path.join(workdir, "uploads")
+    config['storage']['scan_dir'] = os.path.join(workdir, "scans")
+    config['printing']['backend'] = "lp"
+    config['printing']['default_printer'] = "Fake_Printer"
+    config['scanning']['unix_device_name'] = "fake:0"
+    config['scanning']['engine'] = "scanimage"
+
+    os.makedirs(os.path.join(workdir, "config"), exist_ok=True)
+    with open(os.path.join(workdir, "config", "config.yaml"), "w") as f:
+        yaml.safe_dump(config, f)
+    os.chdir(workdir)
+
+
+class HandlerDriver:
+    """Calls the PrinterScannerApp handlers in-process."""
+
+    def __init__(self, workdir):
+        prepare_workdir(workdir)
+        sys.path.insert(0, ROOT)
+        from app.main import PrinterScannerApp
+
+        self.app = PrinterScannerApp()
+
+    def print_files(self, paths):
+        result = asyncio.run(self.app.print_file(None, [SimpleNamespace(name=p) for p in paths]))
+        return result.startswith("Files sent"), result
+
+    def scan(self, colormode):
+        async def consume():
+            last = None
+            async for last in self.app.scan_document(None, colormode):
+                pass
+            return last
+
+        _, _, message = asyncio.run(consume())
+        return message == "Scan completed successfully", message
+
+
+class ClientDriver:
+    """Drives a running server through its Gradio API."""
+
+    def __init__(self, url):
+        from gradio_client import handle_file
+
+        self.handle_file = handle_file
+        self.local = threading.local()
+        self.url = url
+
+    def _client(self):
+        if not hasattr(self.local, "client"):
+            from gradio_client import Client
+
+            self.local.client = Client(self.url, verbose=False)
+        return self.local.client
+
+    def print_files(self, paths):
+        result = self._client().predict(
+            [self.handle_file(p) for p in paths], None, api_name="/print_file"
+        )
+        return str(result).startswith("Files sent"), result
+
+    def scan(self, colormode):
+        result = self._client().predict(colormode, False, None, api_name="/scan_document")
+        message = result[-1]
+        return message == "Scan completed successfully", message
+
+
+class ApiDriver:
+    """Drives a running server through its /api/v1 HTTP API."""
+
+    def __init__(self, url):
+        import httpx
+
+        self.client = httpx.Client(base_url=url.rstrip("/"), timeout=300)
+
+    def print_files(self, paths):
+        files = [("files", (os.path.basename(p), open(p, "rb"))) for p in paths]
+        try:
+            response = self.client.post("/api/v1/print", files=files)
+        finally:
+            for _, (_, f) in files:
+                f.close()
+        return response.status_code == 200 and response.json()["ok"], response.text
+
+    def scan(self, colormode):
+        mode = {1: "color", 2: "gray", 4: "lineart"}[colormode]
+        response = self.client.post("/api/v1/scan", json={"mode": mode})
+        return response.status_code == 200, response.text
+
+
+def run_user(driver, user, args, sample_files, records, lock):
+    rng = random.Random(user)
+    for _ in range(args.iterations):
+        if rng.random() < args.scan_ratio:
+            op, call = "scan", lambda: driver.scan(rng.choice((1, 2, 4)))
+        else:
+            count = rng.randint(1, args.max_files)
+            op, call = "print", lambda: driver.print_files(rng.sample(sample_files, count))
+
+        start = time.perf_counter()
+        try:
+            ok, _ = call()
+        except Exception:
+            ok = False
+        elapsed = time.perf_counter() - start
+
+        with lock:
+            records.append((op, ok, elapsed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20, help="concurrent sessions")
+    parser.add_argument("--iterations", type=int, default=5, help="operations per session")
+    parser.add_argument("--scan-ratio", type=float, default=0.5, help="share of operations that are scans")
+    parser.add_argument("--max-files", type=int, default=3, help="files per print batch (1..n)")
+    parser.add_argument("--scan-latency", type=float, default=0.2, help="fake scanimage seconds per page")
+    parser.add_argument("--scan-failure-rate", type=float, default=0.0)
+    parser.add_argument("--scan-scale", type=float, default=0.5, help="page size as a fraction of A4")
+    parser.add_argument("--lp-latency", type=float, default=0.05)
+    parser.add_argument("--lp-failure-rate", type=float, default=0.0)
+    parser.add_argument("--url", help="drive a running server's UI API instead of the handlers")
+    parser.add_argument("--api", help="drive a running server's /api/v1 HTTP API instead")
+    parser.add_argument("--output", help="write machine-readable results to this JSON file")
+    args = parser.parse_args()
+
+    os.environ["PATH"] = FAKES + os.pathsep + os.environ.get("PATH", "")
+    os.environ["FAKE_SCAN_LATENCY"] = str(args.scan_latency)
+    os.environ["FAKE_SCAN_FAILURE_RATE"] = str(args.scan_failure_rate)
+    os.environ["FAKE_SCAN_SCALE"] = str(args.scan_scale)
+    os.environ["FAKE_LP_LATENCY"] = str(args.lp_latency)
+    os.environ["FAKE_LP_FAILURE_RATE"] = str(args.lp_failure_rate)
+
+    output = os.path.abspath(args.output) if args.output else None
+
+    with tempfile.TemporaryDirectory() as workdir:
+        sample_files = []
+        for i in range(max(args.max_files, 1)):
+            path = os.path.join(workdir, f"sample_{i}.pdf")
+            with open(path, "wb") as f:
+                f.write(b"%PDF-1.4\n% load test sample\n" + os.urandom(32 * 1024))
+            sample_files.append(path)
+
+        if args.api:
+            driver = ApiDriver(args.api)
+        elif args.url:
+            driver = ClientDriver(args.url)
+        else:
+            driver = HandlerDriver(workdir)
+
+        records = []
+        lock = threading.Lock()
+        threads = [
+            threading.Thread(target=run_user, args=(driver, user, args, sample_files, records, lock))
+            for user in range(args.users)
+        ]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        wall = time.perf_counter() - start
+
+    results = {}
+    for op in ("print", "scan"):
+        timings = sorted(elapsed for name, ok, elapsed in records if name == op)
+        if not timings:
+            continue
+        results[op] = {
+            "count": len(timings),
+            "errors": sum(1 for name, ok, _ in records if name == op and not ok),
+            "throughput_per_s": round(len(timings) / wall, 3),
+            **{k: round(v, 4) for k, v in percentiles(timings).items()},
+            "max": round(timings[-1], 4),
+        }
+
+    report = {
+        "version": git_version(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "mode": "api" if args.api else "client" if args.url else "handlers",
+        "params": {k: v for k, v in vars(args).items() if k != "output"},
+        "wall_s": round(wall, 3),
+        "peak_rss_mb": peak_rss_mb(),
+        "results": results,
+    }
+
+    print(f"{'op':<6} {'count':>6} {'errors':>6} {'ops/s':>7} {'p50 s':>7} {'p95 s':>7} {'p99 s':>7}")
+    for op, r in results.items():
+        print(f"{op:<6} {r['count']:>6} {r['errors']:>6} {r['throughput_per_s']:>7.2f} "
+              f"{r['p50']:>7.3f} {r['p95']:>7.3f} {r['p99']:>7.3f}")
+    print(f"wall {report['wall_s']}s, peak RSS {report['peak_rss_mb']}")
+
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -24,8 +24,11 @@ def is_windows() -> bool:
 # ---------------------- Unix helpers ----------------------
 
 
-def list_unix_printers() -> List[str]:
-    """Return a list of printer names using CUPS (lpstat)."""
+def list_unix_printers(strict: bool = False) -> List[str]:
+    """Return a list of printer names using CUPS (lpstat).
+
+    With ``strict``, a failing lpstat raises instead of listing no printers.
+    """
     try:
         result = subprocess.run(
             ["lpstat", "-p"],
@@ -35,9 +38,13 @@ def list_unix_printers() -> List[str]:
             check=True,
         )
     except FileNotFoundError:
+        if strict:
+            raise
         print("lpstat not found. Install CUPS (e.g., cups, cups-client) to list printers.")
         return []
     except subprocess.CalledProcessError as e:
+        if strict:
+            raise
         print("Error while listing printers with lpstat:")
         print(e.stderr.strip() or e.stdout.strip())
         return []
@@ -51,8 +58,11 @@ def list_unix_printers() -> List[str]:
     return printers
 
 
-def list_unix_scanners() -> List[Tuple[str, str]]:
-    """Return a list of (device_name, description) from scanimage -L."""
+def list_unix_scanners(strict: bool = False) -> List[Tuple[str, str]]:
+    """Return a list of (device_name, description) from scanimage -L.
+
+    With ``strict``, a failing scanimage raises instead of listing no scanners.
+    """
     try:
         result = subprocess.run(
             ["scanimage", "-L"],
@@ -62,12 +72,16 @@ def list_unix_scanners() -> List[Tuple[str, str]]:
             check=True,
         )
     except FileNotFoundError:
+        if strict:
+            raise
         print("scanimage not found. Install SANE utilities (e.g., sane-utils) to list scanners.")
         return []
     except subprocess.CalledProcessError as e:
         # Some SANE backends print info to stderr on success; try to parse stdout anyway.
         output = e.stdout or ""
         if not output:
+            if strict:
+                raise
             print("Error while listing scanners with scanimage:")
             print(e.stderr.strip())
             return []
@@ -93,10 +107,12 @@ def list_unix_scanners() -> List[Tuple[str, str]]:
 # ---------------------- Windows helpers ----------------------
 
 
-def list_windows_printers() -> List[str]:
+def list_windows_printers(strict: bool = False) -> List[str]:
     try:
         import win32print  # type: ignore
     except ImportError:
+        if strict:
+            raise
         print("win32print is not available. Install pywin32 to list Windows printers.")
         return []
 
@@ -110,12 +126,14 @@ def list_windows_printers() -> List[str]:
     return names
 
 
-def list_windows_scanners() -> List[Tuple[int, str]]:
+def list_windows_scanners(strict: bool = False) -> List[Tuple[int, str]]:
     """Return a list of (index, name) for WIA scanners."""
     try:
         import win32com.client  # type: ignore
         import pythoncom  # type: ignore
     except ImportError:
+        if strict:
+            raise
         print("win32com / pythoncom not available. Install pywin32 to list scanners.")
         return []
 
@@ -1,6 +1,13 @@
 import argparse
+import time
 
-from app.main import PrinterScannerApp
+from app.timing import StartupTimer
+
+# Backoff between restarts after a crash, in seconds
+RESTART_DELAY_MIN = 0.5
+RESTART_DELAY_MAX = 60.0
+# A server that stayed up this long resets the backoff
+STABLE_UPTIME = 60.0
 
 
 def parse_args():
@@ -9,24 +16,72 @@ def parse_args():
     )
     parser.add_argument(
         "--printer",
-        help="Printer name to use (overrides printing.default_printer)",
+        action="append",
+        help=(
+            "Printer name to use (overrides printing.default_printer); "
+            "repeat it to pool several printers"
+        ),
     )
     parser.add_argument(
         "--scanner",
+        action="append",
         help=(
             "Scanner identifier: SANE device name on Unix "
-            "or numeric device index on Windows (overrides scanning settings)"
+            "or numeric device index on Windows (overrides scanning settings); "
+            "repeat it to pool several scanners"
         ),
     )
+    parser.add_argument(
+        "--timing",
+        action="store_true",
+        help="Print how long imports, setup and UI construction take at startup",
+    )
     return parser.parse_args()
 
 
+def build_app(args, timer):
+    # gradio dominates the import cost; import it once, up front, so a
+    # restart after a crash never pays for it again.
+    from app.main import PrinterScannerApp
+    timer.mark("import app.main")
+
+    app = PrinterScannerApp(printer=args.printer, scanner=args.scanner)
+    timer.mark("config, backends and UI")
+    return app
+
+
 if __name__ == "__main__":
     args = parse_args()
+    timer = StartupTimer()
+
+    delay = RESTART_DELAY_MIN
+    app = None
 
     while True:
+        started = time.monotonic()
         try:
-            app = PrinterScannerApp(printer=args.printer, scanner=args.scanner)
-            app.run()
+            # The app (config, backends, UI) is built once; after a crash only
+            # the server is relaunched with the already constructed Blocks.
+            if app is None:
+                app = build_app(args, timer)
+            app.run(timer=timer if args.timing else None)
+            break
+        except KeyboardInterrupt:
+            break
         except Exception as e:
-            print("application crashed, will restart\n%s" % e)
\ No newline at end of file
+            if time.monotonic() - started > STABLE_UPTIME:
+                delay = RESTART_DELAY_MIN
+            print("application crashed, will restart in %.1fs\n%s" % (delay, e))
+            if app is not None:
+                try:
+                    app.app.close()
+                except Exception:
+                    pass
+
+        time.sleep(delay)
+        delay = min(delay * 2, RESTART_DELAY_MAX)
+        timer = StartupTimer()
+
+    # A relaunch reuses the app and its worker pools; only leaving stops them
+    if app is not None:
+        app.close()